@@ -0,0 +1,168 @@
+"""Fan-out cost of WebSocket events, old per-client send_json vs serialize once.
+
+Starts the /ws router on a local port, connects simulated dashboard clients
+and publishes events carrying a snapshot-sized base64 payload. Reports how
+long the publisher is blocked per event and how long until every client has
+every event. Run from the backend directory:
+
+    python -m benchmarks.broadcast --clients 200 --messages 50
+
+Add --deflate to let clients negotiate permessage-deflate, which compresses
+every message once per client again.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import time
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from websockets.asyncio.client import connect
+
+from src.routes.websockets import router, ws_manager
+from src.utils import json_utils
+
+# A 640-px JPEG snapshot is roughly this large before base64
+SNAPSHOT_BYTES = 40_000
+
+legacy_connections = []
+
+
+async def legacy_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    legacy_connections.append(websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        legacy_connections.remove(websocket)
+
+
+async def legacy_broadcast(message):
+    # The old ConnectionManager.broadcast: one send_json, one dumps, per client
+    for connection in legacy_connections[:]:
+        await connection.send_json(message)
+
+
+def make_message(i: int, img_src: str) -> dict:
+    return {
+        "event": "server:red-light-violation",
+        "data": {"id": str(i), "vehicleType": "car", "imgSrc": img_src},
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def receive(client, count: int, done: list):
+    for _ in range(count):
+        await client.recv()
+    done.append(time.perf_counter())
+
+
+async def run(path: str, args, img_src: str, port: int):
+    clients, messages = args.clients, args.messages
+    url = f"ws://127.0.0.1:{port}{path}"
+    compression = "deflate" if args.deflate else None
+    sockets = [
+        await connect(url, max_size=None, compression=compression)
+        for _ in range(clients)
+    ]
+    if path == "/ws":
+        # Every client first gets the app data
+        await asyncio.gather(*(client.recv() for client in sockets))
+        while len(ws_manager.connections) < clients:
+            await asyncio.sleep(0.01)
+    else:
+        while len(legacy_connections) < clients:
+            await asyncio.sleep(0.01)
+
+    done = []
+    receivers = [
+        asyncio.create_task(receive(client, messages, done)) for client in sockets
+    ]
+    blocked = []
+    start = time.perf_counter()
+    for i in range(messages):
+        message = make_message(i, img_src)
+        t = time.perf_counter()
+        if path == "/ws":
+            ws_manager.publish(message)
+        else:
+            await legacy_broadcast(message)
+        blocked.append(time.perf_counter() - t)
+        # Let senders and clients run, as a detector loop would between frames
+        await asyncio.sleep(0)
+    await asyncio.gather(*receivers)
+    elapsed = max(done) - start
+
+    for client in sockets:
+        await client.close()
+    return {
+        "blocked_ms": sum(blocked) / len(blocked) * 1000,
+        "max_blocked_ms": max(blocked) * 1000,
+        "delivered_per_s": clients * messages / elapsed,
+        "elapsed_s": elapsed,
+    }
+
+
+def encode_times(message: dict, repeat: int = 200) -> dict:
+    encoders = {"json": lambda: json.dumps(message, separators=(",", ":"))}
+    if json_utils.orjson is not None:
+        encoders["orjson"] = lambda: json_utils.dumps(message)
+    times = {}
+    for name, encode in encoders.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            encode()
+        times[name] = (time.perf_counter() - start) / repeat * 1000
+    return times
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--snapshot-bytes", type=int, default=SNAPSHOT_BYTES)
+    parser.add_argument("--deflate", action="store_true")
+    args = parser.parse_args()
+
+    img_src = base64.b64encode(os.urandom(args.snapshot_bytes)).decode()
+    for name, ms in encode_times(make_message(0, img_src)).items():
+        print(f"encode once with {name:>6}: {ms:.3f} ms")
+    print(f"active encoder: {json_utils.JSON_ENCODER}")
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_api_websocket_route("/legacy-ws", legacy_endpoint)
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    try:
+        for label, path in (("per-client", "/legacy-ws"), ("serialize once", "/ws")):
+            result = await run(path, args, img_src, port)
+            print(
+                f"{label:>14}: publisher blocked {result['blocked_ms']:.2f} ms/event "
+                f"(max {result['max_blocked_ms']:.2f}), "
+                f"{result['delivered_per_s']:.0f} deliveries/s, "
+                f"all delivered in {result['elapsed_s']:.2f}s"
+            )
+    finally:
+        server.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,167 @@
+"""WebSocket message volume at a busy intersection, raw vs coalesced events.
+
+Plays a synthetic intersection in real time: traffic-control telemetry on
+every tick, overspeeding violators whose measured speed keeps ticking up
+and riders flapping between no-helmet violation and removal. Every event
+goes through the coalescing layer and the messages that come out are
+counted against the raw stream. Both streams are applied to a simple
+client view to check they end in the same state. Run from the backend
+directory:
+
+    python -m benchmarks.coalescing --fps 30 --seconds 10
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+from src.pipeline.events import EventCoalescer
+from src.utils.json_utils import dumps
+
+
+class Sink:
+    """Counts messages and bytes and keeps the view a dashboard would show."""
+
+    def __init__(self):
+        self.messages = Counter()
+        self.bytes = 0
+        self.speeds = {}
+        self.no_helmet = set()
+        self.traffic = {}
+
+    def __call__(self, message: dict, camera):
+        event, data = message["event"], message["data"]
+        self.messages[event] += 1
+        self.bytes += len(dumps(message))
+        if event in ("server:overspeeding", "server:update-overspeeding"):
+            self.speeds[data["id"]] = data["highestSpeed"]
+        elif event == "server:no-helmet-violation":
+            self.no_helmet.add(data["id"])
+        elif event == "server:remove-no-helmet-violation":
+            self.no_helmet.discard(data["id"])
+        elif event == "server:traffic-control":
+            self.traffic[camera] = data
+
+
+def traffic_control(frame: int, objects: int) -> list:
+    return [
+        {
+            "video_id": f"source-{source}",
+            "detections": [
+                {"className": "car", "confScore": 0.9, "elapsedTime": frame // 30}
+                for _ in range(objects)
+            ],
+        }
+        for source in range(4)
+    ]
+
+
+async def play(args, deliver) -> None:
+    speeds = {}
+    violating = {}
+    interval = 1 / args.fps
+    start = time.perf_counter()
+    for frame in range(int(args.fps * args.seconds)):
+        deliver(
+            {
+                "event": "server:traffic-control",
+                "data": traffic_control(frame, args.objects),
+            },
+            "trafficControl",
+        )
+
+        # A new violator now and then, and every violator's speed ticks up
+        if frame % args.fps == 0 or not speeds:
+            vid = f"car-{frame}"
+            speeds[vid] = 70
+            deliver(
+                {
+                    "event": "server:overspeeding",
+                    "data": {"id": vid, "highestSpeed": 70, "imgSrc": None},
+                },
+                "overspeeding",
+            )
+        for vid in list(speeds)[-args.violators :]:
+            if random.random() < args.update_chance:
+                speeds[vid] += 1
+                deliver(
+                    {
+                        "event": "server:update-overspeeding",
+                        "data": {"id": vid, "highestSpeed": speeds[vid]},
+                    },
+                    "overspeeding",
+                )
+
+        # Riders whose helmet is seen on some frames and not on others
+        for rider in range(args.riders):
+            rid = f"rider-{rider}"
+            if random.random() < args.flap_chance:
+                violating[rid] = not violating.get(rid, False)
+                event = (
+                    "server:no-helmet-violation"
+                    if violating[rid]
+                    else "server:remove-no-helmet-violation"
+                )
+                deliver({"event": event, "data": {"id": rid}}, "noHelmet")
+
+        wait = start + (frame + 1) * interval - time.perf_counter()
+        await asyncio.sleep(max(wait, 0))
+
+
+async def run(args):
+    random.seed(args.seed)
+    raw, coalesced = Sink(), Sink()
+    coalescer = EventCoalescer(
+        coalesced,
+        window=args.window,
+        telemetry_hz=args.hz,
+        removal_hold=args.hold,
+    )
+
+    def deliver(message, camera):
+        raw(message, camera)
+        coalescer.offer(message, camera)
+
+    await play(args, deliver)
+    coalescer.flush()
+    return raw, coalesced
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--objects", type=int, default=15)
+    parser.add_argument("--violators", type=int, default=20)
+    parser.add_argument("--update-chance", type=float, default=0.5)
+    parser.add_argument("--riders", type=int, default=10)
+    parser.add_argument("--flap-chance", type=float, default=0.05)
+    parser.add_argument("--window", type=float, default=1)
+    parser.add_argument("--hz", type=float, default=2)
+    parser.add_argument("--hold", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    raw, coalesced = asyncio.run(run(args))
+    for event in sorted(raw.messages):
+        before, after = raw.messages[event], coalesced.messages[event]
+        print(f"{event:>36}: {before:6d} -> {after:5d} ({before / max(after, 1):.1f}x)")
+    total_before = sum(raw.messages.values())
+    total_after = sum(coalesced.messages.values())
+    print(
+        f"{'all events':>36}: {total_before:6d} -> {total_after:5d} "
+        f"({total_before / max(total_after, 1):.1f}x), "
+        f"{raw.bytes / 1e6:.1f} MB -> {coalesced.bytes / 1e6:.2f} MB"
+    )
+    same = (
+        raw.speeds == coalesced.speeds
+        and raw.no_helmet == coalesced.no_helmet
+        and raw.traffic == coalesced.traffic
+    )
+    print(f"final client view {'matches' if same else 'DIFFERS'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Event history at a sustained event rate: cost to the emitter and query speed.
+
+Records synthetic violation events into a temporary SQLite database at a
+fixed rate, the way detector events reach the store, and reports how long
+each record() call holds up the caller, how far the writer thread falls
+behind and how fast filtered keyset pages come back. Run from the backend
+directory:
+
+    python -m benchmarks.event_store --rate 1000 --seconds 10
+
+Add --inline to compare against committing each event on the caller's thread.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from src.data.event_store import INSERT, SCHEMA, EventStore, connect
+from src.utils.json_utils import dumps
+from src.utils.quantiles import value_bin
+
+CAMERAS = ("overspeeding", "noHelmet", "redLightPassing", "wrongWay")
+CLASSES = ("car", "motorcycle", "bus", "truck")
+EVENT_TYPES = (
+    "server:overspeeding",
+    "server:no-helmet-violation",
+    "server:red-light-violation",
+    "server:wrong-way",
+)
+
+
+def make_message(i: int) -> dict:
+    return {
+        "event": EVENT_TYPES[i % len(EVENT_TYPES)],
+        "data": {
+            "id": f"bench-{i}",
+            "detectedAt": time.time() * 1000,
+            "className": random.choice(CLASSES),
+            "plateNumber": f"KA{i % 10_000:04d}" if i % 3 == 0 else None,
+            "highestSpeed": random.uniform(20, 120),
+            "imgSrc": f"/snapshots/{i:032x}.jpg",
+        },
+    }
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[int(len(samples) * 0.99)]
+    return f"p50 {p50:.1f} µs, p99 {p99:.1f} µs, max {samples[-1]:.1f} µs"
+
+
+def paced(count: int, rate: float):
+    """Yields 0..count-1 no faster than ``rate`` per second."""
+    start = time.perf_counter()
+    for i in range(count):
+        wait = start + i / rate - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        yield i
+
+
+def run_batched(path: str, count: int, rate: float) -> EventStore:
+    store = EventStore(path).start()
+    latencies, max_pending = [], 0
+    for i in paced(count, rate):
+        message = make_message(i)
+        t = time.perf_counter()
+        store.record(message, CAMERAS[i % len(CAMERAS)])
+        latencies.append((time.perf_counter() - t) * 1e6)
+        max_pending = max(max_pending, store.pending.qsize())
+    recorded = time.perf_counter()
+    store.stop()
+    print(f"    batched record(): {percentiles(latencies)}")
+    print(
+        f"    writer backlog max {max_pending} events, drained "
+        f"{(time.perf_counter() - recorded) * 1000:.0f} ms after the last event; "
+        f"written {store.written}, dropped {store.dropped}"
+    )
+    return store
+
+
+def run_inline(path: str, count: int, rate: float):
+    # One INSERT and commit per event on the emitting thread
+    connection = connect(path, writer=True)
+    connection.executescript(SCHEMA)
+    latencies = []
+    for i in paced(count, rate):
+        message = make_message(i)
+        data = message["data"]
+        t = time.perf_counter()
+        with connection:
+            connection.execute(
+                INSERT,
+                (
+                    data["id"],
+                    message["event"],
+                    CAMERAS[i % len(CAMERAS)],
+                    data["detectedAt"],
+                    data["className"],
+                    data["plateNumber"],
+                    data["highestSpeed"],
+                    value_bin(data["highestSpeed"]),
+                    dumps(data),
+                ),
+            )
+        latencies.append((time.perf_counter() - t) * 1e6)
+    connection.close()
+    print(f"     inline INSERT: {percentiles(latencies)}")
+
+
+def time_queries(store: EventStore, pages: int):
+    filters = {
+        "all events": {},
+        "type + camera": {"event_type": EVENT_TYPES[0], "camera": CAMERAS[0]},
+        "plate": {"plate": "KA0003"},
+        "class + speed": {"class_name": "car", "min_speed": 100},
+    }
+    for label, kwargs in filters.items():
+        times, cursor, rows = [], None, 0
+        for _ in range(pages):
+            t = time.perf_counter()
+            page = store.query(limit=50, cursor=cursor, **kwargs)
+            times.append((time.perf_counter() - t) * 1000)
+            rows += len(page["items"])
+            cursor = page["nextCursor"]
+            if cursor is None:
+                break
+        print(
+            f"    {label:>14}: {len(times)} pages, {rows} rows, "
+            f"first {times[0]:.2f} ms, median {statistics.median(times):.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+    count = int(args.rate * args.seconds)
+    print(f"SQLite {sqlite3.sqlite_version}, {count} events at {args.rate:.0f}/s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.inline:
+            run_inline(os.path.join(directory, "inline.db"), count, args.rate)
+        store = run_batched(os.path.join(directory, "events.db"), count, args.rate)
+        time_queries(store, args.pages)
+
+
+if __name__ == "__main__":
+    main()
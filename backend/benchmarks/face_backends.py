@@ -0,0 +1,100 @@
+"""Startup time and faces/sec for each face backend.
+
+Run from the backend directory:
+
+    python -m benchmarks.face_backends --video ./src/assets/videos/modig.mp4
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import cv2
+
+STARTUP_SNIPPET = """
+import json, resource, time
+start = time.perf_counter()
+from src.faces.backends import create_face_backend
+create_face_backend({name!r})
+print(json.dumps({{
+    "startup_s": time.perf_counter() - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def measure_startup(name: str) -> dict:
+    # A fresh interpreter per backend so imports are not already cached
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SNIPPET.format(name=name)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def read_frames(video_path: str, max_frames: int):
+    capture = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def measure_throughput(name: str, frames) -> dict:
+    from src.faces.backends import create_face_backend
+
+    backend = create_face_backend(name)
+
+    # Warm up so lazy graph initialization is not counted
+    backend.embed(backend.detect(frames[0]))
+
+    total_faces = 0
+    start = time.perf_counter()
+    for frame in frames:
+        faces = backend.detect(frame)
+        backend.embed(faces)
+        total_faces += len(faces)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "frames_per_s": len(frames) / elapsed,
+        "faces_per_s": total_faces / elapsed,
+        "faces": total_faces,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", default="./src/assets/videos/modig.mp4")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--backends", nargs="+", default=["opencv", "deepface"])
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames)
+    if not frames:
+        sys.exit(f"Could not read frames from {args.video}")
+
+    for name in args.backends:
+        try:
+            result = {**measure_startup(name), **measure_throughput(name, frames)}
+        except (ImportError, subprocess.CalledProcessError) as e:
+            print(f"{name:>10}: unavailable ({e})")
+            continue
+        print(
+            f"{name:>10}: startup {result['startup_s']:.2f}s, "
+            f"RSS {result['max_rss_mb']:.0f} MB, "
+            f"{result['faces_per_s']:.1f} faces/s, "
+            f"{result['frames_per_s']:.1f} frames/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Per-frame cost of detection post-processing, old inline code vs DetectionFilter.
+
+Runs on synthetic detections so no model or video is needed. Run from the
+backend directory:
+
+    python -m benchmarks.postprocess --boxes 300 --repeat 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+import supervision as sv
+
+from src.utils.postprocess import DetectionFilter
+from src.utils.zones import ZoneMap
+
+RESOLUTION_WH = (1920, 1080)
+MODEL_NAMES = {i: f"class_{i}" for i in range(80)}
+MODEL_NAMES.update({2: "car", 3: "motorcycle", 5: "bus", 7: "truck"})
+CLASS_NAMES = ["car", "motorcycle", "bus", "truck"]
+ROAD_POLYGON = [[400, 300], [1500, 300], [1900, 1079], [0, 1079]]
+
+
+def make_detections(n: int, rng: np.random.Generator) -> sv.Detections:
+    # Raw model output: mostly low-confidence boxes over many classes
+    xy = rng.uniform(0, 1, (n, 2)) * np.array(RESOLUTION_WH) * 0.9
+    wh = rng.uniform(20, 200, (n, 2))
+    return sv.Detections(
+        xyxy=np.hstack([xy, xy + wh]).astype(np.float32),
+        confidence=rng.beta(1, 4, n).astype(np.float32),
+        class_id=rng.integers(0, len(MODEL_NAMES), n),
+    )
+
+
+def legacy(detections, zones, conf_score, iou_threshold):
+    # The inline code each detector used to carry
+    class_mask = np.isin(
+        [MODEL_NAMES[cls_id] for cls_id in detections.class_id], CLASS_NAMES
+    )
+    detections = detections[class_mask]
+    detections = detections[detections.confidence > conf_score]
+    detections = detections[zones.contains_detections("road", detections)]
+    return detections.with_nms(threshold=iou_threshold)
+
+
+def nms_first(detections, zones, conf_score, iou_threshold):
+    # Same filters, but NMS before the cheap masks
+    detections = detections.with_nms(threshold=iou_threshold)
+    detections = detections[
+        (detections.confidence > conf_score)
+        & np.isin(detections.class_id, [2, 3, 5, 7])
+    ]
+    return detections[zones.contains_detections("road", detections)]
+
+
+def timed(fn, frames, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(frames[i % len(frames)])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--conf", type=float, default=0.3)
+    parser.add_argument("--iou", type=float, default=0.7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [make_detections(args.boxes, rng) for _ in range(32)]
+    zones = ZoneMap(RESOLUTION_WH, {"road": ROAD_POLYGON})
+    zones.mask  # Rasterize up front
+    detection_filter = DetectionFilter(
+        MODEL_NAMES, CLASS_NAMES, conf_score=args.conf, iou_threshold=args.iou
+    )
+
+    def in_road(d):
+        return zones.contains_detections("road", d)
+
+    candidates = {
+        "legacy (names, conf, zone, nms)": lambda d: legacy(
+            d, zones, args.conf, args.iou
+        ),
+        "nms first": lambda d: nms_first(d, zones, args.conf, args.iou),
+        "DetectionFilter": lambda d: detection_filter(d, zone_mask=in_road),
+    }
+
+    # Every variant must keep the same boxes
+    expected = len(candidates["legacy (names, conf, zone, nms)"](frames[0]))
+    print(f"{args.boxes} raw boxes/frame, {expected} kept after filtering")
+    for name, fn in candidates.items():
+        kept = len(fn(frames[0]))
+        print(f"{name:34s} {timed(fn, frames, args.repeat):9.1f} us/frame  kept={kept}")
+
+
+if __name__ == "__main__":
+    main()
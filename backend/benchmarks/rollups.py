@@ -0,0 +1,159 @@
+"""Dashboard queries from the rollup tables vs scanning raw events, as history grows.
+
+Fills a temporary event store with a day of synthetic violations per size,
+reporting how fast the writer thread stores them with the rollup triggers,
+then times each dashboard query against the rollups and against the old
+way of scanning the events table. Run from the backend directory:
+
+    python -m benchmarks.rollups --events 10000 100000 300000
+
+Rollup queries should stay flat while scans grow with the event count.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from src.data.event_store import EventStore, connect
+from src.data.rollups import Rollups
+
+DAY_MS = 86_400_000
+CAMERAS = ("overspeeding", "noHelmet", "redLightPassing", "wrongWay")
+CLASSES = ("car", "motorcycle", "bus", "truck")
+EVENT_TYPES = (
+    "server:overspeeding",
+    "server:no-helmet-violation",
+    "server:red-light-violation",
+    "server:wrong-way",
+)
+
+
+def fill(store: EventStore, count: int, now: float) -> float:
+    """Records ``count`` events spread over the last day; returns events/s written."""
+    start = time.perf_counter()
+    for i in range(count):
+        kind = i % len(EVENT_TYPES)
+        data = {
+            "id": f"bench-{i}",
+            "detectedAt": now - random.random() * DAY_MS,
+            "className": random.choice(CLASSES),
+        }
+        if kind == 0:
+            data["highestSpeed"] = int(random.gauss(80, 15))
+        store.record({"event": EVENT_TYPES[kind], "data": data}, CAMERAS[kind])
+    store.stop()
+    return count / (time.perf_counter() - start)
+
+
+def scan(path: str, sql: str, params=()):
+    connection = connect(path)
+    try:
+        return connection.execute(sql, params).fetchall()
+    finally:
+        connection.close()
+
+
+def scan_percentiles(path: str, since: float, until: float):
+    # Exact percentiles need every speed in the window, sorted
+    speeds = sorted(
+        speed
+        for (speed,) in scan(
+            path,
+            "SELECT speed FROM events WHERE event_type = 'server:overspeeding' "
+            "AND detected_at >= ? AND detected_at < ?",
+            (since, until),
+        )
+    )
+    return [speeds[int(q * (len(speeds) - 1))] for q in (0.5, 0.9, 0.95, 0.99)]
+
+
+def dashboard_queries(path: str, rollups: Rollups, since: float, until: float):
+    window = {"since": since, "until": until}
+    return {
+        "counts per hour": (
+            lambda: rollups.counts(period="hour", **window),
+            lambda: scan(
+                path,
+                "SELECT CAST(detected_at / 3600000 AS INTEGER), camera, event_type, "
+                "count(*) FROM events WHERE detected_at >= ? AND detected_at < ? "
+                "GROUP BY 1, 2, 3",
+                (since, until),
+            ),
+        ),
+        "speed percentiles": (
+            lambda: rollups.speed_percentiles(**window),
+            lambda: scan_percentiles(path, since, until),
+        ),
+        "helmet violations": (
+            lambda: rollups.helmet_violations(**window),
+            lambda: scan(
+                path,
+                "SELECT camera, count(*) FROM events WHERE event_type = "
+                "'server:no-helmet-violation' AND detected_at >= ? "
+                "AND detected_at < ? GROUP BY camera",
+                (since, until),
+            ),
+        ),
+        "top classes": (
+            lambda: rollups.top_classes(**window),
+            lambda: scan(
+                path,
+                "SELECT class_name, count(*) AS total FROM events "
+                "WHERE detected_at >= ? AND detected_at < ? "
+                "GROUP BY class_name ORDER BY total DESC LIMIT 5",
+                (since, until),
+            ),
+        ),
+    }
+
+
+def median_ms(query, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def check_accuracy(path: str, rollups: Rollups, since: float, until: float):
+    sketch = rollups.speed_percentiles(since=since, until=until)["percentiles"]
+    exact = scan_percentiles(path, since, until)
+    errors = [
+        abs(value - truth) / truth for value, truth in zip(sketch.values(), exact)
+    ]
+    print(f"    sketch percentiles {sketch}, max relative error {max(errors):.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.events:
+            path = os.path.join(directory, f"events-{count}.db")
+            now = time.time() * 1000
+            store = EventStore(path, max_pending=count + 1).start()
+            rate = fill(store, count, now)
+            print(f"{count} events: written at {rate:.0f} events/s with rollups")
+
+            rollups = Rollups(store)
+            since, until = now - DAY_MS, now
+            for label, (rollup, raw) in dashboard_queries(
+                path, rollups, since, until
+            ).items():
+                print(
+                    f"    {label:>17}: rollups "
+                    f"{median_ms(rollup, args.repeat):7.2f} ms, scan "
+                    f"{median_ms(raw, args.repeat):7.2f} ms"
+                )
+            check_accuracy(path, rollups, since, until)
+
+
+if __name__ == "__main__":
+    main()
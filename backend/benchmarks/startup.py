@@ -0,0 +1,87 @@
+"""Import time of the API app, checked against a budget with python -X importtime.
+
+Importing the app must not pull in detector modules or the frameworks behind
+them; those load in camera workers on first use. Run from the backend
+directory:
+
+    python -m benchmarks.startup --runs 5 --budget-ms 1000
+
+Exits non-zero when the best run is over budget or a heavy module is imported.
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Frameworks that must only be imported once a camera runs
+HEAVY_MODULES = (
+    "torch",
+    "ultralytics",
+    "easyocr",
+    "deepface",
+    "tensorflow",
+    "cvzone",
+    "supervision",
+    "src.detectors",
+)
+
+
+def import_times(module: str) -> dict:
+    """Runs one fresh interpreter; returns module -> (self_us, cumulative_us)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # Header line
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="src.app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    totals = [times[args.module][1] / 1000 for times in runs]
+    best = min(range(len(runs)), key=lambda i: totals[i])
+
+    print(
+        f"import {args.module}: best {totals[best]:.1f} ms, "
+        f"worst {max(totals):.1f} ms"
+    )
+    print("slowest modules by self time (best run):")
+    by_self = sorted(runs[best].items(), key=lambda item: item[1][0], reverse=True)
+    for name, (self_us, cumulative_us) in by_self[: args.top]:
+        print(f"  {name:44s} {self_us / 1000:8.1f} ms ({cumulative_us / 1000:.1f} cum)")
+
+    heavy = sorted(
+        name
+        for name in runs[best]
+        if any(name == h or name.startswith(h + ".") for h in HEAVY_MODULES)
+    )
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy[:10])}")
+        failed = True
+    if totals[best] > args.budget_ms:
+        print(f"FAIL: {totals[best]:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print(f"OK: within the {args.budget_ms:.0f} ms budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,15 @@ import uvicorn
 
 
 def main():
-    uvicorn.run("src.app:app", host="0.0.0.0", port=8000, reload=True)
+    # Events are serialized once for every client; per-message deflate would
+    # compress each one again per client, and base64 snapshots barely shrink
+    uvicorn.run(
+        "src.app:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        ws_per_message_deflate=False,
+    )
 
 
 if __name__ == "__main__":
@@ -1,9 +1,41 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from src.data.event_store import event_store
+from src.pipeline.events import event_coalescer
+from src.pipeline.registry import camera_registry
+from src.pipeline.workers import WORKERS_ENABLED, camera_workers
+from src.routes.analytics import router as AnalyticsRouter
+from src.routes.cameras import router as CameraRouter
+from src.routes.cameras import start_camera
+from src.routes.events import router as EventRouter
+from src.routes.health import router as HealthRouter
 from src.routes.live_stream import router as VideoStreamRouter
+from src.routes.snapshots import router as SnapshotRouter
 from src.routes.websockets import router as WebSocketRouter
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    camera_registry.load()
+    event_store.start()
+    if WORKERS_ENABLED:
+        for camera in camera_registry.cameras.values():
+            if camera.autostart or camera.preload:
+                try:
+                    await start_camera(camera.id, standby=not camera.autostart)
+                except HTTPException as e:
+                    print(f"Could not start camera {camera.id}: {e.detail}")
+    yield
+    # Camera processes must not outlive the server
+    await camera_workers.stop_all()
+    # Held events go to the store before it stops
+    event_coalescer.flush()
+    event_store.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +47,11 @@ app.add_middleware(
 
 app.include_router(VideoStreamRouter, tags=["Video Stream"], prefix="")
 app.include_router(WebSocketRouter, tags=["WebSocket"], prefix="")
+app.include_router(CameraRouter, tags=["Cameras"], prefix="")
+app.include_router(EventRouter, tags=["Events"], prefix="")
+app.include_router(AnalyticsRouter, tags=["Analytics"], prefix="")
+app.include_router(SnapshotRouter, tags=["Snapshots"], prefix="")
+app.include_router(HealthRouter, tags=["Health"], prefix="")
 
 
 @app.get("/", tags=["Welcome"])
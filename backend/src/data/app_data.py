@@ -1,4 +1,8 @@
-from src.utils.image_utils import image_file_to_base64
+from collections import deque
+from typing import List, Optional
+from uuid import uuid4
+
+FACES_PATH = "./src/assets/images/faces"
 
 app_data = {
     "lookoutVehicles": ["R-183-JF", "L-656-XH"],
@@ -7,12 +11,91 @@ app_data = {
         {
             "name": "Modi G",
             "imgName": "modi1.jpg",
-            "imgBase64": image_file_to_base64("./src/assets/images/faces/modi1.jpg"),
         }
     ],
 }
 
 
+# Called with app_data after the lookout lists change
+app_data_listeners = []
+
+
+def notify_app_data_changed():
+    for listener in app_data_listeners:
+        listener(app_data)
+
+
+def face_url(img_name: str) -> str:
+    return f"/faces/{img_name}"
+
+
+class AppDataStore:
+    """app_data with a version bumped by every change and a log of the deltas.
+
+    Clients apply small add/remove deltas instead of receiving the whole dict,
+    and a reconnecting client that knows its version only gets what it
+    missed. The epoch changes on every server start, since versions do too.
+    """
+
+    def __init__(self, data: dict, max_deltas: int = 1000):
+        self.data = data
+        self.epoch = uuid4().hex[:12]
+        self.version = 0
+        self.deltas = deque(maxlen=max_deltas)
+
+    def snapshot(self) -> dict:
+        # Face images are fetched by reference from /faces
+        return {
+            "epoch": self.epoch,
+            "version": self.version,
+            "lookoutVehicles": list(self.data["lookoutVehicles"]),
+            "lookoutPersons": list(self.data["lookoutPersons"]),
+            "personInfos": [
+                {**person, "imgUrl": face_url(person["imgName"])}
+                for person in self.data["personInfos"]
+            ],
+        }
+
+    def _apply(self, op: str, key: str, item: str) -> dict:
+        self.version += 1
+        delta = {
+            "epoch": self.epoch,
+            "version": self.version,
+            "op": op,
+            "key": key,
+            "item": item,
+        }
+        self.deltas.append(delta)
+        notify_app_data_changed()
+        return delta
+
+    def add(self, key: str, item: str) -> Optional[dict]:
+        """Adds an item to a lookout list; None if it was already there."""
+        if item in self.data[key]:
+            return None
+        self.data[key].append(item)
+        return self._apply("add", key, item)
+
+    def remove(self, key: str, item: str) -> Optional[dict]:
+        """Removes an item from a lookout list; None if it was not there."""
+        if item not in self.data[key]:
+            return None
+        self.data[key].remove(item)
+        return self._apply("remove", key, item)
+
+    def deltas_since(self, epoch: str, version: int) -> Optional[List[dict]]:
+        """Deltas after ``version``, or None when the client needs a snapshot."""
+        if epoch != self.epoch or not 0 <= version <= self.version:
+            return None
+        oldest = self.deltas[0]["version"] if self.deltas else self.version + 1
+        if version < oldest - 1:
+            return None
+        return [delta for delta in self.deltas if delta["version"] > version]
+
+
+app_data_store = AppDataStore(app_data)
+
+
 rand_coordinates = [
     [25.437522431945933, 81.8608732799982],
     [25.43876020093485, 81.8628992178349],
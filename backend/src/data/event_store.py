@@ -0,0 +1,478 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..pipeline.events import event_listeners
+from ..utils.json_utils import dumps
+from ..utils.quantiles import value_bin
+
+EVENTS_DB = os.getenv("EVENTS_DB", "./src/assets/db/events.db")
+
+# Detector events kept as history; updates and removals amend them
+RECORDED_EVENTS = (
+    "server:red-light-violation",
+    "server:no-helmet-violation",
+    "server:overspeeding",
+    "server:wrong-way",
+    "server:pothole",
+    "server:vehicle-found",
+    "server:person_detected",
+)
+SPEED_UPDATE_EVENT = "server:update-overspeeding"
+REMOVE_EVENT = "server:remove-no-helmet-violation"
+
+# Rollup bucket sizes in ms; buckets start at multiples of these, in UTC
+ROLLUP_PERIODS = {"minute": 60_000, "hour": 3_600_000, "day": 86_400_000}
+# Minute rollups older than this are pruned; hours and days are kept
+MINUTE_RETENTION_MS = 2 * 86_400_000
+PRUNE_INTERVAL = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    event_type TEXT NOT NULL,
+    camera TEXT,
+    detected_at REAL NOT NULL,
+    class_name TEXT,
+    plate TEXT,
+    speed REAL,
+    speed_bin INTEGER,
+    data TEXT NOT NULL,
+    -- Set when a detector retracts the event; the row stays as an audit trail
+    -- but leaves queries and rollups
+    removed_at REAL
+);
+CREATE INDEX IF NOT EXISTS events_type_camera_time
+    ON events (event_type, camera, detected_at);
+CREATE INDEX IF NOT EXISTS events_plate ON events (plate) WHERE plate IS NOT NULL;
+CREATE INDEX IF NOT EXISTS events_time ON events (detected_at, id);
+
+-- Rollups, kept in step with the events table by the triggers below
+CREATE TABLE IF NOT EXISTS rollup_periods (
+    period TEXT PRIMARY KEY,
+    ms INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS event_counts (
+    period TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    camera TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (period, bucket, camera, event_type, class_name)
+) WITHOUT ROWID;
+-- A quantile sketch of overspeeding speeds per bucket: one count per speed bin
+CREATE TABLE IF NOT EXISTS speed_bins (
+    period TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    camera TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (period, bucket, camera, bin)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS events_rollup_insert AFTER INSERT ON events
+BEGIN
+    INSERT INTO event_counts
+        (period, bucket, camera, event_type, class_name, count)
+    SELECT period, CAST(NEW.detected_at / ms AS INTEGER) * ms,
+        coalesce(NEW.camera, ''), NEW.event_type, coalesce(NEW.class_name, ''), 1
+    FROM rollup_periods WHERE true
+    ON CONFLICT (period, bucket, camera, event_type, class_name)
+    DO UPDATE SET count = count + 1;
+    INSERT INTO speed_bins (period, bucket, camera, bin, count)
+    SELECT period, CAST(NEW.detected_at / ms AS INTEGER) * ms,
+        coalesce(NEW.camera, ''), NEW.speed_bin, 1
+    FROM rollup_periods WHERE NEW.speed_bin IS NOT NULL
+    ON CONFLICT (period, bucket, camera, bin) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS events_rollup_delete AFTER DELETE ON events
+WHEN OLD.removed_at IS NULL
+BEGIN
+    UPDATE event_counts SET count = count - 1
+    WHERE (period, bucket) IN (
+            SELECT period, CAST(OLD.detected_at / ms AS INTEGER) * ms
+            FROM rollup_periods
+        )
+        AND camera = coalesce(OLD.camera, '')
+        AND event_type = OLD.event_type
+        AND class_name = coalesce(OLD.class_name, '');
+    UPDATE speed_bins SET count = count - 1
+    WHERE (period, bucket) IN (
+            SELECT period, CAST(OLD.detected_at / ms AS INTEGER) * ms
+            FROM rollup_periods
+        )
+        AND camera = coalesce(OLD.camera, '')
+        AND bin = OLD.speed_bin;
+END;
+
+-- A retracted event leaves the rollups, and comes back if it is re-added
+CREATE TRIGGER IF NOT EXISTS events_rollup_removed AFTER UPDATE OF removed_at
+ON events
+WHEN (OLD.removed_at IS NULL) != (NEW.removed_at IS NULL)
+BEGIN
+    INSERT INTO event_counts
+        (period, bucket, camera, event_type, class_name, count)
+    SELECT period, CAST(NEW.detected_at / ms AS INTEGER) * ms,
+        coalesce(NEW.camera, ''), NEW.event_type, coalesce(NEW.class_name, ''),
+        CASE WHEN NEW.removed_at IS NULL THEN 1 ELSE -1 END
+    FROM rollup_periods WHERE true
+    ON CONFLICT (period, bucket, camera, event_type, class_name)
+    DO UPDATE SET count = count + excluded.count;
+    INSERT INTO speed_bins (period, bucket, camera, bin, count)
+    SELECT period, CAST(NEW.detected_at / ms AS INTEGER) * ms,
+        coalesce(NEW.camera, ''), NEW.speed_bin,
+        CASE WHEN NEW.removed_at IS NULL THEN 1 ELSE -1 END
+    FROM rollup_periods WHERE NEW.speed_bin IS NOT NULL
+    ON CONFLICT (period, bucket, camera, bin)
+    DO UPDATE SET count = count + excluded.count;
+END;
+
+-- A raised highest speed moves the event to another bin of the sketch
+CREATE TRIGGER IF NOT EXISTS events_rollup_speed AFTER UPDATE OF speed_bin ON events
+WHEN OLD.speed_bin IS NOT NEW.speed_bin AND NEW.removed_at IS NULL
+BEGIN
+    UPDATE speed_bins SET count = count - 1
+    WHERE (period, bucket) IN (
+            SELECT period, CAST(OLD.detected_at / ms AS INTEGER) * ms
+            FROM rollup_periods
+        )
+        AND camera = coalesce(OLD.camera, '')
+        AND bin = OLD.speed_bin;
+    INSERT INTO speed_bins (period, bucket, camera, bin, count)
+    SELECT period, CAST(NEW.detected_at / ms AS INTEGER) * ms,
+        coalesce(NEW.camera, ''), NEW.speed_bin, 1
+    FROM rollup_periods WHERE NEW.speed_bin IS NOT NULL
+    ON CONFLICT (period, bucket, camera, bin) DO UPDATE SET count = count + 1;
+END;
+"""
+
+# A repeated event is ignored, unless it was retracted: then it is restored
+INSERT = """
+INSERT INTO events
+    (event_id, event_type, camera, detected_at, class_name, plate, speed, speed_bin,
+     data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (event_id) DO UPDATE SET removed_at = NULL WHERE removed_at IS NOT NULL
+"""
+UPDATE_SPEED = """
+UPDATE events
+SET speed = ?, speed_bin = ?, data = json_set(data, '$.highestSpeed', ?)
+WHERE event_id = ? AND (speed IS NULL OR speed < ?)
+"""
+REMOVE = "UPDATE events SET removed_at = ? WHERE event_id = ? AND removed_at IS NULL"
+
+
+def connect(path: str, writer: bool = False) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=5.0)
+    if writer:
+        # WAL lets API reads run while the writer thread commits
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def _speed(data: Dict[str, Any]) -> Optional[float]:
+    speed = data.get("highestSpeed")
+    return None if speed is None else float(speed)
+
+
+def rebuild_rollups(connection: sqlite3.Connection):
+    """Recomputes every rollup from the events table, e.g. after a migration."""
+    connection.execute("DELETE FROM event_counts")
+    connection.execute("DELETE FROM speed_bins")
+    connection.execute(
+        """
+        INSERT INTO event_counts
+            (period, bucket, camera, event_type, class_name, count)
+        SELECT period, CAST(detected_at / ms AS INTEGER) * ms AS bucket,
+            coalesce(camera, '') AS cam, event_type,
+            coalesce(class_name, '') AS cls, count(*)
+        FROM events, rollup_periods
+        WHERE removed_at IS NULL
+        GROUP BY period, bucket, cam, event_type, cls
+        """
+    )
+    connection.execute(
+        """
+        INSERT INTO speed_bins (period, bucket, camera, bin, count)
+        SELECT period, CAST(detected_at / ms AS INTEGER) * ms AS bucket,
+            coalesce(camera, '') AS cam, speed_bin, count(*)
+        FROM events, rollup_periods
+        WHERE speed_bin IS NOT NULL AND removed_at IS NULL
+        GROUP BY period, bucket, cam, speed_bin
+        """
+    )
+
+
+def prune_rollups(connection: sqlite3.Connection, now_ms: float):
+    """Drops minute rollups past their retention and buckets emptied by removals."""
+    cutoff = now_ms - MINUTE_RETENTION_MS
+    for table in ("event_counts", "speed_bins"):
+        connection.execute(
+            f"DELETE FROM {table} WHERE (period = 'minute' AND bucket < ?) "
+            "OR count <= 0",
+            (cutoff,),
+        )
+
+
+def migrate(connection: sqlite3.Connection) -> bool:
+    """Brings a database created by an older version up to SCHEMA.
+
+    Returns True if the rollups must be rebuilt.
+    """
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(events)")}
+    if columns and "removed_at" not in columns:
+        # Removals used to delete rows; the triggers are recreated by SCHEMA
+        # to skip retracted ones
+        connection.execute("ALTER TABLE events ADD COLUMN removed_at REAL")
+        for trigger in ("events_rollup_delete", "events_rollup_speed"):
+            connection.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    if columns and "speed_bin" not in columns:
+        # The events table predates rollups: add the speed bins, then backfill
+        connection.execute("ALTER TABLE events ADD COLUMN speed_bin INTEGER")
+        connection.executemany(
+            "UPDATE events SET speed_bin = ? WHERE id = ?",
+            [
+                (value_bin(speed), row_id)
+                for row_id, speed in connection.execute(
+                    "SELECT id, speed FROM events WHERE speed IS NOT NULL"
+                ).fetchall()
+            ],
+        )
+        return True
+    return False
+
+
+def encode_cursor(detected_at: float, row_id: int) -> str:
+    return f"{detected_at!r}_{row_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    detected_at, _, row_id = cursor.rpartition("_")
+    try:
+        return float(detected_at), int(row_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+
+
+class EventStore:
+    """Detector events in SQLite, written in batches by a background thread.
+
+    ``record`` only puts the event on a queue, so the detector and event loops
+    never wait on the disk; if the writer falls ``max_pending`` events behind,
+    new ones are counted as dropped instead.
+    """
+
+    def __init__(
+        self,
+        path: str = EVENTS_DB,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        max_pending: int = 100_000,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> "EventStore":
+        if self._thread is not None:
+            return self
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = connect(self.path, writer=True)
+        try:
+            with connection:
+                migrated = migrate(connection)
+            connection.executescript(SCHEMA)
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO rollup_periods VALUES (?, ?)",
+                    ROLLUP_PERIODS.items(),
+                )
+                if migrated:
+                    rebuild_rollups(connection)
+        finally:
+            connection.close()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._write_loop, name="event-store", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """Stops the writer once every queued event is written."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def record(self, message: Dict[str, Any], camera: Optional[str] = None):
+        event_type = message.get("event")
+        data = message.get("data")
+        if not isinstance(data, dict) or "id" not in data:
+            return
+        speed = _speed(data)
+        if event_type in RECORDED_EVENTS:
+            op = (
+                "insert",
+                (
+                    str(data["id"]),
+                    event_type,
+                    camera,
+                    float(data.get("detectedAt") or 0),
+                    data.get("className"),
+                    data.get("plateNumber"),
+                    speed,
+                    None if speed is None else value_bin(speed),
+                    dumps(data),
+                ),
+            )
+        elif event_type == SPEED_UPDATE_EVENT:
+            if speed is None:
+                return
+            op = (
+                "update",
+                (speed, value_bin(speed), speed, str(data["id"]), speed),
+            )
+        elif event_type == REMOVE_EVENT:
+            op = ("remove", (time.time() * 1000, str(data["id"])))
+        else:
+            return
+        try:
+            self.pending.put_nowait(op)
+        except queue.Full:
+            self.dropped += 1
+
+    def _next_batch(self) -> List[tuple]:
+        try:
+            batch = [self.pending.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        connection = connect(self.path, writer=True)
+        statements = {"insert": INSERT, "update": UPDATE_SPEED, "remove": REMOVE}
+        last_pruned = 0.0
+        try:
+            while not (self._stop.is_set() and self.pending.empty()):
+                if time.monotonic() - last_pruned >= PRUNE_INTERVAL:
+                    with connection:
+                        prune_rollups(connection, time.time() * 1000)
+                    last_pruned = time.monotonic()
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                # One transaction per batch; runs of one kind go in one executemany
+                with connection:
+                    start = 0
+                    for end in range(1, len(batch) + 1):
+                        if end == len(batch) or batch[end][0] != batch[start][0]:
+                            connection.executemany(
+                                statements[batch[start][0]],
+                                [params for _, params in batch[start:end]],
+                            )
+                            start = end
+                self.written += len(batch)
+        finally:
+            connection.close()
+
+    def query(
+        self,
+        event_type: Optional[str] = None,
+        camera: Optional[str] = None,
+        class_name: Optional[str] = None,
+        plate: Optional[str] = None,
+        min_speed: Optional[float] = None,
+        max_speed: Optional[float] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_removed: bool = False,
+    ) -> Dict[str, Any]:
+        """Newest events first, one page at a time.
+
+        Pages are keyset-paginated on (detected_at, id): ``nextCursor`` marks
+        the last row returned, so deep pages cost the same as the first.
+        Retracted events are left out unless ``include_removed``; their
+        ``removedAt`` is set.
+        """
+        clauses, params = [], []
+        if not include_removed:
+            clauses.append("removed_at IS NULL")
+        for column, value in (
+            ("event_type", event_type),
+            ("camera", camera),
+            ("class_name", class_name),
+            ("plate", plate),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        for clause, value in (
+            ("speed >= ?", min_speed),
+            ("speed <= ?", max_speed),
+            ("detected_at >= ?", since),
+            ("detected_at < ?", until),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if cursor is not None:
+            clauses.append("(detected_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT id, event_type, camera, detected_at, data, removed_at FROM events "
+            f"{where} ORDER BY detected_at DESC, id DESC LIMIT ?"
+        )
+        connection = connect(self.path)
+        try:
+            rows = connection.execute(sql, [*params, limit]).fetchall()
+        finally:
+            connection.close()
+
+        items = [
+            {
+                "event": event_type,
+                "camera": camera,
+                "data": json.loads(data),
+                "removedAt": removed_at,
+            }
+            for _, event_type, camera, _, data, removed_at in rows
+        ]
+        next_cursor = (
+            encode_cursor(rows[-1][3], rows[-1][0]) if len(rows) == limit else None
+        )
+        return {"items": items, "nextCursor": next_cursor}
+
+    def status(self) -> dict:
+        return {
+            "pending": self.pending.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+event_store = EventStore()
+event_listeners.append(event_store.record)
@@ -0,0 +1,173 @@
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..utils.quantiles import quantiles
+from .event_store import ROLLUP_PERIODS, EventStore, connect, event_store
+
+NO_HELMET_EVENT = "server:no-helmet-violation"
+# A dashboard window spans at most this many periods (one more bucket once
+# rounded out to whole buckets)
+MAX_BUCKETS = 1440
+DEFAULT_WINDOW_MS = 86_400_000
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class Rollups:
+    """Dashboard queries answered from the event store's rollup tables.
+
+    The tables are updated by triggers as events are written, so a query
+    reads one row per bucket and series, however many events the window
+    holds; windows are capped at ``MAX_BUCKETS`` periods.
+    """
+
+    def __init__(self, store: EventStore):
+        self.store = store
+
+    def _window(
+        self, period: str, since: Optional[float], until: Optional[float]
+    ) -> Tuple[int, int]:
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown period {period!r}")
+        ms = ROLLUP_PERIODS[period]
+        until = time.time() * 1000 if until is None else until
+        # Whole buckets, from the one holding since to the one holding until;
+        # by default the last day of them, e.g. 1440 minutes or 24 hours
+        end = (int(until // ms) + 1) * ms
+        if since is None:
+            start = end - max(DEFAULT_WINDOW_MS, ms)
+        else:
+            if since >= until:
+                raise ValueError("since must be before until")
+            # Checked on the requested span: rounding out to whole buckets
+            # may add one, so a full day still fits at minute resolution
+            if until - since > MAX_BUCKETS * ms:
+                raise ValueError(f"Window spans more than {MAX_BUCKETS} {period}s")
+            start = int(since // ms) * ms
+        return start, end
+
+    def _select(self, sql: str, params: Sequence[Any]) -> List[tuple]:
+        connection = connect(self.store.path)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _filters(**columns: Optional[str]) -> Tuple[str, List[str]]:
+        clauses, params = [], []
+        for column, value in columns.items():
+            if value is not None:
+                clauses.append(f" AND {column} = ?")
+                params.append(value)
+        return "".join(clauses), params
+
+    def counts(
+        self,
+        period: str = "hour",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        camera: Optional[str] = None,
+        event_type: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Event counts per bucket, camera and event type."""
+        start, end = self._window(period, since, until)
+        where, params = self._filters(camera=camera, event_type=event_type)
+        rows = self._select(
+            "SELECT bucket, camera, event_type, sum(count) FROM event_counts "
+            f"WHERE period = ? AND bucket >= ? AND bucket < ?{where} "
+            "GROUP BY bucket, camera, event_type HAVING sum(count) > 0 "
+            "ORDER BY bucket",
+            [period, start, end, *params],
+        )
+        return {
+            "period": period,
+            "since": start,
+            "until": end,
+            "buckets": [
+                {"bucket": bucket, "camera": cam, "event": event, "count": count}
+                for bucket, cam, event, count in rows
+            ],
+        }
+
+    def speed_percentiles(
+        self,
+        period: str = "hour",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        camera: Optional[str] = None,
+        qs: Sequence[float] = DEFAULT_QUANTILES,
+    ) -> Dict[str, Any]:
+        """Percentiles of overspeeding speeds, within 1% of the exact values."""
+        qs = sorted(qs)
+        if any(not 0 <= q <= 1 for q in qs):
+            raise ValueError("Quantiles must be between 0 and 1")
+        start, end = self._window(period, since, until)
+        where, params = self._filters(camera=camera)
+        bins = self._select(
+            "SELECT bin, sum(count) FROM speed_bins "
+            f"WHERE period = ? AND bucket >= ? AND bucket < ?{where} GROUP BY bin",
+            [period, start, end, *params],
+        )
+        values = quantiles(bins, qs)
+        return {
+            "since": start,
+            "until": end,
+            "count": sum(count for _, count in bins),
+            "percentiles": {
+                f"p{q * 100:g}": round(value, 1) for q, value in zip(qs, values)
+            },
+        }
+
+    def helmet_violations(
+        self,
+        period: str = "hour",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        camera: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """No-helmet violations per camera, in total and per hour of the window."""
+        start, end = self._window(period, since, until)
+        where, params = self._filters(camera=camera)
+        rows = self._select(
+            "SELECT camera, sum(count) FROM event_counts "
+            "WHERE period = ? AND bucket >= ? AND bucket < ? AND event_type = ?"
+            f"{where} GROUP BY camera HAVING sum(count) > 0",
+            [period, start, end, NO_HELMET_EVENT, *params],
+        )
+        hours = (end - start) / ROLLUP_PERIODS["hour"]
+        return {
+            "since": start,
+            "until": end,
+            "cameras": {
+                cam: {"violations": count, "perHour": round(count / hours, 2)}
+                for cam, count in rows
+            },
+        }
+
+    def top_classes(
+        self,
+        period: str = "hour",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        camera: Optional[str] = None,
+        event_type: Optional[str] = None,
+        limit: int = 5,
+    ) -> Dict[str, Any]:
+        """The object classes with the most events in the window."""
+        start, end = self._window(period, since, until)
+        where, params = self._filters(camera=camera, event_type=event_type)
+        rows = self._select(
+            "SELECT class_name, sum(count) AS total FROM event_counts "
+            "WHERE period = ? AND bucket >= ? AND bucket < ? AND class_name != ''"
+            f"{where} GROUP BY class_name HAVING total > 0 "
+            "ORDER BY total DESC LIMIT ?",
+            [period, start, end, *params, limit],
+        )
+        return {
+            "since": start,
+            "until": end,
+            "classes": [{"className": name, "count": count} for name, count in rows],
+        }
+
+
+rollups = Rollups(event_store)
@@ -1,25 +1,26 @@
-import asyncio
 import time
-from collections import defaultdict
 from typing import List, Optional
 from uuid import uuid4
 
-import cv2
 import numpy as np
 import supervision as sv
-from tqdm import tqdm
-from ultralytics import YOLO
 
-from ..routes.websockets import ws_manager
-from ..utils.image_utils import encode_frame_to_base64, resize_frame
+from ..pipeline.plugin import DetectorPlugin, blank_frame
+from ..pipeline.runtime import FramePacket
+from ..utils.artifacts import annotation_style, load_video_info
+from ..utils.model_utils import class_ids_for, load_yolo
+from ..utils.postprocess import DetectionFilter
+from ..utils.track_store import TrackStateStore, removed_track_ids
 
 
-class NoHelmetDetector:
+class NoHelmetDetector(DetectorPlugin):
     # Define the specific class name for no-helmet detection
     # *** IMPORTANT: Change this if your model uses a different class name ***
     NO_HELMET_CLASS_NAME = "no_helmet"
     HELMET_CLASS_NAME = "helmet"
 
+    tunable_params = ("conf_score", "iou_threshold")
+
     def __init__(
         self,
         model_path: str,
@@ -27,19 +28,33 @@ class NoHelmetDetector:
         class_names: Optional[List[str]] = None,
         conf_score: float = 0.3,
         iou_threshold: Optional[float] = 0.5,
+        vehicle_model_path: Optional[str] = None,
+        head_ratio: float = 0.35,
     ):
         self.model_path = model_path
+        self.vehicle_model_path = vehicle_model_path
+        self.head_ratio = head_ratio
         self.video_path = video_path
         self.class_names = class_names
         self.conf_score = conf_score
         self.iou_threshold = iou_threshold
 
         # Load the model
-        self.yolo_model = YOLO(self.model_path)
+        self.yolo_model = load_yolo(self.model_path)
         self.model_class_names = self.yolo_model.names
 
+        # Cascaded mode: the vehicle model finds riders on motorcycles and
+        # the helmet model only sees their head crops
+        self.cascade = self.vehicle_model_path is not None
+        if self.cascade:
+            self.vehicle_model = load_yolo(self.vehicle_model_path)
+            self.motorcycle_class_id = class_ids_for(
+                self.vehicle_model.names, ["motorcycle"]
+            )[0]
+            self.person_class_id = class_ids_for(self.vehicle_model.names, ["person"])[0]
+
         # Video input info
-        self.video_info = sv.VideoInfo.from_video_path(video_path=self.video_path)
+        self.video_info = load_video_info(self.video_path)
         if self.video_info.fps == 0:
             self.video_info.fps = 30
         self.frame_delay = 1 / self.video_info.fps
@@ -54,23 +69,59 @@ class NoHelmetDetector:
         self._setup_annotators()
 
         # Object tracking info storage, including violation state
-        self.tracked_objects_info = defaultdict(
-            lambda: {
-                "violation_reported": False,
-                "no_helmet_count": 0,
-                "helmet_count": 0,
-                "uuid": None,
-            }
+        self.tracked_objects_info = TrackStateStore(
+            {
+                "object_id": (np.int64, 0),
+                "violation_reported": (bool, False),
+                "no_helmet_count": (np.int64, 0),
+                "helmet_count": (np.int64, 0),
+                "uuid": (object, None),
+            },
+            ttl=self.video_info.fps * 10,
         )
         self.object_counter = 0
+        self._setup_config()
+
+    def compile_config(self, params):
+        filters = {
+            "helmet_filter": DetectionFilter(
+                self.model_class_names,
+                class_names=self.class_names,
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            )
+        }
+        if self.cascade:
+            filters["rider_filter"] = DetectionFilter(
+                self.vehicle_model.names,
+                class_names=["motorcycle", "person"],
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            )
+        return filters
+
+    def warmup_models(self):
+        frame = blank_frame(self.video_info.resolution_wh)
+        if not self.cascade:
+            return {
+                self.model_path: lambda: self.config.helmet_filter.infer(
+                    self.yolo_model, frame
+                )
+            }
+        # The helmet model only sees batches of head crops in cascaded mode
+        width, height = self.video_info.resolution_wh
+        head = blank_frame((max(width // 16, 32), max(height // 16, 32)))
+        return {
+            self.vehicle_model_path: lambda: self.config.rider_filter.infer(
+                self.vehicle_model, frame
+            ),
+            self.model_path: lambda: self.config.helmet_filter.infer(
+                self.yolo_model, [head]
+            ),
+        }
 
     def _setup_annotators(self):
-        thickness = sv.calculate_optimal_line_thickness(
-            resolution_wh=self.video_info.resolution_wh
-        )
-        text_scale = sv.calculate_optimal_text_scale(
-            resolution_wh=self.video_info.resolution_wh
-        )
+        thickness, text_scale = annotation_style(self.video_info.resolution_wh)
         # Standard annotator
         self.box_annotator = sv.BoxAnnotator(thickness=thickness)
         self.label_annotator = sv.LabelAnnotator(
@@ -89,156 +140,163 @@ class NoHelmetDetector:
             color=sv.Color.RED,
         )
 
-    async def process_video(self):
-        frame_generator = sv.get_video_frames_generator(source_path=self.video_path)
-        current_frame_number = 0
-
-        with tqdm(
-            total=self.video_info.total_frames
-            if self.video_info.total_frames
-            else None,
-            desc="Frames Processed",
-            unit="frame",
-            dynamic_ncols=True,
-            bar_format="{desc}: {n}/{total} [{elapsed}<{remaining}, {rate_fmt}]"
-            if self.video_info.total_frames
-            else "{desc}: {n} [{elapsed}, {rate_fmt}]",
-        ) as progress_bar:
-            for frame in frame_generator:
-                start_time = time.time()
-                current_frame_number += 1
-
-                # Run detection
-                results = self.yolo_model(frame, verbose=False)[0]
-                detections = sv.Detections.from_ultralytics(results)
-
-                # Filter by confidence
-                detections = detections[detections.confidence > self.conf_score]
-
-                # Apply NMS if iou_threshold is provided
-                if self.iou_threshold is not None:
-                    detections = detections.with_nms(threshold=self.iou_threshold)
-
-                # Filter by class name if specified
-                if self.class_names is not None:
-                    class_mask = np.array(
-                        [
-                            self.model_class_names[cls_id] in self.class_names
-                            for cls_id in detections.class_id
-                        ],
-                        dtype=bool,
-                    )
-                    detections = detections[class_mask]
-
-                # Update tracker
-                detections = self.byte_track.update_with_detections(
-                    detections=detections
+    def _detect_helmets(self, frame, config):
+        # Run detection
+        detections = config.helmet_filter.detect(self.yolo_model, frame)
+
+        # Update tracker
+        detections = self.byte_track.update_with_detections(detections=detections)
+        verdicts = [self.model_class_names[cls_id] for cls_id in detections.class_id]
+        return detections, verdicts
+
+    def _detect_riders(self, frame, config):
+        # One pass of the vehicle model for motorcycles and people
+        detections = config.rider_filter.detect(self.vehicle_model, frame)
+
+        motorcycles = detections[detections.class_id == self.motorcycle_class_id]
+        persons = detections[detections.class_id == self.person_class_id]
+
+        # Helmet state is kept per motorcycle track
+        motorcycles = self.byte_track.update_with_detections(detections=motorcycles)
+        verdicts = [None] * len(motorcycles)
+        if len(motorcycles) == 0 or len(persons) == 0:
+            return motorcycles, verdicts
+
+        # Associate each person with the motorcycle covering most of their box
+        px1, py1, px2, py2 = np.split(persons.xyxy, 4, axis=1)
+        mx1, my1, mx2, my2 = (motorcycles.xyxy[:, i] for i in range(4))
+        inter_w = np.clip(np.minimum(px2, mx2) - np.maximum(px1, mx1), 0, None)
+        inter_h = np.clip(np.minimum(py2, my2) - np.maximum(py1, my1), 0, None)
+        person_area = np.maximum((px2 - px1) * (py2 - py1), 1)
+        overlap = inter_w * inter_h / person_area
+        rider_of = overlap.argmax(axis=1)
+        is_rider = overlap[np.arange(len(persons)), rider_of] > 0.1
+
+        # Crop the head region of every rider and run the helmet model in a batch
+        h, w = frame.shape[:2]
+        crops, crop_owners = [], []
+        for person_idx in np.flatnonzero(is_rider):
+            x1, y1, x2, y2 = persons.xyxy[person_idx]
+            head_y2 = y1 + (y2 - y1) * self.head_ratio
+            pad = (x2 - x1) * 0.1
+            x1, x2 = int(max(0, x1 - pad)), int(min(w, x2 + pad))
+            y1, head_y2 = int(max(0, y1)), int(min(h, head_y2))
+            if x2 - x1 < 2 or head_y2 - y1 < 2:
+                continue
+            crops.append(frame[y1:head_y2, x1:x2])
+            crop_owners.append(rider_of[person_idx])
+
+        if not crops:
+            return motorcycles, verdicts
+
+        results = config.helmet_filter.infer(self.yolo_model, crops)
+        for owner, result in zip(crop_owners, results):
+            heads = config.helmet_filter(sv.Detections.from_ultralytics(result))
+            if len(heads) == 0:
+                continue
+            verdict = self.model_class_names[heads.class_id[heads.confidence.argmax()]]
+
+            # Any bare-headed rider makes the motorcycle a violator for this frame
+            if verdicts[owner] != self.NO_HELMET_CLASS_NAME:
+                verdicts[owner] = verdict
+
+        return motorcycles, verdicts
+
+    def detect(self, packet: FramePacket):
+        if self.cascade:
+            detections, verdicts = self._detect_riders(packet.frame, packet.config)
+        else:
+            detections, verdicts = self._detect_helmets(packet.frame, packet.config)
+        packet.detections = detections
+        packet.removed_ids = removed_track_ids(self.byte_track)
+        packet.data["verdicts"] = verdicts
+
+    def apply_rules(self, packet: FramePacket):
+        detections = packet.detections
+        verdicts = packet.data["verdicts"]
+
+        labels = []
+        self.tracked_objects_info.advance(packet.removed_ids)
+        if len(detections) > 0 and detections.tracker_id is not None:
+            slots, _ = self.tracked_objects_info.touch(detections.tracker_id)
+            state = self.tracked_objects_info
+            for det_idx, slot in enumerate(slots):
+                class_name = verdicts[det_idx]
+                display_name = (
+                    "Motorcycle" if self.cascade else str(class_name).capitalize()
                 )
 
-                labels = []
-                if len(detections) > 0 and detections.tracker_id is not None:
-                    for det_idx, tracker_id in enumerate(detections.tracker_id):
-                        class_id = detections.class_id[det_idx]
-                        class_name = self.model_class_names[class_id]
-
-                        state = self.tracked_objects_info[tracker_id]
-                        # Assign unique object ID and UUID if first time seeing this tracker_id
-                        if "object_id" not in state:
-                            self.object_counter += 1
-                            state["object_id"] = self.object_counter
-                            state["uuid"] = str(uuid4())
-
-                        object_id = state["object_id"]
-                        display_label = f"{class_name.capitalize()} #{object_id}"
-
-                        # Update detection counts
-                        if class_name == self.NO_HELMET_CLASS_NAME:
-                            state["no_helmet_count"] += 1
-                        elif class_name == self.HELMET_CLASS_NAME:
-                            state["helmet_count"] += 1
-
-                        # Determine violation state
-                        is_violator = state["no_helmet_count"] > state["helmet_count"]
-
-                        if is_violator and not state["violation_reported"]:
-                            state["violation_reported"] = True
-                            display_label += " [Violator]"
-
-                            # --- Prepare and send violation snapshot ---
-                            violation_frame = frame.copy()
-                            violator_detection_data = sv.Detections(
-                                xyxy=np.array([detections.xyxy[det_idx]]),
-                                confidence=np.array([detections.confidence[det_idx]]),
-                                class_id=np.array([detections.class_id[det_idx]]),
-                                tracker_id=np.array([detections.tracker_id[det_idx]]),
-                            )
-                            violation_snapshot_label = f"{class_name.capitalize()}"
-
-                            violation_frame = self.violator_box_annotator.annotate(
-                                scene=violation_frame,
-                                detections=violator_detection_data,
-                            )
-                            violation_frame = self.violator_label_annotator.annotate(
-                                scene=violation_frame,
-                                detections=violator_detection_data,
-                                labels=[violation_snapshot_label],
-                            )
-
-                            resized_violation_frame = resize_frame(violation_frame)
-                            img_base64 = encode_frame_to_base64(resized_violation_frame)
-
-                            message = {
-                                "id": state["uuid"],
-                                "imgSrc": img_base64,
-                                "className": class_name,
-                                "detectedAt": time.time() * 1000,
-                            }
-                            await ws_manager.broadcast(
-                                {"event": "server:no-helmet-violation", "data": message}
-                            )
-
-                        elif not is_violator and state["violation_reported"]:
-                            state["violation_reported"] = False
-
-                            # --- Send update event to frontend ---
-                            message = {"id": state["uuid"]}
-                            await ws_manager.broadcast(
-                                {
-                                    "event": "server:remove-no-helmet-violation",
-                                    "data": message,
-                                }
-                            )
-
-                        elif is_violator:
-                            display_label += " [Violator]"
-
-                        labels.append(display_label)
-
-                # Annotate the main stream frame
-                annotated_frame = frame.copy()
-                if len(detections) > 0:
-                    annotated_frame = self.box_annotator.annotate(
-                        scene=annotated_frame, detections=detections
-                    )
-                    annotated_frame = self.label_annotator.annotate(
-                        scene=annotated_frame, detections=detections, labels=labels
-                    )
+                # Assign unique object ID and UUID if first time seeing this tracker_id
+                if state["object_id"][slot] == 0:
+                    self.object_counter += 1
+                    state["object_id"][slot] = self.object_counter
+                    state["uuid"][slot] = str(uuid4())
 
-                show_frame = resize_frame(annotated_frame, max_width=640)
-                _, buffer = cv2.imencode(".jpg", show_frame)
-                show_frame_bytes = buffer.tobytes()
+                object_id = state["object_id"][slot]
+                display_label = f"{display_name} #{object_id}"
 
-                yield (
-                    b"--frame\r\n"
-                    + b"Content-Type: image/jpeg\r\n\r\n"
-                    + show_frame_bytes
-                    + b"\r\n"
+                # Update detection counts
+                if class_name == self.NO_HELMET_CLASS_NAME:
+                    state["no_helmet_count"][slot] += 1
+                elif class_name == self.HELMET_CLASS_NAME:
+                    state["helmet_count"][slot] += 1
+
+                # Determine violation state
+                is_violator = (
+                    state["no_helmet_count"][slot] > state["helmet_count"][slot]
                 )
 
-                progress_bar.update(1)
+                if is_violator and not state["violation_reported"][slot]:
+                    state["violation_reported"][slot] = True
+                    display_label += " [Violator]"
+
+                    # --- Send violation with a snapshot ---
+                    message = {
+                        "id": state["uuid"][slot],
+                        "imgSrc": None,
+                        "className": class_name,
+                        "detectedAt": time.time() * 1000,
+                    }
+                    packet.emit(
+                        "server:no-helmet-violation",
+                        message,
+                        snapshot=(det_idx, display_name),
+                    )
+
+                elif not is_violator and state["violation_reported"][slot]:
+                    state["violation_reported"][slot] = False
 
-                processing_time = time.time() - start_time
-                if processing_time < self.frame_delay:
-                    time.sleep(self.frame_delay - processing_time)
+                    # --- Send update event to frontend ---
+                    packet.emit(
+                        "server:remove-no-helmet-violation", {"id": state["uuid"][slot]}
+                    )
 
-                await asyncio.sleep(0)  # Yield control to the event loop
+                elif is_violator:
+                    display_label += " [Violator]"
+
+                labels.append(display_label)
+
+        packet.data["labels"] = labels
+
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        # Annotate the main stream frame
+        annotated_frame = packet.frame.copy()
+        if len(packet.detections) > 0:
+            annotated_frame = self.box_annotator.annotate(
+                scene=annotated_frame, detections=packet.detections
+            )
+            annotated_frame = self.label_annotator.annotate(
+                scene=annotated_frame,
+                detections=packet.detections,
+                labels=packet.data["labels"],
+            )
+        return annotated_frame
+
+    def snapshot(self, packet: FramePacket, index: int, label: str) -> np.ndarray:
+        violator_detection = packet.detections[index : index + 1]
+        violation_frame = self.violator_box_annotator.annotate(
+            scene=packet.frame.copy(), detections=violator_detection
+        )
+        return self.violator_label_annotator.annotate(
+            scene=violation_frame, detections=violator_detection, labels=[label]
+        )
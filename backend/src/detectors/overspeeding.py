@@ -1,19 +1,30 @@
-import asyncio
 import time
-from collections import defaultdict, deque
+from typing import Optional
 from uuid import uuid4
 
 import cv2
 import numpy as np
 import supervision as sv
-from tqdm import tqdm
-from ultralytics import YOLO
 
-from ..routes.websockets import ws_manager
-from ..utils.image_utils import encode_frame_to_base64, resize_frame
+from ..pipeline.plugin import DetectorPlugin, blank_frame, split_by_mask
+from ..pipeline.runtime import FramePacket
+from ..utils.artifacts import annotation_style, load_video_info, road_transform
+from ..utils.model_utils import load_yolo
+from ..utils.postprocess import DetectionFilter
+from ..utils.track_history import TrackHistory
+from ..utils.track_store import TrackStateStore, removed_track_ids
+
+
+class OverspeedingDetector(DetectorPlugin):
+    tunable_params = (
+        "conf_score",
+        "iou_threshold",
+        "speed_limit",
+        "road_polygon",
+        "road_width",
+        "road_height",
+    )
 
-
-class OverspeedingDetector:
     def __init__(
         self,
         model_path: str,
@@ -25,6 +36,7 @@ class OverspeedingDetector:
         class_names: list = None,
         conf_score: float = 0.3,
         iou_threshold: float = 0.7,
+        speed_smoothing: Optional[float] = None,
     ):
         self.model_path = model_path
         self.video_path = video_path
@@ -35,9 +47,10 @@ class OverspeedingDetector:
         self.speed_limit = speed_limit
         self.conf_score = conf_score
         self.iou_threshold = iou_threshold
+        self.speed_smoothing = speed_smoothing  # EMA weight of the newest estimate
 
-        self.model = YOLO(self.model_path)
-        self.video_info = sv.VideoInfo.from_video_path(video_path=self.video_path)
+        self.model = load_yolo(self.model_path)
+        self.video_info = load_video_info(self.video_path)
 
         # Get video properties
         self.video_info.fps = 30 if self.video_info.fps == 0 else self.video_info.fps
@@ -48,35 +61,62 @@ class OverspeedingDetector:
             frame_rate=self.video_info.fps,
             track_activation_threshold=self.conf_score,
         )
-        self.coordinates = defaultdict(lambda: deque(maxlen=self.video_info.fps))
+        # Store tracked objects, evicted once ByteTrack drops them
+        self.tracked_objects_map = TrackStateStore(
+            {
+                "object_id": (np.int64, 0),
+                "uuid": (object, None),
+                "highest_speed": (np.float64, 0),
+                "speed": (np.float64, np.nan),
+                "violation_reported": (bool, False),
+            },
+            ttl=self.video_info.fps * 10,
+        )
 
-        # Store tracked objects
-        self.tracked_objects_map = {}
+        # Last second of bird's-eye y positions per track slot
+        self.y_history = TrackHistory(window=self.video_info.fps).attach(
+            self.tracked_objects_map
+        )
         self.object_count = 0
 
-        self._setup_transformer()
         self._setup_annotators()
-
-    def _setup_transformer(self):
-        target = np.array(
-            [
-                [0, 0],
-                [self.road_width - 1, 0],
-                [self.road_width - 1, self.road_height - 1],
-                [0, self.road_height - 1],
-            ]
-        ).astype(np.float32)
-        self.view_transformer = cv2.getPerspectiveTransform(
-            self.road_polygon.astype(np.float32), target
+        self._setup_config()
+
+    @classmethod
+    def compile_artifacts(cls, **kwargs):
+        video_info = super().compile_artifacts(**kwargs)
+        road_transform(
+            np.array(kwargs["road_polygon"]),
+            kwargs["road_width"],
+            kwargs["road_height"],
         )
+        return video_info
+
+    def compile_config(self, params):
+        return {
+            "detection_filter": DetectionFilter(
+                self.model.names,
+                class_names=self.class_names,
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            ),
+            "view_transformer": road_transform(
+                np.array(params["road_polygon"]),
+                params["road_width"],
+                params["road_height"],
+            ),
+        }
+
+    def warmup_models(self):
+        frame = blank_frame(self.video_info.resolution_wh)
+        return {
+            self.model_path: lambda: self.config.detection_filter.infer(
+                self.model, frame
+            )
+        }
 
     def _setup_annotators(self):
-        thickness = sv.calculate_optimal_line_thickness(
-            resolution_wh=self.video_info.resolution_wh
-        )
-        text_scale = sv.calculate_optimal_text_scale(
-            resolution_wh=self.video_info.resolution_wh
-        )
+        thickness, text_scale = annotation_style(self.video_info.resolution_wh)
         color_blue, color_red = sv.Color(r=0, g=0, b=255), sv.Color(r=255, g=0, b=0)
 
         self.box_annotators = {
@@ -104,205 +144,136 @@ class OverspeedingDetector:
             color=color_red,
         )
 
-    def _transform_points(self, points: np.ndarray) -> np.ndarray:
+    def _estimate_speeds(self, slots: np.ndarray):
+        ready = self.y_history.counts[slots] >= self.video_info.fps / 2
+        speeds = np.zeros(len(slots))
+
+        # Metres per frame from a robust line fit over the window, in km/h
+        speeds[ready] = (
+            np.abs(self.y_history.slopes(slots[ready])) * self.video_info.fps * 3.6
+        )
+
+        if self.speed_smoothing is not None:
+            previous = self.tracked_objects_map["speed"][slots]
+            smoothed = np.where(
+                np.isnan(previous),
+                speeds,
+                self.speed_smoothing * speeds + (1 - self.speed_smoothing) * previous,
+            )
+            speeds = np.where(ready, smoothed, 0)
+            self.tracked_objects_map["speed"][slots[ready]] = speeds[ready]
+
+        return speeds, ready
+
+    def _transform_points(self, points: np.ndarray, m: np.ndarray) -> np.ndarray:
         if points.size == 0:
             return points
         reshaped_points = points.reshape(-1, 1, 2).astype(np.float32)
-        transformed_points = cv2.perspectiveTransform(
-            reshaped_points, self.view_transformer
-        )
+        transformed_points = cv2.perspectiveTransform(reshaped_points, m)
         return transformed_points.reshape(-1, 2)
 
-    async def process_video(self):
-        frame_generator = sv.get_video_frames_generator(source_path=self.video_path)
-
-        with tqdm(
-            desc="Frames Processed",
-            unit="frame",
-            dynamic_ncols=True,
-            bar_format="{desc}: {n} [{elapsed}, {rate_fmt}]",
-        ) as progress_bar:
-            for frame in frame_generator:
-                start_time = time.time()
-
-                # Perform object detection
-                detections = sv.Detections.from_ultralytics(
-                    self.model(frame, verbose=False)[0]
-                )
-
-                # Filter by class if specified
-                model_class_names = self.model.names
-                if self.class_names is not None:
-                    class_mask = np.isin(
-                        [model_class_names[cls_id] for cls_id in detections.class_id],
-                        self.class_names,
-                    )
-                    detections = detections[class_mask]
-
-                detections = detections[detections.confidence > self.conf_score]
-                detections = detections.with_nms(threshold=self.iou_threshold)
-                detections = self.byte_track.update_with_detections(
-                    detections=detections
-                )
-
-                # Transform points and calculate speeds
-                points = detections.get_anchors_coordinates(
-                    anchor=sv.Position.BOTTOM_CENTER
-                )
-                points = self._transform_points(points=points).astype(int)
-
-                labels, speeds, violator_mask = [], [], []
-                for tracker_id, [_, y], class_id in zip(
-                    detections.tracker_id, points, detections.class_id
-                ):
-                    self.coordinates[tracker_id].append(y)
-                    current_class_name = model_class_names[class_id]
-
-                    if len(self.coordinates[tracker_id]) < self.video_info.fps / 2:
-                        labels.append(f"#{tracker_id}")
-                        speeds.append(0)
-                        violator_mask.append(False)
-                    else:
-                        coordinate_start = self.coordinates[tracker_id][-1]
-                        coordinate_end = self.coordinates[tracker_id][0]
-                        distance = abs(coordinate_start - coordinate_end)
-                        elapsed_time = (
-                            len(self.coordinates[tracker_id]) / self.video_info.fps
-                        )
-                        speed = distance / elapsed_time * 3.6
-                        speeds.append(speed)
-                        is_violator = speed > self.speed_limit
-                        violator_mask.append(is_violator)
-
-                        if tracker_id not in self.tracked_objects_map:
-                            self.object_count += 1
-                            self.tracked_objects_map[tracker_id] = {
-                                "object_id": self.object_count,
-                                "uuid": str(uuid4()),  # Assign a unique ID
-                                "highest_speed": 0,  # Initialize highest speed
-                                "violation_reported": False,
-                            }
-
-                        state = self.tracked_objects_map[tracker_id]
-                        if is_violator and not state["violation_reported"]:
-                            state["violation_reported"] = True
-                            labels.append(
-                                f"#{tracker_id} [{int(speed)} Km/h] [Violator]"
-                            )
-
-                            # Prepare violator frame
-                            violator_index = np.where(
-                                detections.tracker_id == tracker_id
-                            )[0][0]
-                            violator_detection = sv.Detections(
-                                xyxy=np.array([detections.xyxy[violator_index]]),
-                                confidence=np.array(
-                                    [detections.confidence[violator_index]]
-                                ),
-                                class_id=np.array(
-                                    [detections.class_id[violator_index]]
-                                ),
-                                tracker_id=np.array([tracker_id]),
-                            )
-                            violator_frame = frame.copy()
-                            violator_frame = self.trace_annotator.annotate(
-                                scene=violator_frame, detections=violator_detection
-                            )
-                            violator_frame = self.box_annotators[True].annotate(
-                                scene=violator_frame, detections=violator_detection
-                            )
-                            violator_frame = self.label_annotators[True].annotate(
-                                scene=violator_frame,
-                                detections=violator_detection,
-                                labels=[labels[-1]],
-                            )
-                            resized_frame = resize_frame(violator_frame)
-                            img_base64 = encode_frame_to_base64(resized_frame)
-
-                            # Send violator data
-                            message = {
-                                "id": state["uuid"],
-                                "imgSrc": img_base64,
-                                "highestSpeed": int(speed),
-                                "detectedAt": time.time() * 1000,
-                                "className": current_class_name,
-                            }
-                            await ws_manager.broadcast(
-                                {"event": "server:overspeeding", "data": message}
-                            )
-
-                        elif is_violator:
-                            labels.append(
-                                f"#{tracker_id} [{int(speed)} Km/h] [Violator]"
-                            )
-
-                            # Update highest speed for the violated car
-                            if speed > state["highest_speed"]:
-                                state["highest_speed"] = speed
-                                await ws_manager.broadcast(
-                                    {
-                                        "event": "server:update-overspeeding",
-                                        "data": {
-                                            "id": state["uuid"],
-                                            "highestSpeed": int(state["highest_speed"]),
-                                        },
-                                    }
-                                )
-                        else:
-                            labels.append(f"#{tracker_id} [{int(speed)} Km/h]")
-
-                # Annotate frame
-                violator_mask = np.array(violator_mask, dtype=bool)
-                dets = {
-                    False: detections[~violator_mask],
-                    True: detections[violator_mask],
-                }
-                labs = {
-                    False: [
-                        label_text
-                        for i, label_text in enumerate(labels)
-                        if not violator_mask[i]
-                    ],
-                    True: [
-                        label_text
-                        for i, label_text in enumerate(labels)
-                        if violator_mask[i]
-                    ],
+    def detect(self, packet: FramePacket):
+        # Perform object detection
+        detections = packet.config.detection_filter.detect(self.model, packet.frame)
+        packet.detections = self.byte_track.update_with_detections(
+            detections=detections
+        )
+        packet.removed_ids = removed_track_ids(self.byte_track)
+
+    def apply_rules(self, packet: FramePacket):
+        detections = packet.detections
+        model_class_names = self.model.names
+
+        self.tracked_objects_map.advance(packet.removed_ids)
+        slots, _ = self.tracked_objects_map.touch(detections.tracker_id)
+        state = self.tracked_objects_map
+
+        # Transform points and calculate speeds
+        points = detections.get_anchors_coordinates(anchor=sv.Position.BOTTOM_CENTER)
+        points = self._transform_points(points, packet.config.view_transformer)
+        self.y_history.push(slots, points[:, 1])
+
+        # Speeds for all tracks in one vectorized step
+        speeds, ready = self._estimate_speeds(slots)
+        violator_mask = ready & (speeds > packet.config.speed_limit)
+
+        labels = []
+        for i, (tracker_id, slot, speed, is_ready, is_violator, class_id) in enumerate(
+            zip(
+                detections.tracker_id,
+                slots,
+                speeds,
+                ready,
+                violator_mask,
+                detections.class_id,
+            )
+        ):
+            current_class_name = model_class_names[class_id]
+
+            if not is_ready:
+                labels.append(f"#{tracker_id}")
+                continue
+
+            if state["object_id"][slot] == 0:
+                self.object_count += 1
+                state["object_id"][slot] = self.object_count
+                state["uuid"][slot] = str(uuid4())  # Assign a unique ID
+
+            if is_violator and not state["violation_reported"][slot]:
+                state["violation_reported"][slot] = True
+                labels.append(f"#{tracker_id} [{int(speed)} Km/h] [Violator]")
+
+                # Send violator data
+                message = {
+                    "id": state["uuid"][slot],
+                    "imgSrc": None,
+                    "highestSpeed": int(speed),
+                    "detectedAt": time.time() * 1000,
+                    "className": current_class_name,
                 }
+                packet.emit("server:overspeeding", message, snapshot=(i, labels[-1]))
 
-                annotated_frame = frame.copy()
-                for violator in (False, True):
-                    annotated_frame = self.box_annotators[violator].annotate(
-                        scene=annotated_frame, detections=dets[violator]
-                    )
-                    annotated_frame = self.label_annotators[violator].annotate(
-                        scene=annotated_frame,
-                        detections=dets[violator],
-                        labels=labs[violator],
-                    )
-                annotated_frame = self.trace_annotator.annotate(
-                    scene=annotated_frame, detections=detections
-                )
-
-                # Display frame
-                show_frame = resize_frame(annotated_frame, max_width=640)
+            elif is_violator:
+                labels.append(f"#{tracker_id} [{int(speed)} Km/h] [Violator]")
 
-                # Encode frame in JPEG format
-                _, buffer = cv2.imencode(".jpg", show_frame)
-                show_frame_bytes = buffer.tobytes()
+                # Update highest speed for the violated car
+                if speed > state["highest_speed"][slot]:
+                    state["highest_speed"][slot] = speed
+                    packet.emit(
+                        "server:update-overspeeding",
+                        {"id": state["uuid"][slot], "highestSpeed": int(speed)},
+                    )
+            else:
+                labels.append(f"#{tracker_id} [{int(speed)} Km/h]")
 
-                # Yield the frame with a specific format for streaming
-                yield (
-                    b"--frame\r\n"
-                    + b"Content-Type: image/jpeg\r\n\r\n"
-                    + show_frame_bytes
-                    + b"\r\n"
-                )
+        packet.data["labels"] = labels
+        packet.data["violator_mask"] = violator_mask
 
-                progress_bar.update(1)
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        groups = split_by_mask(
+            packet.detections, packet.data["labels"], packet.data["violator_mask"]
+        )
 
-                processing_time = time.time() - start_time
-                if processing_time < self.frame_delay:
-                    time.sleep(self.frame_delay - processing_time)
+        annotated_frame = packet.frame.copy()
+        for violator, (detections, labels) in groups.items():
+            annotated_frame = self.box_annotators[violator].annotate(
+                scene=annotated_frame, detections=detections
+            )
+            annotated_frame = self.label_annotators[violator].annotate(
+                scene=annotated_frame, detections=detections, labels=labels
+            )
+        return self.trace_annotator.annotate(
+            scene=annotated_frame, detections=packet.detections
+        )
 
-                await asyncio.sleep(0)  # Yield control to the event loop
+    def snapshot(self, packet: FramePacket, index: int, label: str) -> np.ndarray:
+        violator_detection = packet.detections[index : index + 1]
+        violator_frame = self.trace_annotator.annotate(
+            scene=packet.frame.copy(), detections=violator_detection
+        )
+        violator_frame = self.box_annotators[True].annotate(
+            scene=violator_frame, detections=violator_detection
+        )
+        return self.label_annotators[True].annotate(
+            scene=violator_frame, detections=violator_detection, labels=[label]
+        )
@@ -1,31 +1,45 @@
-import asyncio
-import base64
 import os
 import time
-from typing import List
+from typing import List, Optional
 from uuid import uuid4
 
 import cv2
-import cvzone
+import numpy as np
 import supervision as sv
-from deepface import DeepFace
-from tqdm import tqdm
 
 from ..data.app_data import app_data
-from ..routes.websockets import ws_manager
+from ..faces.backends import create_face_backend
+from ..faces.engine import FaceEngine
+from ..pipeline.plugin import DetectorPlugin, blank_frame
+from ..pipeline.runtime import FramePacket
 from ..utils.app_data_utils import get_person_name_by_img
+from ..utils.artifacts import load_video_info
 from ..utils.image_utils import resize_frame
+from ..utils.model_utils import load_yolo
+from ..utils.postprocess import DetectionFilter
+from ..utils.track_store import TrackStateStore, removed_track_ids
 
 FACES_PATH = "./src/assets/images/faces"
 
 
-class PersonDetector:
+class PersonDetector(DetectorPlugin):
+    tunable_params = ("conf_score", "iou_threshold", "recheck_interval")
+
     def __init__(
         self,
         video_path: str,
+        model_path: str = "./src/assets/weights/yolo11n.pt",
         person_file_names: List[str] = ["modi1.jpg"],
+        face_backend: Optional[str] = None,
+        conf_score: float = 0.3,
+        iou_threshold: float = 0.7,
+        recheck_interval: int = 30,
     ):
+        self.model_path = model_path
         self.video_path = video_path
+        self.conf_score = conf_score
+        self.iou_threshold = iou_threshold
+        self.recheck_interval = recheck_interval
         self.file_names = [
             name
             for name in person_file_names
@@ -33,130 +47,140 @@ class PersonDetector:
         ]
         self.tracked_persons_info = {}  # Track reported status per reference face
 
+        # Embed each lookout face once up front instead of on every frame
+        self.face_engine = FaceEngine(backend=create_face_backend(face_backend))
+        for name in self.file_names:
+            self.face_engine.add(name, os.path.join(FACES_PATH, name))
+
         # Video input info
-        self.video_info = sv.VideoInfo.from_video_path(video_path=self.video_path)
+        self.video_info = load_video_info(self.video_path)
         if self.video_info.fps == 0:
             self.video_info.fps = 30
         self.frame_delay = 1 / self.video_info.fps
 
-    async def process_video(self):
-        frame_generator = sv.get_video_frames_generator(source_path=self.video_path)
-        current_frame_number = 0
-
-        with tqdm(
-            total=self.video_info.total_frames
-            if self.video_info.total_frames
-            else None,
-            desc="Frames Processed",
-            unit="frame",
-            dynamic_ncols=True,
-            bar_format="{desc}: {n}/{total} [{elapsed}<{remaining}, {rate_fmt}]"
-            if self.video_info.total_frames
-            else "{desc}: {n} [{elapsed}, {rate_fmt}]",
-        ) as progress_bar:
-            for frame in frame_generator:
-                start_time = time.time()
-                current_frame_number += 1
-
-                for face_img in self.file_names:
-                    ref_img_path = f"{FACES_PATH}/{face_img}"
-
-                    try:
-                        result = DeepFace.verify(
-                            ref_img_path,
-                            frame,
-                            model_name="VGG-Face",
-                            enforce_detection=False,
-                        )
-                    except ValueError:
-                        continue
-
-                    if result["verified"]:
-                        if (
-                            "facial_areas" in result
-                            and "img2" in result["facial_areas"]
-                        ):
-                            x, y, w, h = (
-                                result["facial_areas"]["img2"]["x"],
-                                result["facial_areas"]["img2"]["y"],
-                                result["facial_areas"]["img2"]["w"],
-                                result["facial_areas"]["img2"]["h"],
-                            )
-
-                            # Draw annotations immediately after verification for this face
-                            cvzone.cornerRect(frame, (x, y, w, h))
-                            cvzone.putTextRect(
-                                frame,
-                                text=f"DETECTED: {get_person_name_by_img(app_data['personInfos'], face_img)}",
-                                pos=(max(0, x), max(30, y)),
-                                font=cv2.FONT_HERSHEY_DUPLEX,
-                                scale=0.6,
-                                thickness=1,
-                                offset=3,
-                            )
-
-                            # Check if we have already reported this person
-                            if not self.tracked_persons_info.get(face_img, False):
-                                self.tracked_persons_info[face_img] = True
-
-                                # Check if coordinates are valid before proceeding
-                                if (
-                                    x >= 0
-                                    and y >= 0
-                                    and w > 0
-                                    and h > 0
-                                    and (y + h) <= frame.shape[0]
-                                    and (x + w) <= frame.shape[1]
-                                ):
-                                    # Instead of cropping, resize the *annotated* frame for the WebSocket message
-                                    ws_frame = resize_frame(frame, max_width=320)
-                                    _, buffer = cv2.imencode(".jpg", ws_frame)
-                                    img_base64 = base64.b64encode(buffer).decode(
-                                        "utf-8"
-                                    )
-
-                                    message = {
-                                        "id": str(uuid4()),
-                                        "personRef": face_img,
-                                        "personName": get_person_name_by_img(
-                                            app_data["personInfos"], face_img
-                                        ),
-                                        "imgSrc": img_base64,
-                                        "detectedAt": time.time() * 1000,
-                                    }
-
-                                    await ws_manager.broadcast(
-                                        {
-                                            "event": "server:person_detected",
-                                            "data": message,
-                                        }
-                                    )
-                                else:
-                                    print(
-                                        f"Warning: Invalid face coordinates for {face_img} after verification. Skipping snapshot."
-                                    )
-                                    self.tracked_persons_info[face_img] = False
-
-                        else:
-                            print(
-                                f"Warning: Face verified for {face_img} but no facial area data found."
-                            )
-
-                show_frame = resize_frame(frame, max_width=640)
-                _, buffer = cv2.imencode(".jpg", show_frame)
-                show_frame_bytes = buffer.tobytes()
-
-                yield (
-                    b"--frame\r\n"
-                    + b"Content-Type: image/jpeg\r\n\r\n"
-                    + show_frame_bytes
-                    + b"\r\n"
-                )
-
-                progress_bar.update(1)
-
-                processing_time = time.time() - start_time
-                if processing_time < self.frame_delay:
-                    time.sleep(self.frame_delay - processing_time)
-
-                await asyncio.sleep(0)
+        # Person detector and tracker used to carry identities between checks
+        self.yolo_model = load_yolo(self.model_path)
+        self.byte_track = sv.ByteTrack(
+            frame_rate=self.video_info.fps,
+            track_activation_threshold=self.conf_score,
+        )
+
+        # Identity per person track and the frame it was last checked on
+        self.tracked_objects_info = TrackStateStore(
+            {
+                "name": (object, None),
+                "last_checked": (np.int64, -1),
+            },
+            ttl=self.video_info.fps * 10,
+        )
+        self._setup_config()
+
+    def compile_config(self, params):
+        return {
+            "detection_filter": DetectionFilter(
+                self.yolo_model.names,
+                class_names=["person"],
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            )
+        }
+
+    def warmup_models(self):
+        frame = blank_frame(self.video_info.resolution_wh)
+        # Faces are only searched inside person crops
+        width, height = self.video_info.resolution_wh
+        person = blank_frame((max(width // 6, 64), max(height // 3, 64)))
+        return {
+            self.model_path: lambda: self.config.detection_filter.infer(
+                self.yolo_model, frame
+            ),
+            self.face_engine.backend.name: lambda: self.face_engine.recognize(person),
+        }
+
+    def _identify(self, frame, person_box):
+        x1, y1, x2, y2 = map(int, person_box)
+        person_region = frame[max(0, y1) : y2, max(0, x1) : x2]
+        if person_region.size == 0:
+            return None
+
+        # Faces are searched only inside the person crop
+        for face in self.face_engine.recognize(person_region):
+            if face["name"] is not None:
+                return face["name"]
+        return None
+
+    def detect(self, packet: FramePacket):
+        # Follow people with the detector and tracker, which is far
+        # cheaper than running face recognition on every frame
+        detections = packet.config.detection_filter.detect(
+            self.yolo_model, packet.frame
+        )
+        packet.detections = self.byte_track.update_with_detections(
+            detections=detections
+        )
+        packet.removed_ids = removed_track_ids(self.byte_track)
+
+    def apply_rules(self, packet: FramePacket):
+        detections = packet.detections
+
+        self.tracked_objects_info.advance(packet.removed_ids)
+        slots, _ = self.tracked_objects_info.touch(detections.tracker_id)
+        state = self.tracked_objects_info
+        recheck_interval = packet.config.recheck_interval
+        for xyxy, slot in zip(detections.xyxy, slots):
+            # Recognize faces only for new tracks and periodically
+            # afterwards; the identity is carried along the track
+            if (
+                state["last_checked"][slot] < 0
+                or packet.index - state["last_checked"][slot] >= recheck_interval
+            ):
+                state["last_checked"][slot] = packet.index
+                name = self._identify(packet.frame, xyxy)
+                if name is not None:
+                    state["name"][slot] = name
+
+            face_img = state["name"][slot]
+            if face_img is None:
+                continue
+
+            # Check if we have already reported this person
+            if not self.tracked_persons_info.get(face_img, False):
+                self.tracked_persons_info[face_img] = True
+                message = {
+                    "id": str(uuid4()),
+                    "personRef": face_img,
+                    "personName": get_person_name_by_img(
+                        app_data["personInfos"], face_img
+                    ),
+                    "imgSrc": None,
+                    "detectedAt": time.time() * 1000,
+                }
+                packet.emit("server:person_detected", message, snapshot=(None, None))
+
+        packet.data["names"] = state["name"][slots]
+
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        # Only needed once a stream runs, so not imported with the module
+        import cvzone
+
+        annotated_frame = packet.frame.copy()
+        for xyxy, face_img in zip(packet.detections.xyxy, packet.data["names"]):
+            if face_img is None:
+                continue
+
+            x1, y1, x2, y2 = map(int, xyxy)
+            cvzone.cornerRect(annotated_frame, (x1, y1, x2 - x1, y2 - y1))
+            cvzone.putTextRect(
+                annotated_frame,
+                text=f"DETECTED: {get_person_name_by_img(app_data['personInfos'], face_img)}",
+                pos=(max(0, x1), max(30, y1)),
+                font=cv2.FONT_HERSHEY_DUPLEX,
+                scale=0.6,
+                thickness=1,
+                offset=3,
+            )
+        return annotated_frame
+
+    def snapshot(self, packet: FramePacket, index: int, label: str) -> np.ndarray:
+        # The whole annotated frame, shrunk for the WebSocket message
+        return resize_frame(packet.annotated, max_width=320)
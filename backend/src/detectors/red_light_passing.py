@@ -1,18 +1,21 @@
-import asyncio
 import time
 from uuid import uuid4
 
-import cv2
 import numpy as np
 import supervision as sv
-from tqdm import tqdm
-from ultralytics import YOLO
 
-from ..routes.websockets import ws_manager
-from ..utils.image_utils import encode_frame_to_base64, resize_frame
+from ..pipeline.plugin import DetectorPlugin, blank_frame, split_by_mask
+from ..pipeline.runtime import FramePacket
+from ..utils.artifacts import annotation_style, compile_zone_map, load_video_info
+from ..utils.model_utils import load_yolo
+from ..utils.postprocess import DetectionFilter
+from ..utils.track_store import TrackStateStore, removed_track_ids
+from ..utils.zones import ZoneMap
 
 
-class RedLightCrossingDetector:
+class RedLightCrossingDetector(DetectorPlugin):
+    tunable_params = ("conf_score", "iou_threshold", "safe_zone_polygon")
+
     def __init__(
         self,
         model_path: str,
@@ -33,8 +36,8 @@ class RedLightCrossingDetector:
         self.safe_zone_polygon = np.array(safe_zone_polygon)
 
         # Load the YOLO model
-        self.yolo_model = YOLO(self.model_path)
-        self.video_info = sv.VideoInfo.from_video_path(video_path=self.video_path)
+        self.yolo_model = load_yolo(self.model_path)
+        self.video_info = load_video_info(self.video_path)
 
         # Get video properties
         self.video_info.fps = 30 if self.video_info.fps == 0 else self.video_info.fps
@@ -48,17 +51,32 @@ class RedLightCrossingDetector:
             track_activation_threshold=self.conf_score,
         )
 
-        # Store tracked objects
-        self.tracked_objects_map = {}
+        # Store tracked objects, evicted once ByteTrack drops them
+        self.tracked_objects_map = TrackStateStore(
+            {
+                "object_id": (np.int64, 0),
+                "was_in_safe_zone": (bool, False),
+                "in_safe_zone": (bool, False),
+                "violation_reported": (bool, False),
+            },
+            ttl=self.video_info.fps * 10,
+        )
         self.object_count = 0
+        self._setup_config()
+
+    @classmethod
+    def compile_artifacts(cls, **kwargs):
+        video_info = super().compile_artifacts(**kwargs)
+        compile_zone_map(
+            ZoneMap(
+                video_info.resolution_wh,
+                {"safe_zone": np.array(kwargs["safe_zone_polygon"])},
+            )
+        )
+        return video_info
 
     def _setup_annotators(self):
-        thickness = sv.calculate_optimal_line_thickness(
-            resolution_wh=self.video_info.resolution_wh
-        )
-        text_scale = sv.calculate_optimal_text_scale(
-            resolution_wh=self.video_info.resolution_wh
-        )
+        thickness, text_scale = annotation_style(self.video_info.resolution_wh)
         color_blue, color_red = sv.Color(r=0, g=0, b=255), sv.Color(r=255, g=0, b=0)
 
         self.box_annotators = {
@@ -79,210 +97,136 @@ class RedLightCrossingDetector:
                 color=color_red,
             ),
         }
-        self.polygon_zone = sv.PolygonZone(polygon=self.safe_zone_polygon)
-        self.polygon_zone_annotator = sv.PolygonZoneAnnotator(
-            zone=self.polygon_zone,
-            color=color_red,
-            thickness=thickness * 2,
-            display_in_zone_count=False,
-            opacity=0.1,
-        )
 
-    def _is_violator(self, tracker_state):
-        return tracker_state["was_in_safe_zone"] and not tracker_state["in_safe_zone"]
+    def compile_config(self, params):
+        safe_zone_polygon = np.array(params["safe_zone_polygon"])
+        thickness, _ = annotation_style(self.video_info.resolution_wh)
+        return {
+            "detection_filter": DetectionFilter(
+                self.yolo_model.names,
+                class_names=self.class_names,
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            ),
+            "zones": compile_zone_map(
+                ZoneMap(self.video_info.resolution_wh, {"safe_zone": safe_zone_polygon})
+            ),
+            "polygon_zone_annotator": sv.PolygonZoneAnnotator(
+                zone=sv.PolygonZone(polygon=safe_zone_polygon),
+                color=sv.Color(r=255, g=0, b=0),
+                thickness=thickness * 2,
+                display_in_zone_count=False,
+                opacity=0.1,
+            ),
+        }
 
-    async def process_video(self):
-        frame_generator = sv.get_video_frames_generator(source_path=self.video_path)
+    def warmup_models(self):
+        frame = blank_frame(self.video_info.resolution_wh)
+        return {
+            self.model_path: lambda: self.config.detection_filter.infer(
+                self.yolo_model, frame
+            )
+        }
 
-        with tqdm(
-            desc="Frames Processed",
-            unit="frame",
-            dynamic_ncols=True,
-            bar_format="{desc}: {n} [{elapsed}, {rate_fmt}]",
-        ) as progress_bar:
-            for frame in frame_generator:
-                start_time = time.time()
+    def _is_violator(self, slots: np.ndarray) -> np.ndarray:
+        state = self.tracked_objects_map
+        return state["was_in_safe_zone"][slots] & ~state["in_safe_zone"][slots]
 
-                # Perform object detection using YOLO
-                detections = sv.Detections.from_ultralytics(
-                    self.yolo_model(frame, verbose=False)[0]
-                )
-                detections = detections[detections.confidence > self.conf_score]
-
-                # Filter by class if specified
-                if self.class_names is not None:
-                    model_class_names = self.yolo_model.names
-                    class_mask = np.isin(
-                        [model_class_names[cls_id] for cls_id in detections.class_id],
-                        self.class_names,
-                    )
-                    detections = detections[class_mask]
-
-                detections = detections.with_nms(threshold=self.iou_threshold)
-
-                # Update object tracks using ByteTrack
-                detections = self.byte_track.update_with_detections(
-                    detections=detections
-                )
+    def detect(self, packet: FramePacket):
+        # Perform object detection using YOLO
+        detections = packet.config.detection_filter.detect(
+            self.yolo_model, packet.frame
+        )
 
-                # Calculate the center of each detected object
-                centers = (
-                    np.column_stack(
-                        [
-                            (detections.xyxy[:, 0] + detections.xyxy[:, 2]) / 2,
-                            (detections.xyxy[:, 1] + detections.xyxy[:, 3]) / 2,
-                        ]
-                    )
-                    if len(detections) > 0
-                    else np.empty((0, 2))
-                )
+        # Update object tracks using ByteTrack
+        packet.detections = self.byte_track.update_with_detections(
+            detections=detections
+        )
+        packet.removed_ids = removed_track_ids(self.byte_track)
 
-                # Check if bbox center is in safe zone
-                in_safe_zone = (
-                    np.array(
-                        [
-                            cv2.pointPolygonTest(
-                                self.safe_zone_polygon.astype(np.int32),
-                                tuple(center),
-                                False,
-                            )
-                            >= 0
-                            for center in centers
-                        ]
-                    )
-                    if len(centers) > 0
-                    else np.array([], dtype=bool)
-                )
+    def apply_rules(self, packet: FramePacket):
+        detections = packet.detections
 
-                labels, violator_mask = [], []
-                for i, tracker_id in enumerate(detections.tracker_id):
-                    if tracker_id not in self.tracked_objects_map:
-                        self.object_count += 1
-                        self.tracked_objects_map[tracker_id] = {
-                            "object_id": self.object_count,
-                            "was_in_safe_zone": in_safe_zone[i],
-                            "in_safe_zone": in_safe_zone[i],
-                            "violation_reported": False,
-                        }
-                    else:
-                        prev = self.tracked_objects_map[tracker_id]
-                        prev["was_in_safe_zone"] |= in_safe_zone[i]
-                        prev["in_safe_zone"] = in_safe_zone[i]
-
-                    state = self.tracked_objects_map[tracker_id]
-                    is_violator = self._is_violator(state)
-                    violator_mask.append(is_violator)
-                    class_name = self.yolo_model.names[detections.class_id[i]]
-                    label = f"{class_name.capitalize()} #{state['object_id']}"
-
-                    # Check if it's the first time this object is violating
-                    if is_violator and not state["violation_reported"]:
-                        state["violation_reported"] = True
-                        label += " [Violator]"
-
-                        # Create a copy of the frame for the violation snapshot
-                        violation_frame = frame.copy()
-
-                        # Annotate the polygon zone
-                        violation_frame = self.polygon_zone_annotator.annotate(
-                            scene=violation_frame
-                        )
-
-                        # Isolate the violator's detection data
-                        violator_detection = sv.Detections(
-                            xyxy=np.array([detections.xyxy[i]]),
-                            confidence=np.array([detections.confidence[i]]),
-                            class_id=np.array([detections.class_id[i]]),
-                            tracker_id=np.array([detections.tracker_id[i]]),
-                        )
-
-                        # Annotate the violator's bounding box
-                        violation_frame = self.box_annotators[True].annotate(
-                            scene=violation_frame, detections=violator_detection
-                        )
-
-                        # Prepare the label for the violation snapshot
-                        violation_label = f"{class_name.capitalize()} [Violator]"
-
-                        # Annotate the violator's label
-                        violation_frame = self.label_annotators[True].annotate(
-                            scene=violation_frame,
-                            detections=violator_detection,
-                            labels=[violation_label],
-                        )
-
-                        # Resize and encode the violation frame using utility functions
-                        resized_violation_frame = resize_frame(violation_frame)
-                        img_base64 = encode_frame_to_base64(resized_violation_frame)
-
-                        # Broadcast violation message
-                        message = {
-                            "id": str(uuid4()),
-                            "imgSrc": img_base64,
-                            "className": class_name,
-                            "detectedAt": time.time() * 1000,
-                        }
-                        await ws_manager.broadcast(
-                            {"event": "server:red-light-violation", "data": message}
-                        )
-                    elif is_violator:
-                        label += " [Violator]"
-
-                    labels.append(label)
-
-                violator_mask = np.array(violator_mask, dtype=bool)
-                dets = {
-                    False: detections[~violator_mask],
-                    True: detections[violator_mask],
-                }
-                labs = {
-                    False: [
-                        label_text
-                        for i, label_text in enumerate(labels)
-                        if not violator_mask[i]
-                    ],
-                    True: [
-                        label_text
-                        for i, label_text in enumerate(labels)
-                        if violator_mask[i]
-                    ],
-                }
+        # Check if bbox center is in safe zone
+        in_safe_zone = packet.config.zones.contains_detections(
+            "safe_zone", detections, anchor=sv.Position.CENTER
+        )
 
-                # Annotate the frame with the polygon zone
-                annotated_frame = frame.copy()
-                annotated_frame = self.polygon_zone_annotator.annotate(
-                    scene=annotated_frame
-                )
-                # Annotate the frame with bounding boxes and labels
-                for violator in (False, True):
-                    annotated_frame = self.box_annotators[violator].annotate(
-                        scene=annotated_frame, detections=dets[violator]
-                    )
-                    annotated_frame = self.label_annotators[violator].annotate(
-                        scene=annotated_frame,
-                        detections=dets[violator],
-                        labels=labs[violator],
-                    )
-
-                # Resize frame for streaming display
-                show_frame = resize_frame(annotated_frame, max_width=640)
-
-                # Encode frame in JPEG format
-                _, buffer = cv2.imencode(".jpg", show_frame)
-                show_frame_bytes = buffer.tobytes()
-
-                # Yield the frame with a specific format for streaming
-                yield (
-                    b"--frame\r\n"
-                    + b"Content-Type: image/jpeg\r\n\r\n"
-                    + show_frame_bytes
-                    + b"\r\n"
+        # Update per-track zone state for all detections at once
+        self.tracked_objects_map.advance(packet.removed_ids)
+        slots, is_new = self.tracked_objects_map.touch(detections.tracker_id)
+        state = self.tracked_objects_map
+        new_slots = slots[is_new]
+        state["object_id"][new_slots] = np.arange(
+            self.object_count + 1, self.object_count + 1 + len(new_slots)
+        )
+        self.object_count += len(new_slots)
+        state["was_in_safe_zone"][slots] |= in_safe_zone
+        state["in_safe_zone"][slots] = in_safe_zone
+        violator_mask = self._is_violator(slots)
+
+        labels = []
+        for i, slot in enumerate(slots):
+            is_violator = violator_mask[i]
+            class_name = self.yolo_model.names[detections.class_id[i]]
+            label = f"{class_name.capitalize()} #{state['object_id'][slot]}"
+
+            # Check if it's the first time this object is violating
+            if is_violator and not state["violation_reported"][slot]:
+                state["violation_reported"][slot] = True
+                label += " [Violator]"
+
+                # Broadcast violation message with a snapshot of the violator
+                message = {
+                    "id": str(uuid4()),
+                    "imgSrc": None,
+                    "className": class_name,
+                    "detectedAt": time.time() * 1000,
+                }
+                packet.emit(
+                    "server:red-light-violation",
+                    message,
+                    snapshot=(i, f"{class_name.capitalize()} [Violator]"),
                 )
+            elif is_violator:
+                label += " [Violator]"
 
-                progress_bar.update(1)
+            labels.append(label)
 
-                processing_time = time.time() - start_time
-                if processing_time < self.frame_delay:
-                    time.sleep(self.frame_delay - processing_time)
+        packet.data["labels"] = labels
+        packet.data["violator_mask"] = violator_mask
 
-                await asyncio.sleep(0)  # Yield control to the event loop
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        groups = split_by_mask(
+            packet.detections, packet.data["labels"], packet.data["violator_mask"]
+        )
+
+        # Annotate the frame with the polygon zone
+        annotated_frame = packet.frame.copy()
+        annotated_frame = packet.config.polygon_zone_annotator.annotate(
+            scene=annotated_frame
+        )
+
+        # Annotate the frame with bounding boxes and labels
+        for violator, (detections, labels) in groups.items():
+            annotated_frame = self.box_annotators[violator].annotate(
+                scene=annotated_frame, detections=detections
+            )
+            annotated_frame = self.label_annotators[violator].annotate(
+                scene=annotated_frame, detections=detections, labels=labels
+            )
+        return annotated_frame
+
+    def snapshot(self, packet: FramePacket, index: int, label: str) -> np.ndarray:
+        # Isolate the violator's detection data
+        violator_detection = packet.detections[index : index + 1]
+
+        violation_frame = packet.config.polygon_zone_annotator.annotate(
+            scene=packet.frame.copy()
+        )
+        violation_frame = self.box_annotators[True].annotate(
+            scene=violation_frame, detections=violator_detection
+        )
+        return self.label_annotators[True].annotate(
+            scene=violation_frame, detections=violator_detection, labels=[label]
+        )
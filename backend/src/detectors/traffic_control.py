@@ -1,20 +1,27 @@
-import asyncio
 import math
 import time
 from collections import defaultdict, deque
+from functools import partial
 from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
 import supervision as sv
 
-# from tqdm import tqdm
-from ultralytics import YOLO
+from ..pipeline.plugin import DetectorPlugin, blank_frame
+from ..pipeline.runtime import FramePacket
+from ..utils.artifacts import annotation_style, compile_zone_map, load_video_info
+from ..utils.model_utils import load_yolo
+from ..utils.postprocess import DetectionFilter
+from ..utils.track_store import TrackStateStore, removed_track_ids
+from ..utils.zones import ZoneMap
 
-from ..routes.websockets import ws_manager
 
+class TrafficControl(DetectorPlugin):
+    # The blackboard is streamed at full size
+    stream_max_width = None
+    tunable_params = ("conf_score", "iou_threshold")
 
-class TrafficControl:
     def __init__(
         self,
         model_path: str,
@@ -30,7 +37,7 @@ class TrafficControl:
         self.iou_threshold = iou_threshold
 
         # Load the model
-        self.yolo_model = YOLO(self.model_path)
+        self.yolo_model = load_yolo(self.model_path)
         self.model_class_names = self.yolo_model.names
 
         # Video processing setup per source
@@ -40,13 +47,16 @@ class TrafficControl:
             video_path = source["video_path"]
             polygon_coords = np.array(source["region_polygon"], dtype=np.int32)
 
-            video_info = sv.VideoInfo.from_video_path(video_path=video_path)
+            video_info = load_video_info(video_path)
             if video_info.fps == 0:
                 video_info.fps = 30  # Default FPS if needed
 
             zone = sv.PolygonZone(
                 polygon=polygon_coords  # Removed frame_resolution_wh argument
             )
+            zone_map = compile_zone_map(
+                ZoneMap(video_info.resolution_wh, {"region": polygon_coords})
+            )
 
             self.source_data[video_id] = {
                 "video_path": video_path,
@@ -57,19 +67,13 @@ class TrafficControl:
                     track_activation_threshold=self.conf_score,
                 ),
                 "zone": zone,
-                "tracked_objects_info": defaultdict(
-                    lambda: {
-                        "firstDetected": None,
-                        "lastDetected": None,
-                        "object_id": None,
-                        "className": None,
-                    }
-                ),
+                "zone_map": zone_map,
+                "tracked_objects_info": self._create_track_store(video_info.fps),
                 "object_counter": 0,
                 "frame_generator": sv.get_video_frames_generator(
                     source_path=video_path
                 ),
-                "last_frame": None,  # To store the last processed frame for the blackboard
+                "last_frame": None,  # Last annotated frame, kept for the blackboard
                 "finished": False,  # Flag to indicate if the source is finished
                 "annotators": self._setup_annotators(
                     video_info.resolution_wh, zone, video_info.fps
@@ -77,11 +81,71 @@ class TrafficControl:
                 "coordinates": defaultdict(lambda: deque(maxlen=video_info.fps)),
             }
 
+            # Drop trace history together with the evicted track state
+            source_info = self.source_data[video_id]
+            source_info["tracked_objects_info"].on_evict.append(
+                partial(self._forget_coordinates, source_info["coordinates"])
+            )
+
+        # Pace the blackboard by the fastest source
+        max_fps = max(data["video_info"].fps for data in self.source_data.values())
+        self.frame_delay = 1 / max_fps if max_fps > 0 else 1 / 30
+        self._setup_config()
+
+    def compile_config(self, params):
+        return {
+            "detection_filter": DetectionFilter(
+                self.model_class_names,
+                class_names=self.class_names,
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            )
+        }
+
+    def warmup_models(self):
+        # One inference per distinct source resolution
+        frames = [
+            blank_frame(resolution_wh)
+            for resolution_wh in {
+                data["video_info"].resolution_wh for data in self.source_data.values()
+            }
+        ]
+
+        def infer():
+            for frame in frames:
+                self.config.detection_filter.infer(self.yolo_model, frame)
+
+        return {self.model_path: infer}
+
+    @classmethod
+    def compile_artifacts(cls, **kwargs):
+        for source in kwargs["video_sources"]:
+            video_info = load_video_info(source["video_path"])
+            annotation_style(video_info.resolution_wh)
+            polygon_coords = np.array(source["region_polygon"], dtype=np.int32)
+            compile_zone_map(
+                ZoneMap(video_info.resolution_wh, {"region": polygon_coords})
+            )
+
+    def _forget_coordinates(self, coordinates, tracker_ids, slots):
+        for tracker_id in tracker_ids:
+            coordinates.pop(tracker_id, None)
+
+    def _create_track_store(self, fps: int) -> TrackStateStore:
+        return TrackStateStore(
+            {
+                "firstDetected": (np.float64, np.nan),
+                "lastDetected": (np.float64, np.nan),
+                "object_id": (np.int64, 0),
+                "className": (object, None),
+            },
+            ttl=fps * 10,
+        )
+
     def _setup_annotators(
         self, resolution_wh: Tuple[int, int], zone: sv.PolygonZone, fps: int
     ):
-        thickness = sv.calculate_optimal_line_thickness(resolution_wh=resolution_wh)
-        text_scale = sv.calculate_optimal_text_scale(resolution_wh=resolution_wh)
+        thickness, text_scale = annotation_style(resolution_wh)
         box_annotator = sv.BoxAnnotator(thickness=thickness)
         label_annotator = sv.LabelAnnotator(
             text_scale=text_scale,
@@ -107,217 +171,177 @@ class TrafficControl:
             "trace": trace_annotator,
         }
 
-    async def process_video(self):
-        active_sources = list(self.source_data.keys())
-        max_fps = max(data["video_info"].fps for data in self.source_data.values())
-        frame_delay = (
-            1 / max_fps if max_fps > 0 else 1 / 30
-        )  # Use max FPS for sleep delay
-
-        while any(not self.source_data[vid]["finished"] for vid in active_sources):
-            start_time = time.time()
-            frames_data = {}
-            all_finished = True
-            websocket_data = []
-
-            for video_id in active_sources:
-                source_info = self.source_data[video_id]
+    def frames(self):
+        # One dict per tick with the next frame of every active source; a
+        # source that just ran out shows up once more with None
+        while True:
+            frames = {}
+            for video_id, source_info in self.source_data.items():
                 if source_info["finished"]:
-                    # Keep showing the last frame if the source finished
-                    frames_data[video_id] = source_info["last_frame"]
                     continue
+                frame = next(source_info["frame_generator"], None)
+                if frame is None:
+                    source_info["finished"] = True
+                frames[video_id] = frame
 
-                try:
-                    frame = next(source_info["frame_generator"])
-                    all_finished = False  # At least one source is still active
-                    source_info["last_frame"] = frame  # Store the latest frame
-
-                    # --- Detection and Tracking ---
-                    results = self.yolo_model(frame, verbose=False)[0]
-                    detections = sv.Detections.from_ultralytics(results)
-                    detections = detections[detections.confidence > self.conf_score]
-                    if self.iou_threshold is not None:
-                        detections = detections.with_nms(threshold=self.iou_threshold)
-
-                    # Filter by class name if specified
-                    if self.class_names:
-                        class_mask = np.array(
-                            [
-                                self.model_class_names[cls_id] in self.class_names
-                                for cls_id in detections.class_id
-                            ],
-                            dtype=bool,
-                        )
-                        detections = detections[class_mask]
-
-                    # Filter detections by zone
-                    zone_mask = source_info["zone"].trigger(detections=detections)
-                    detections_in_zone = detections[zone_mask]
-
-                    # Update tracker
-                    tracked_detections = source_info[
-                        "byte_track"
-                    ].update_with_detections(detections=detections_in_zone)
-
-                    # --- Process Tracked Objects ---
-                    current_detections_for_ws = []
-                    labels = []
-                    current_time = time.time()
-
-                    # Get points for trace annotator
-                    points = tracked_detections.get_anchors_coordinates(
-                        anchor=sv.Position.BOTTOM_CENTER
-                    )
+            if all(frame is None for frame in frames.values()):
+                print("All video sources finished processing.")
+                return
+            yield frames
 
-                    if (
-                        len(tracked_detections) > 0
-                        and tracked_detections.tracker_id is not None
-                    ):
-                        for det_idx, tracker_id in enumerate(
-                            tracked_detections.tracker_id
-                        ):
-                            # Update coordinates for tracing
-                            point = points[det_idx]
-                            source_info["coordinates"][tracker_id].append(point)
-
-                            state = source_info["tracked_objects_info"][tracker_id]
-                            class_id = tracked_detections.class_id[det_idx]
-                            class_name = self.model_class_names[class_id]
-
-                            if (
-                                state["object_id"] is None
-                            ):  # First time seeing this object in the zone
-                                source_info["object_counter"] += 1
-                                state["object_id"] = source_info["object_counter"]
-                                state["firstDetected"] = current_time
-                                state["className"] = class_name
-
-                            state["lastDetected"] = current_time
-                            elapsed_time = int(
-                                state["lastDetected"] - state["firstDetected"]
-                            )
-
-                            display_label = f"#{state['object_id']} ({elapsed_time}s)"
-                            labels.append(display_label)
-
-                            # Prepare data for WebSocket message
-                            current_detections_for_ws.append(
-                                {
-                                    "className": state["className"],
-                                    "confScore": float(
-                                        tracked_detections.confidence[det_idx]
-                                    ),  # Ensure float
-                                    "elapsedTime": elapsed_time,
-                                }
-                            )
-
-                    # --- Annotate Frame ---
-                    annotated_frame = frame.copy()
-                    # Annotate zone first
-                    annotated_frame = source_info["annotators"]["zone"].annotate(
-                        scene=annotated_frame
-                    )
+    def detect(self, packet: FramePacket):
+        packet.data["sources"] = {}
+        for video_id, frame in packet.frame.items():
+            if frame is None:
+                continue
+            source_info = self.source_data[video_id]
+
+            # --- Detection and Tracking ---
+            detections_in_zone = packet.config.detection_filter.detect(
+                self.yolo_model,
+                frame,
+                zone_mask=partial(source_info["zone_map"].contains_detections, "region"),
+            )
+            tracked_detections = source_info["byte_track"].update_with_detections(
+                detections=detections_in_zone
+            )
+            packet.data["sources"][video_id] = {
+                "zone_count": len(detections_in_zone),
+                "detections": tracked_detections,
+                "removed_ids": removed_track_ids(source_info["byte_track"]),
+            }
 
-                    # Annotate detections
-                    if len(tracked_detections) > 0:
-                        annotated_frame = source_info["annotators"]["box"].annotate(
-                            scene=annotated_frame, detections=tracked_detections
-                        )
-                        annotated_frame = source_info["annotators"]["label"].annotate(
-                            scene=annotated_frame,
-                            detections=tracked_detections,
-                            labels=labels,
-                        )
-                        # Annotate traces
-                        # annotated_frame = source_info["annotators"]["trace"].annotate(
-                        #     scene=annotated_frame, detections=tracked_detections
-                        # )
-
-                    # Add video_id label
-                    cv2.putText(
-                        annotated_frame,
-                        video_id,
-                        (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        1,
-                        (0, 0, 0),
-                        3,
-                        cv2.LINE_AA,
-                    )  # Black outline
-                    cv2.putText(
-                        annotated_frame,
-                        video_id,
-                        (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        1,
-                        (255, 255, 255),
-                        2,
-                        cv2.LINE_AA,
-                    )  # White text
-
-                    frames_data[video_id] = annotated_frame
-                    source_info["last_frame"] = (
-                        annotated_frame  # Update last frame with annotated one
-                    )
+    def apply_rules(self, packet: FramePacket):
+        websocket_data = []
+        for video_id, frame in packet.frame.items():
+            if frame is None:
+                # Add empty detections for a source that just finished
+                websocket_data.append({"video_id": video_id, "detections": []})
+                continue
+
+            source_info = self.source_data[video_id]
+            source_packet = packet.data["sources"][video_id]
+            tracked_detections = source_packet["detections"]
+
+            # --- Process Tracked Objects ---
+            current_detections_for_ws = []
+            labels = []
+            current_time = time.time()
+
+            # Get points for trace annotator
+            points = tracked_detections.get_anchors_coordinates(
+                anchor=sv.Position.BOTTOM_CENTER
+            )
 
-                    # Add data for this source to the overall websocket message
-                    websocket_data.append(
-                        {
-                            "video_id": video_id,
-                            "detections": current_detections_for_ws,
-                        }
+            state = source_info["tracked_objects_info"]
+            state.advance(source_packet["removed_ids"])
+            if len(tracked_detections) > 0 and tracked_detections.tracker_id is not None:
+                slots, _ = state.touch(tracked_detections.tracker_id)
+                for det_idx, tracker_id in enumerate(tracked_detections.tracker_id):
+                    slot = slots[det_idx]
+
+                    # Update coordinates for tracing
+                    source_info["coordinates"][tracker_id].append(points[det_idx])
+
+                    class_id = tracked_detections.class_id[det_idx]
+                    class_name = self.model_class_names[class_id]
+
+                    if (
+                        state["object_id"][slot] == 0
+                    ):  # First time seeing this object in the zone
+                        source_info["object_counter"] += 1
+                        state["object_id"][slot] = source_info["object_counter"]
+                        state["firstDetected"][slot] = current_time
+                        state["className"][slot] = class_name
+
+                    state["lastDetected"][slot] = current_time
+                    elapsed_time = int(
+                        state["lastDetected"][slot] - state["firstDetected"][slot]
                     )
+                    labels.append(f"#{state['object_id'][slot]} ({elapsed_time}s)")
 
-                except StopIteration:
-                    source_info["finished"] = True
-                    # Keep the last frame available if the source finishes
-                    frames_data[video_id] = source_info["last_frame"]
-                    # Add empty detections if finished
-                    websocket_data.append(
+                    # Prepare data for WebSocket message
+                    current_detections_for_ws.append(
                         {
-                            "video_id": video_id,
-                            "detections": [],
+                            "className": state["className"][slot],
+                            "confScore": float(
+                                tracked_detections.confidence[det_idx]
+                            ),  # Ensure float
+                            "elapsedTime": elapsed_time,
                         }
                     )
-                    continue  # Move to the next source
-
-            # --- Send WebSocket Update ---
-            if websocket_data:
-                await ws_manager.broadcast(
-                    {
-                        "event": "server:traffic-control",
-                        "data": websocket_data,
-                    }
-                )
 
-            # --- Create and Yield Blackboard ---
-            if frames_data:
-                blackboard = self._create_blackboard(frames_data, active_sources)
-                if blackboard is not None:
-                    _, buffer = cv2.imencode(".jpg", blackboard)
-                    blackboard_bytes = buffer.tobytes()
-
-                    yield (
-                        b"--frame\r\n"
-                        + b"Content-Type: image/jpeg\r\n\r\n"
-                        + blackboard_bytes
-                        + b"\r\n"
-                    )
+            source_packet["labels"] = labels
 
-            # --- Frame Rate Control ---
-            processing_time = time.time() - start_time
-            if processing_time < frame_delay:
-                await asyncio.sleep(frame_delay - processing_time)
-            else:
-                await asyncio.sleep(
-                    0
-                )  # Yield control briefly even if processing took longer
-
-            if all_finished and all(
-                self.source_data[vid]["finished"] for vid in active_sources
-            ):
-                print("All video sources finished processing.")
-                break  # Exit the main loop
+            # Add data for this source to the overall websocket message
+            websocket_data.append(
+                {"video_id": video_id, "detections": current_detections_for_ws}
+            )
+
+        # --- Send WebSocket Update ---
+        if websocket_data:
+            packet.emit("server:traffic-control", websocket_data)
+
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        frames_data = {}
+        for video_id, source_info in self.source_data.items():
+            source_packet = packet.data["sources"].get(video_id)
+            if source_packet is None:
+                # Keep showing the last frame if the source finished
+                frames_data[video_id] = source_info["last_frame"]
+                continue
+
+            tracked_detections = source_packet["detections"]
+            annotators = source_info["annotators"]
+
+            # --- Annotate Frame ---
+            # Annotate zone first
+            source_info["zone"].current_count = source_packet["zone_count"]
+            annotated_frame = packet.frame[video_id].copy()
+            annotated_frame = annotators["zone"].annotate(scene=annotated_frame)
+
+            # Annotate detections
+            if len(tracked_detections) > 0:
+                annotated_frame = annotators["box"].annotate(
+                    scene=annotated_frame, detections=tracked_detections
+                )
+                annotated_frame = annotators["label"].annotate(
+                    scene=annotated_frame,
+                    detections=tracked_detections,
+                    labels=source_packet["labels"],
+                )
+                # Annotate traces
+                # annotated_frame = annotators["trace"].annotate(
+                #     scene=annotated_frame, detections=tracked_detections
+                # )
+
+            # Add video_id label
+            cv2.putText(
+                annotated_frame,
+                video_id,
+                (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1,
+                (0, 0, 0),
+                3,
+                cv2.LINE_AA,
+            )  # Black outline
+            cv2.putText(
+                annotated_frame,
+                video_id,
+                (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1,
+                (255, 255, 255),
+                2,
+                cv2.LINE_AA,
+            )  # White text
+
+            frames_data[video_id] = annotated_frame
+            source_info["last_frame"] = annotated_frame
+
+        # --- Create Blackboard ---
+        return self._create_blackboard(frames_data, list(self.source_data))
 
     def _create_blackboard(
         self,
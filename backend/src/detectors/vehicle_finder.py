@@ -1,20 +1,24 @@
-import asyncio
 import time
+from functools import partial
 from uuid import uuid4
 
 import cv2
-import easyocr
 import numpy as np
 import supervision as sv
-from tqdm import tqdm
-from ultralytics import YOLO
 
 from ..data.app_data import app_data
-from ..routes.websockets import ws_manager
-from ..utils.image_utils import encode_frame_to_base64, resize_frame
+from ..pipeline.plugin import DetectorPlugin, blank_frame, split_by_mask
+from ..pipeline.runtime import FramePacket
+from ..utils.artifacts import annotation_style, compile_zone_map, load_video_info
+from ..utils.model_utils import load_yolo
+from ..utils.postprocess import DetectionFilter
+from ..utils.track_store import TrackStateStore
+from ..utils.zones import ZoneMap
 
 
-class VehicleFinder:
+class VehicleFinder(DetectorPlugin):
+    tunable_params = ("conf_score", "iou_threshold", "polygon_zone")
+
     def __init__(
         self,
         vehicle_model_path: str,
@@ -25,8 +29,14 @@ class VehicleFinder:
         conf_score: float = 0.3,
         iou_threshold: float = 0.7,
     ):
-        self.vehicle_model = YOLO(vehicle_model_path)
-        self.plate_model = YOLO(plate_model_path)
+        self.vehicle_model_path = vehicle_model_path
+        self.plate_model_path = plate_model_path
+        self.vehicle_model = load_yolo(vehicle_model_path)
+        self.plate_model = load_yolo(plate_model_path)
+
+        # EasyOCR pulls in torch, so it is only imported by a running finder
+        import easyocr
+
         self.reader = easyocr.Reader(["en"], gpu=True)
 
         self.video_info = None
@@ -42,14 +52,27 @@ class VehicleFinder:
             "lookout": sv.Color(r=10, g=145, b=144),  # Green
         }
 
-        # Track reported license plates
-        self.reported_plates = set()
-
         # Setup video info during initialization
         self._setup_video_info(video_path)
 
+        # Track reported license plates, forgotten once unseen for a minute
+        self.reported_plates = TrackStateStore({}, ttl=self.video_info.fps * 60)
+        self._setup_config()
+
+    @classmethod
+    def compile_artifacts(cls, **kwargs):
+        video_info = super().compile_artifacts(**kwargs)
+        if kwargs.get("polygon_zone"):
+            compile_zone_map(
+                ZoneMap(
+                    video_info.resolution_wh,
+                    {"lookout": np.array(kwargs["polygon_zone"])},
+                )
+            )
+        return video_info
+
     def _setup_video_info(self, video_path: str):
-        self.video_info = sv.VideoInfo.from_video_path(video_path)
+        self.video_info = load_video_info(video_path)
         self.video_info.fps = 30 if self.video_info.fps == 0 else self.video_info.fps
         self.frame_delay = 1 / self.video_info.fps
 
@@ -61,18 +84,47 @@ class VehicleFinder:
 
         self._setup_annotators()
 
+    def compile_config(self, params):
+        # Setup zone object if polygon is defined
+        polygon = params["polygon_zone"]
+        polygon = np.array(polygon) if polygon is not None and len(polygon) else None
+        zone = (
+            compile_zone_map(
+                ZoneMap(self.video_info.resolution_wh, {"lookout": polygon})
+            )
+            if polygon is not None
+            else None
+        )
+        return {
+            "detection_filter": DetectionFilter(
+                self.vehicle_model.names,
+                class_names=self.vehicle_class_names,
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            ),
+            "zone": zone,
+            "zone_polygon": polygon,
+        }
+
+    def warmup_models(self):
+        frame = blank_frame(self.video_info.resolution_wh)
+        # Plates are searched in vehicle crops and read from plate crops
+        width, height = self.video_info.resolution_wh
+        vehicle = blank_frame((max(width // 6, 64), max(height // 6, 64)))
+        plate = np.zeros((32, 128), dtype=np.uint8)
+        return {
+            self.vehicle_model_path: lambda: self.config.detection_filter.infer(
+                self.vehicle_model, frame
+            ),
+            self.plate_model_path: lambda: self.plate_model(vehicle, verbose=False),
+            "easyocr": lambda: self.reader.readtext(plate),
+        }
+
     def _setup_annotators(self):
-        thickness = sv.calculate_optimal_line_thickness(self.video_info.resolution_wh)
-        text_scale = sv.calculate_optimal_text_scale(self.video_info.resolution_wh)
+        thickness, text_scale = annotation_style(self.video_info.resolution_wh)
 
-        # Setup zone object if polygon is defined
-        if self.polygon_zone is not None:
-            self.zone = sv.PolygonZone(polygon=self.polygon_zone)
-            # Define color for the polygon zone
-            self.polygon_color = sv.Color(r=255, g=0, b=0)
-        else:
-            self.zone = None
-            self.polygon_color = None  # No color needed if no polygon
+        # Define color for the polygon zone
+        self.polygon_color = sv.Color(r=255, g=0, b=0)
 
         self.box_annotators = {
             "normal": sv.BoxAnnotator(thickness=thickness, color=self.colors["normal"]),
@@ -126,138 +178,92 @@ class VehicleFinder:
         text = max(results, key=lambda x: x[2])[1]
         return text.upper().strip()
 
-    async def process_video(self):
-        frame_generator = sv.get_video_frames_generator(source_path=self.video_path)
-
-        with tqdm(desc="Processing Frames", unit="frame") as progress_bar:
-            for frame in frame_generator:
-                start_time = time.time()
-
-                # Detect vehicles
-                detections = sv.Detections.from_ultralytics(
-                    self.vehicle_model(frame, verbose=False)[0]
-                )
-
-                # Filter by zone if specified
-                if self.zone is not None:
-                    in_zone_mask = self.zone.trigger(detections=detections)
-                    detections = detections[in_zone_mask]
-
-                # Filter by class and confidence
-                if self.vehicle_class_names:
-                    class_mask = np.isin(
-                        [
-                            self.vehicle_model.names[cls_id]
-                            for cls_id in detections.class_id
-                        ],
-                        self.vehicle_class_names,
-                    )
-                    detections = detections[class_mask]
-
-                detections = detections[detections.confidence > self.conf_score]
-                detections = detections.with_nms(threshold=self.iou_threshold)
-                detections = self.byte_track.update_with_detections(detections)
-
-                # Process each detection
-                labels, is_lookout = [], []
-                for i, (xyxy, tracker_id, cls_id) in enumerate(
-                    zip(detections.xyxy, detections.tracker_id, detections.class_id)
-                ):
-                    # Detect license plate
-                    plate_text = self._detect_license_plate(frame, xyxy)
-                    if not plate_text:
-                        labels.append(f"#{tracker_id}")
-                        is_lookout.append(False)
-                        continue
-
-                    # Check if vehicle is in lookout list
-                    found = plate_text in set(
-                        v.upper() for v in (app_data["lookoutVehicles"] or [])
-                    )
-                    labels.append(
-                        f"#{tracker_id} {plate_text}" + (" [Found]" if found else "")
-                    )
-                    is_lookout.append(found)
-
-                    if found and plate_text not in self.reported_plates:
-                        # Mark plate as reported
-                        self.reported_plates.add(plate_text)
-
-                        # Prepare found vehicle notification
-                        vehicle_frame = frame.copy()
-                        det = sv.Detections(
-                            xyxy=np.array([xyxy]),
-                            confidence=np.array([detections.confidence[i]]),
-                            class_id=np.array([cls_id]),
-                            tracker_id=np.array([tracker_id]),
-                        )
-                        vehicle_frame = self.box_annotators["lookout"].annotate(
-                            scene=vehicle_frame, detections=det
-                        )
-                        vehicle_frame = self.label_annotators["lookout"].annotate(
-                            scene=vehicle_frame, detections=det, labels=[labels[-1]]
-                        )
-
-                        # Send to frontend
-                        img_base64 = encode_frame_to_base64(resize_frame(vehicle_frame))
-                        await ws_manager.broadcast(
-                            {
-                                "event": "server:vehicle-found",
-                                "data": {
-                                    "id": str(uuid4()),
-                                    "imgSrc": img_base64,
-                                    "plateNumber": plate_text,
-                                    "detectedAt": time.time() * 1000,
-                                    "className": self.vehicle_model.names[cls_id],
-                                },
-                            }
-                        )
-
-                # Annotate frame
-                is_lookout = np.array(is_lookout, dtype=bool)  # Ensure boolean array
-                dets = {
-                    "normal": detections[~is_lookout],  # Use ~ safely
-                    "lookout": detections[is_lookout],
-                }
-                labs = {
-                    "normal": [
-                        label for label, found in zip(labels, is_lookout) if not found
-                    ],
-                    "lookout": [
-                        label for label, found in zip(labels, is_lookout) if found
-                    ],
+    def detect(self, packet: FramePacket):
+        # Detect vehicles
+        zone = packet.config.zone
+        detections = packet.config.detection_filter.detect(
+            self.vehicle_model,
+            packet.frame,
+            zone_mask=(
+                partial(zone.contains_detections, "lookout")
+                if zone is not None
+                else None
+            ),
+        )
+        packet.detections = self.byte_track.update_with_detections(detections)
+
+    def apply_rules(self, packet: FramePacket):
+        frame, detections = packet.frame, packet.detections
+
+        # Process each detection
+        self.reported_plates.advance()
+        labels, is_lookout = [], []
+        for i, (xyxy, tracker_id, cls_id) in enumerate(
+            zip(detections.xyxy, detections.tracker_id, detections.class_id)
+        ):
+            # Detect license plate
+            plate_text = self._detect_license_plate(frame, xyxy)
+            if not plate_text:
+                labels.append(f"#{tracker_id}")
+                is_lookout.append(False)
+                continue
+
+            # Check if vehicle is in lookout list
+            found = plate_text in set(
+                v.upper() for v in (app_data["lookoutVehicles"] or [])
+            )
+            labels.append(f"#{tracker_id} {plate_text}" + (" [Found]" if found else ""))
+            is_lookout.append(found)
+
+            already_reported = plate_text in self.reported_plates
+            if found:
+                # Mark plate as reported; re-reading it keeps it alive
+                self.reported_plates.touch([plate_text])
+
+            if found and not already_reported:
+                # Send found vehicle notification to frontend
+                message = {
+                    "id": str(uuid4()),
+                    "imgSrc": None,
+                    "plateNumber": plate_text,
+                    "detectedAt": time.time() * 1000,
+                    "className": self.vehicle_model.names[cls_id],
                 }
+                packet.emit("server:vehicle-found", message, snapshot=(i, labels[-1]))
 
-                # Draw zone first using sv.draw_polygon
-                annotated_frame = frame.copy()
-                if self.zone is not None and self.polygon_zone is not None:
-                    annotated_frame = sv.draw_polygon(
-                        scene=annotated_frame,
-                        polygon=self.polygon_zone,
-                        color=self.polygon_color,
-                    )
-
-                # Then draw boxes and labels
-                for key in ("normal", "lookout"):
-                    annotated_frame = self.box_annotators[key].annotate(
-                        scene=annotated_frame, detections=dets[key]
-                    )
-                    annotated_frame = self.label_annotators[key].annotate(
-                        scene=annotated_frame, detections=dets[key], labels=labs[key]
-                    )
-
-                # Prepare frame for streaming
-                show_frame = resize_frame(annotated_frame, max_width=640)
-                _, buffer = cv2.imencode(".jpg", show_frame)
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n"
-                )
-
-                progress_bar.update(1)
+        packet.data["labels"] = labels
+        packet.data["is_lookout"] = np.array(is_lookout, dtype=bool)
 
-                processing_time = time.time() - start_time
-                if processing_time < self.frame_delay:
-                    time.sleep(self.frame_delay - processing_time)
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        groups = split_by_mask(
+            packet.detections, packet.data["labels"], packet.data["is_lookout"]
+        )
 
-                await asyncio.sleep(0)
+        # Draw zone first using sv.draw_polygon
+        annotated_frame = packet.frame.copy()
+        if packet.config.zone is not None:
+            annotated_frame = sv.draw_polygon(
+                scene=annotated_frame,
+                polygon=packet.config.zone_polygon,
+                color=self.polygon_color,
+            )
+
+        # Then draw boxes and labels
+        for found, (detections, labels) in groups.items():
+            key = "lookout" if found else "normal"
+            annotated_frame = self.box_annotators[key].annotate(
+                scene=annotated_frame, detections=detections
+            )
+            annotated_frame = self.label_annotators[key].annotate(
+                scene=annotated_frame, detections=detections, labels=labels
+            )
+        return annotated_frame
+
+    def snapshot(self, packet: FramePacket, index: int, label: str) -> np.ndarray:
+        detection = packet.detections[index : index + 1]
+        vehicle_frame = self.box_annotators["lookout"].annotate(
+            scene=packet.frame.copy(), detections=detection
+        )
+        return self.label_annotators["lookout"].annotate(
+            scene=vehicle_frame, detections=detection, labels=[label]
+        )
@@ -1,26 +1,33 @@
-import asyncio
 import time
-from collections import defaultdict, deque
-from typing import List, Optional
+from typing import List, Optional, Sequence
 from uuid import uuid4
 
 import cv2
 import numpy as np
 import supervision as sv
-from tqdm import tqdm
-from ultralytics import YOLO
 
-from ..routes.websockets import ws_manager
-from ..utils.image_utils import encode_frame_to_base64, resize_frame
+from ..pipeline.plugin import DetectorPlugin, blank_frame, split_by_mask
+from ..pipeline.runtime import FramePacket
+from ..utils.artifacts import (
+    annotation_style,
+    compile_zone_map,
+    load_video_info,
+    road_transform,
+)
+from ..utils.direction import DirectionClassifier
+from ..utils.model_utils import load_yolo
+from ..utils.postprocess import DetectionFilter
+from ..utils.track_store import TrackStateStore, removed_track_ids
+from ..utils.zones import ZoneMap
 
-MOVEMENT_THRESHOLD = 3  # Minimum movement to consider as moving
+MOVEMENT_THRESHOLD = 3  # Minimum speed against the lane (units/s) to flag a violator
+
+LANE_DIRECTIONS = {"down": (0, 1), "up": (0, -1)}
 
 
 class ViewTransformer:
-    def __init__(self, source: np.ndarray, target: np.ndarray) -> None:
-        source = source.astype(np.float32)
-        target = target.astype(np.float32)
-        self.m = cv2.getPerspectiveTransform(source, target)
+    def __init__(self, m: np.ndarray) -> None:
+        self.m = m
 
     def transform_points(self, points: np.ndarray) -> np.ndarray:
         if points.size == 0:
@@ -30,7 +37,15 @@ class ViewTransformer:
         return transformed_points.reshape(-1, 2)
 
 
-class WrongWayDetector:
+class WrongWayDetector(DetectorPlugin):
+    tunable_params = (
+        "conf_score",
+        "iou_threshold",
+        "road_polygon",
+        "road_width",
+        "road_height",
+    )
+
     def __init__(
         self,
         model_path: str,
@@ -39,6 +54,7 @@ class WrongWayDetector:
         road_width: float = 15,
         road_height: float = 80,
         correct_direction: str = "down",
+        lane_direction: Optional[Sequence[float]] = None,
         class_names: Optional[List[str]] = None,
         conf_score: float = 0.2,
         iou_threshold: float = 0.7,
@@ -50,11 +66,17 @@ class WrongWayDetector:
         self.road_width = road_width
         self.road_height = road_height
         self.correct_direction = correct_direction
+        # Allowed direction of travel in bird's-eye space, "down" is +y
+        self.lane_direction = (
+            lane_direction
+            if lane_direction is not None
+            else LANE_DIRECTIONS[correct_direction]
+        )
         self.conf_score = conf_score
         self.iou_threshold = iou_threshold
 
-        self.model = YOLO(self.model_path)
-        self.video_info = sv.VideoInfo.from_video_path(video_path=self.video_path)
+        self.model = load_yolo(self.model_path)
+        self.video_info = load_video_info(self.video_path)
 
         # Get video properties
         self.video_info.fps = 30 if self.video_info.fps == 0 else self.video_info.fps
@@ -65,34 +87,42 @@ class WrongWayDetector:
             frame_rate=self.video_info.fps,
             track_activation_threshold=self.conf_score,
         )
-        self.coordinates = defaultdict(lambda: deque(maxlen=self.video_info.fps))
-
-        # Store tracked objects
-        self.tracked_objects_map = {}  # Will store: object_id, uuid, violation_reported, current_violation
+        # Store tracked objects, evicted once ByteTrack drops them
+        self.tracked_objects_map = TrackStateStore(
+            {
+                "object_id": (np.int64, 0),
+                "uuid": (object, None),
+                "violation_reported": (bool, False),
+                "current_violation": (bool, False),
+            },
+            ttl=self.video_info.fps * 10,
+        )
         self.object_count = 0
 
-        self.view_transformer = ViewTransformer(
-            source=self.road_polygon.astype(np.float32),
-            target=np.array(
-                [
-                    [0, 0],
-                    [self.road_width - 1, 0],
-                    [self.road_width - 1, self.road_height - 1],
-                    [0, self.road_height - 1],
-                ]
-            ).astype(np.float32),
+        self.direction_classifier = DirectionClassifier(
+            self.tracked_objects_map,
+            fps=self.video_info.fps,
+            lane_direction=self.lane_direction,
+            enter_threshold=MOVEMENT_THRESHOLD,
         )
 
         self._setup_annotators()
-        self._setup_zone()
+        self._setup_config()
+
+    @classmethod
+    def compile_artifacts(cls, **kwargs):
+        video_info = super().compile_artifacts(**kwargs)
+        road_polygon = np.array(kwargs["road_polygon"])
+        road_transform(
+            road_polygon,
+            kwargs["road_width"],
+            kwargs["road_height"],
+        )
+        compile_zone_map(ZoneMap(video_info.resolution_wh, {"road": road_polygon}))
+        return video_info
 
     def _setup_annotators(self):
-        thickness = sv.calculate_optimal_line_thickness(
-            resolution_wh=self.video_info.resolution_wh
-        )
-        text_scale = sv.calculate_optimal_text_scale(
-            resolution_wh=self.video_info.resolution_wh
-        )
+        thickness, text_scale = annotation_style(self.video_info.resolution_wh)
         color_blue, color_red = sv.Color(r=0, g=0, b=255), sv.Color(r=255, g=0, b=0)
 
         self.box_annotators = {
@@ -120,218 +150,139 @@ class WrongWayDetector:
             color_lookup=sv.ColorLookup.TRACK,
         )
 
-    def _setup_zone(self):
-        self.polygon_zone = sv.PolygonZone(polygon=self.road_polygon)
-
-    def _transform_points(self, points: np.ndarray) -> np.ndarray:
-        return self.view_transformer.transform_points(points)
-
-    async def process_video(self):
-        # Initialize video frame generator
-        frame_generator = sv.get_video_frames_generator(source_path=self.video_path)
-
-        with tqdm(
-            desc="Frames Processed",
-            unit="frame",
-            dynamic_ncols=True,
-            bar_format="{desc}: {n} [{elapsed}, {rate_fmt}]",
-        ) as progress_bar:
-            for frame in frame_generator:
-                start_time = time.time()
-
-                # Run YOLO model on frame and convert results to supervision format
-                detections = sv.Detections.from_ultralytics(
-                    self.model(frame, verbose=False)[0]
+    def compile_config(self, params):
+        road_polygon = np.array(params["road_polygon"])
+        return {
+            "detection_filter": DetectionFilter(
+                self.model.names,
+                class_names=self.class_names,
+                conf_score=params["conf_score"],
+                iou_threshold=params["iou_threshold"],
+            ),
+            "view_transformer": ViewTransformer(
+                road_transform(
+                    road_polygon, params["road_width"], params["road_height"]
                 )
+            ),
+            "zones": compile_zone_map(
+                ZoneMap(self.video_info.resolution_wh, {"road": road_polygon})
+            ),
+        }
 
-                # Filter detections by confidence, zone and class if specified
-                model_class_names = self.model.names
-                if self.class_names is not None:
-                    class_mask = np.isin(
-                        [model_class_names[cls_id] for cls_id in detections.class_id],
-                        self.class_names,
-                    )
-                    detections = detections[class_mask]
-
-                detections = detections[detections.confidence > self.conf_score]
-                detections = detections[self.polygon_zone.trigger(detections)]
-                detections = detections.with_nms(threshold=self.iou_threshold)
-
-                # Update tracked objects using ByteTrack algorithm
-                detections = self.byte_track.update_with_detections(
-                    detections=detections
-                )
+    def warmup_models(self):
+        frame = blank_frame(self.video_info.resolution_wh)
+        return {
+            self.model_path: lambda: self.config.detection_filter.infer(
+                self.model, frame
+            )
+        }
 
-                # Skip frame if no detections
-                if len(detections) == 0:
-                    show_frame = resize_frame(frame, max_width=640)
-                    _, buffer = cv2.imencode(".jpg", show_frame)
-                    show_frame_bytes = buffer.tobytes()
-                    yield (
-                        b"--frame\r\n"
-                        + b"Content-Type: image/jpeg\r\n\r\n"
-                        + show_frame_bytes
-                        + b"\r\n"
-                    )
-                    progress_bar.update(1)
-                    continue
-
-                # Convert detection coordinates to bird's eye view
-                points = detections.get_anchors_coordinates(
-                    anchor=sv.Position.BOTTOM_CENTER
-                )
-                points = self._transform_points(points=points).astype(int)
-
-                # Track Movement and Detect Violations
-                labels, violator_mask = [], []
-                for tracker_id, [_, y], class_id in zip(
-                    detections.tracker_id, points, detections.class_id
-                ):
-                    # Track y-coordinates for movement analysis
-                    self.coordinates[tracker_id].append(y)
-                    current_class_name = model_class_names[class_id]
-
-                    # Set up label for tracked object
-                    if tracker_id in self.tracked_objects_map:
-                        label = f"#{self.tracked_objects_map[tracker_id]['object_id']}"
-                    else:
-                        label = f"#{tracker_id}"
-
-                    is_violator = False
-
-                    # Analyze movement direction after collecting enough samples
-                    if len(self.coordinates[tracker_id]) >= int(
-                        self.video_info.fps / 3
-                    ):
-                        coordinate_start = self.coordinates[tracker_id][-1]
-                        coordinate_end = self.coordinates[tracker_id][0]
-                        y_change = coordinate_start - coordinate_end
-
-                        # Check if movement exceeds threshold and is in wrong direction
-                        if abs(y_change) > MOVEMENT_THRESHOLD:
-                            direction = "down" if y_change > 0 else "up"
-                            if direction != self.correct_direction:
-                                is_violator = True
-
-                                # Register new violator and prepare notification
-                                if tracker_id not in self.tracked_objects_map:
-                                    self.object_count += 1
-                                    self.tracked_objects_map[tracker_id] = {
-                                        "object_id": self.object_count,
-                                        "uuid": str(uuid4()),
-                                        "violation_reported": False,
-                                        "current_violation": True,
-                                    }
-                                else:
-                                    self.tracked_objects_map[tracker_id][
-                                        "current_violation"
-                                    ] = True
-
-                                state = self.tracked_objects_map[tracker_id]
-                                # Add [Wrong Way] label for any current violation
-                                label += " [Wrong Way]"
-
-                                # Only send websocket notification once
-                                if not state["violation_reported"]:
-                                    state["violation_reported"] = True
-
-                                    # Prepare violator frame
-                                    violator_index = np.where(
-                                        detections.tracker_id == tracker_id
-                                    )[0][0]
-                                    violator_detection = sv.Detections(
-                                        xyxy=np.array(
-                                            [detections.xyxy[violator_index]]
-                                        ),
-                                        confidence=np.array(
-                                            [detections.confidence[violator_index]]
-                                        ),
-                                        class_id=np.array(
-                                            [detections.class_id[violator_index]]
-                                        ),
-                                        tracker_id=np.array([tracker_id]),
-                                    )
-                                    violator_frame = frame.copy()
-                                    violator_frame = self.trace_annotator.annotate(
-                                        scene=violator_frame,
-                                        detections=violator_detection,
-                                    )
-                                    violator_frame = self.box_annotators[True].annotate(
-                                        scene=violator_frame,
-                                        detections=violator_detection,
-                                    )
-                                    violator_frame = self.label_annotators[
-                                        True
-                                    ].annotate(
-                                        scene=violator_frame,
-                                        detections=violator_detection,
-                                        labels=[label],
-                                    )
-                                    resized_frame = resize_frame(violator_frame)
-                                    img_base64 = encode_frame_to_base64(resized_frame)
-
-                                    # Send violator data
-                                    message = {
-                                        "id": state["uuid"],
-                                        "imgSrc": img_base64,
-                                        "detectedAt": time.time() * 1000,
-                                        "className": current_class_name,
-                                    }
-                                    await ws_manager.broadcast(
-                                        {"event": "server:wrong-way", "data": message}
-                                    )
-                            else:
-                                # Reset current violation if moving in correct direction
-                                if tracker_id in self.tracked_objects_map:
-                                    self.tracked_objects_map[tracker_id][
-                                        "current_violation"
-                                    ] = False
-
-                    labels.append(label)
-                    violator_mask.append(is_violator)
-
-                # Separate violators and normal detections
-                violator_mask = np.array(violator_mask, dtype=bool)
-                dets = {
-                    False: detections[~violator_mask],
-                    True: detections[violator_mask],
-                }
-                labs = {
-                    False: [
-                        label for i, label in enumerate(labels) if not violator_mask[i]
-                    ],
-                    True: [label for i, label in enumerate(labels) if violator_mask[i]],
+    def detect(self, packet: FramePacket):
+        # Run YOLO model on frame, keeping wanted classes on the road
+        zones = packet.config.zones
+        detections = packet.config.detection_filter.detect(
+            self.model,
+            packet.frame,
+            zone_mask=lambda d: zones.contains_detections("road", d),
+        )
+
+        # Update tracked objects using ByteTrack algorithm
+        packet.detections = self.byte_track.update_with_detections(
+            detections=detections
+        )
+        packet.removed_ids = removed_track_ids(self.byte_track)
+
+    def apply_rules(self, packet: FramePacket):
+        detections = packet.detections
+        model_class_names = self.model.names
+
+        self.tracked_objects_map.advance(packet.removed_ids)
+        slots, _ = self.tracked_objects_map.touch(detections.tracker_id)
+        state = self.tracked_objects_map
+
+        packet.data["labels"] = labels = []
+        packet.data["violator_mask"] = np.zeros(len(detections), dtype=bool)
+
+        # Skip frame if no detections
+        if len(detections) == 0:
+            return
+
+        # Convert detection coordinates to bird's eye view
+        points = detections.get_anchors_coordinates(anchor=sv.Position.BOTTOM_CENTER)
+        points = packet.config.view_transformer.transform_points(points)
+
+        # Classify the direction of every track in one pass
+        violator_mask, _ = self.direction_classifier.update(slots, points)
+        state["current_violation"][slots] = violator_mask
+        packet.data["violator_mask"] = violator_mask
+
+        for i, (tracker_id, slot, class_id) in enumerate(
+            zip(detections.tracker_id, slots, detections.class_id)
+        ):
+            current_class_name = model_class_names[class_id]
+            is_violator = violator_mask[i]
+
+            # Register new violator and prepare notification
+            if is_violator and state["object_id"][slot] == 0:
+                self.object_count += 1
+                state["object_id"][slot] = self.object_count
+                state["uuid"][slot] = str(uuid4())
+
+            # Set up label for tracked object
+            if state["object_id"][slot] != 0:
+                label = f"#{state['object_id'][slot]}"
+            else:
+                label = f"#{tracker_id}"
+
+            if is_violator:
+                # Add [Wrong Way] label for any current violation
+                label += " [Wrong Way]"
+
+            # Only send websocket notification once
+            if is_violator and not state["violation_reported"][slot]:
+                state["violation_reported"][slot] = True
+
+                # Send violator data
+                message = {
+                    "id": state["uuid"][slot],
+                    "imgSrc": None,
+                    "detectedAt": time.time() * 1000,
+                    "className": current_class_name,
                 }
+                packet.emit("server:wrong-way", message, snapshot=(i, label))
 
-                annotated_frame = frame.copy()
-                annotated_frame = self.trace_annotator.annotate(
-                    scene=annotated_frame, detections=detections
-                )
-                for violator in (False, True):
-                    annotated_frame = self.box_annotators[violator].annotate(
-                        scene=annotated_frame, detections=dets[violator]
-                    )
-                    annotated_frame = self.label_annotators[violator].annotate(
-                        scene=annotated_frame,
-                        detections=dets[violator],
-                        labels=labs[violator],
-                    )
-
-                show_frame = resize_frame(annotated_frame, max_width=640)
-                _, buffer = cv2.imencode(".jpg", show_frame)
-                show_frame_bytes = buffer.tobytes()
-                yield (
-                    b"--frame\r\n"
-                    + b"Content-Type: image/jpeg\r\n\r\n"
-                    + show_frame_bytes
-                    + b"\r\n"
-                )
+            labels.append(label)
 
-                progress_bar.update(1)
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        annotated_frame = packet.frame.copy()
+        if len(packet.detections) == 0:
+            return annotated_frame
 
-                # Frame Rate Control
-                processing_time = time.time() - start_time
-                if processing_time < self.frame_delay:
-                    time.sleep(self.frame_delay - processing_time)
+        # Separate violators and normal detections
+        groups = split_by_mask(
+            packet.detections, packet.data["labels"], packet.data["violator_mask"]
+        )
 
-                await asyncio.sleep(0)
+        annotated_frame = self.trace_annotator.annotate(
+            scene=annotated_frame, detections=packet.detections
+        )
+        for violator, (detections, labels) in groups.items():
+            annotated_frame = self.box_annotators[violator].annotate(
+                scene=annotated_frame, detections=detections
+            )
+            annotated_frame = self.label_annotators[violator].annotate(
+                scene=annotated_frame, detections=detections, labels=labels
+            )
+        return annotated_frame
+
+    def snapshot(self, packet: FramePacket, index: int, label: str) -> np.ndarray:
+        violator_detection = packet.detections[index : index + 1]
+        violator_frame = self.trace_annotator.annotate(
+            scene=packet.frame.copy(), detections=violator_detection
+        )
+        violator_frame = self.box_annotators[True].annotate(
+            scene=violator_frame, detections=violator_detection
+        )
+        return self.label_annotators[True].annotate(
+            scene=violator_frame, detections=violator_detection, labels=[label]
+        )
@@ -0,0 +1,170 @@
+import os
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+WEIGHTS_PATH = "./src/assets/weights"
+
+# OpenCV Zoo models: YuNet for detection, SFace for recognition
+YUNET_PATH = f"{WEIGHTS_PATH}/face_detection_yunet_2023mar.onnx"
+SFACE_PATH = f"{WEIGHTS_PATH}/face_recognition_sface_2021dec.onnx"
+
+DEFAULT_FACE_BACKEND = "opencv"
+
+
+class OpenCVFaceBackend:
+    def __init__(
+        self,
+        detector_path: str = YUNET_PATH,
+        recognizer_path: str = SFACE_PATH,
+        score_threshold: float = 0.6,
+        nms_threshold: float = 0.3,
+    ):
+        self.name = "opencv-sface"
+
+        # Not shipped with the repo, so say where to get them rather than
+        # let OpenCV fail on a path it cannot parse
+        missing = [p for p in (detector_path, recognizer_path) if not os.path.isfile(p)]
+        if missing:
+            raise FileNotFoundError(
+                f"Missing face model files {missing}: download them as described "
+                'in the README, "Backend Setup" step 5 (Face recognition backend), '
+                "or set FACE_BACKEND=deepface"
+            )
+
+        self.detector = cv2.FaceDetectorYN.create(
+            detector_path,
+            "",
+            (320, 320),
+            score_threshold,
+            nms_threshold,
+            5000,
+            cv2.dnn.DNN_BACKEND_OPENCV,
+            cv2.dnn.DNN_TARGET_CPU,
+        )
+        self.recognizer = cv2.FaceRecognizerSF.create(recognizer_path, "")
+
+        # Separate handle on the SFace network so faces can be embedded in batches
+        self.recognizer_net = cv2.dnn.readNetFromONNX(recognizer_path)
+        self.recognizer_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.recognizer_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def detect(self, frame: np.ndarray) -> List[dict]:
+        """Detects and aligns every face in the frame in a single pass."""
+        h, w = frame.shape[:2]
+        self.detector.setInputSize((w, h))
+        _, detections = self.detector.detect(frame)
+        if detections is None:
+            return []
+
+        faces = []
+        for detection in detections:
+            x, y, box_w, box_h = detection[:4].astype(int)
+            x, y = max(0, x), max(0, y)
+            faces.append(
+                {
+                    "face": self.recognizer.alignCrop(frame, detection),
+                    "facial_area": {
+                        "x": int(x),
+                        "y": int(y),
+                        "w": int(min(box_w, w - x)),
+                        "h": int(min(box_h, h - y)),
+                    },
+                }
+            )
+        return faces
+
+    def embed(self, faces: List[dict]) -> np.ndarray:
+        """Embeds all aligned faces with one batched forward pass."""
+        if not faces:
+            return np.empty((0, 0), dtype=np.float32)
+
+        blob = cv2.dnn.blobFromImages(
+            [face["face"] for face in faces], 1.0, (112, 112), (0, 0, 0), True, False
+        )
+        self.recognizer_net.setInput(blob)
+        try:
+            embeddings = self.recognizer_net.forward()
+        except cv2.error:
+            # Some SFace exports pin the batch size to one
+            embeddings = np.vstack(
+                [self.recognizer.feature(face["face"]) for face in faces]
+            )
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(faces), -1)
+
+
+class DeepFaceBackend:
+    def __init__(
+        self,
+        model_name: str = "VGG-Face",
+        detector_backend: str = "opencv",
+    ):
+        # DeepFace pulls in TensorFlow, so it is only imported when selected
+        from deepface import DeepFace
+        from deepface.modules import preprocessing
+
+        self._deepface = DeepFace
+        self._preprocessing = preprocessing
+
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.name = f"deepface-{model_name}"
+
+        # Build the recognition model once; DeepFace caches it internally too
+        self.client = DeepFace.build_model(model_name)
+        self.input_w, self.input_h = self.client.input_shape
+
+    def detect(self, frame: np.ndarray) -> List[dict]:
+        """Detects and aligns every face in the frame in a single pass."""
+        try:
+            faces = self._deepface.extract_faces(
+                img_path=frame,
+                detector_backend=self.detector_backend,
+                enforce_detection=False,
+                align=True,
+            )
+        except ValueError:
+            return []
+
+        # With enforce_detection=False DeepFace falls back to the whole frame
+        # with zero confidence when no face is found
+        return [
+            {"face": face["face"], "facial_area": face["facial_area"]}
+            for face in faces
+            if face.get("confidence", 1) > 0
+        ]
+
+    def embed(self, faces: List[dict]) -> np.ndarray:
+        """Embeds all aligned faces with one batched forward pass."""
+        if not faces:
+            return np.empty((0, 0), dtype=np.float32)
+
+        batch = np.vstack(
+            [
+                # extract_faces returns RGB in [0, 1]; the models expect BGR
+                self._preprocessing.resize_image(
+                    img=face["face"][:, :, ::-1],
+                    target_size=(self.input_h, self.input_w),
+                )
+                for face in faces
+            ]
+        )
+        embeddings = self.client.model(batch, training=False)
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+FACE_BACKENDS = {
+    "opencv": OpenCVFaceBackend,
+    "deepface": DeepFaceBackend,
+}
+
+
+def create_face_backend(name: Optional[str] = None, **kwargs):
+    # Falls back to the FACE_BACKEND environment variable, then to OpenCV
+    name = name or os.getenv("FACE_BACKEND", DEFAULT_FACE_BACKEND)
+    if name not in FACE_BACKENDS:
+        raise ValueError(
+            f"Unknown face backend '{name}', expected one of {list(FACE_BACKENDS)}"
+        )
+    return FACE_BACKENDS[name](**kwargs)
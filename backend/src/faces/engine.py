@@ -0,0 +1,51 @@
+from typing import List, Optional
+
+import numpy as np
+
+from .backends import create_face_backend
+from .gallery import FaceGallery
+
+
+class FaceEngine:
+    """Detect once, embed once, match against the whole watchlist at once."""
+
+    def __init__(
+        self,
+        backend=None,
+        threshold: Optional[float] = None,
+        top_k: int = 1,
+    ):
+        self.backend = backend if backend is not None else create_face_backend()
+        self.gallery = FaceGallery(self.backend, threshold=threshold)
+        self.top_k = top_k
+
+    def add(self, name: str, img_path: str) -> bool:
+        return self.gallery.add(name, img_path)
+
+    def remove(self, name: str):
+        self.gallery.remove(name)
+
+    def recognize(self, frame: np.ndarray) -> List[dict]:
+        """Returns one entry per detected face, with the matched name if any."""
+        faces = self.backend.detect(frame)
+        if not faces:
+            return []
+
+        embeddings = self.backend.embed(faces)
+        indices, distances = self.gallery.search(embeddings, k=self.top_k)
+
+        results = []
+        for row, face in enumerate(faces):
+            name, distance = None, None
+            if indices.shape[1] > 0 and indices[row, 0] >= 0:
+                distance = float(distances[row, 0])
+                if distance <= self.gallery.threshold:
+                    name = self.gallery.names[indices[row, 0]]
+            results.append(
+                {
+                    "name": name,
+                    "distance": distance,
+                    "facial_area": face["facial_area"],
+                }
+            )
+        return results
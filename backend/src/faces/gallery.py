@@ -0,0 +1,109 @@
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .index import build_index, normalize_rows
+
+EMBEDDINGS_PATH = "./src/assets/embeddings"
+
+# Cosine distance thresholds for verification, per recognition model
+COSINE_THRESHOLDS = {
+    "opencv-sface": 0.637,
+    "deepface-VGG-Face": 0.68,
+    "deepface-Facenet": 0.40,
+    "deepface-Facenet512": 0.30,
+    "deepface-ArcFace": 0.68,
+    "deepface-SFace": 0.593,
+}
+
+
+def file_content_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class FaceGallery:
+    def __init__(
+        self,
+        backend,
+        threshold: Optional[float] = None,
+        cache_dir: str = EMBEDDINGS_PATH,
+    ):
+        self.backend = backend
+        self.threshold = (
+            threshold if threshold is not None else COSINE_THRESHOLDS[backend.name]
+        )
+        self.cache_dir = os.path.join(cache_dir, backend.name)
+
+        # One L2-normalized row per lookout face, aligned with self.names
+        self.names: List[str] = []
+        self.embeddings = np.empty((0, 0), dtype=np.float32)
+        self._index = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def embed_image(self, img_path: str) -> Optional[np.ndarray]:
+        # Reference embeddings are cached on disk by image content, so renaming
+        # or re-adding a face never recomputes it
+        cache_path = os.path.join(self.cache_dir, f"{file_content_hash(img_path)}.npy")
+        if os.path.exists(cache_path):
+            return np.load(cache_path)
+
+        image = cv2.imread(img_path)
+        if image is None:
+            return None
+        faces = self.backend.detect(image)
+        if not faces:
+            return None
+
+        # Use the largest face in the reference image
+        best_face = max(
+            faces, key=lambda face: face["facial_area"]["w"] * face["facial_area"]["h"]
+        )
+        embedding = self.backend.embed([best_face])[0]
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.save(cache_path, embedding)
+        return embedding
+
+    def add(self, name: str, img_path: str) -> bool:
+        if name in self.names:
+            return True
+
+        embedding = self.embed_image(img_path)
+        if embedding is None:
+            print(f"Warning: Could not compute a face embedding for {name}.")
+            return False
+
+        row = normalize_rows(embedding.reshape(1, -1))
+        self.embeddings = (
+            row if len(self.names) == 0 else np.vstack([self.embeddings, row])
+        )
+        self.names.append(name)
+        self._index = None
+        return True
+
+    def remove(self, name: str):
+        if name not in self.names:
+            return
+        index = self.names.index(name)
+        self.names.pop(index)
+        self.embeddings = np.delete(self.embeddings, index, axis=0)
+        self._index = None
+
+    def search(self, embeddings: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the top-k gallery indices and cosine distances per embedding."""
+        if len(self.names) == 0 or len(embeddings) == 0:
+            return (
+                np.empty((len(embeddings), 0), dtype=int),
+                np.empty((len(embeddings), 0), dtype=np.float32),
+            )
+
+        # Flat search for small watchlists, IVF once the gallery gets large
+        if self._index is None:
+            self._index = build_index(self.embeddings)
+        return self._index.search(embeddings, k)
@@ -0,0 +1,112 @@
+from typing import Tuple
+
+import numpy as np
+
+# Galleries at least this large are searched through an IVF index
+IVF_MIN_SIZE = 1024
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _top_k(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    k = min(k, distances.shape[1])
+    if k < distances.shape[1]:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(distances.shape[1]), (len(distances), 1))
+    candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+    order = np.argsort(candidate_distances, axis=1)
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_distances, order, axis=1),
+    )
+
+
+class FlatIndex:
+    """Exact cosine search over every gallery row."""
+
+    def __init__(self, embeddings: np.ndarray):
+        self.embeddings = normalize_rows(embeddings)
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        if len(self.embeddings) == 0 or len(queries) == 0:
+            return (
+                np.empty((len(queries), 0), dtype=int),
+                np.empty((len(queries), 0), dtype=np.float32),
+            )
+        distances = 1 - normalize_rows(queries) @ self.embeddings.T
+        return _top_k(distances, k)
+
+
+class IVFIndex:
+    """Inverted-file index: k-means cells, only the nearest cells are scanned."""
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        n_lists: int = None,
+        n_probe: int = 8,
+        n_iter: int = 10,
+        seed: int = 0,
+    ):
+        self.embeddings = normalize_rows(embeddings)
+        self.n_lists = n_lists or max(1, int(np.sqrt(len(self.embeddings))))
+        self.n_probe = min(n_probe, self.n_lists)
+
+        self.centroids = self._train(n_iter, seed)
+        assignments = (self.embeddings @ self.centroids.T).argmax(axis=1)
+        self.lists = [np.flatnonzero(assignments == i) for i in range(self.n_lists)]
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def _train(self, n_iter: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        centroids = self.embeddings[
+            rng.choice(len(self.embeddings), self.n_lists, replace=False)
+        ]
+        for _ in range(n_iter):
+            assignments = (self.embeddings @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, self.embeddings)
+            counts = np.bincount(assignments, minlength=self.n_lists)
+            # Keep the previous centroid for cells that lost all members
+            filled = counts > 0
+            sums[~filled] = centroids[~filled]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = normalize_rows(queries)
+        indices = np.full((len(queries), k), -1, dtype=int)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if len(queries) == 0:
+            return indices, distances
+
+        cell_scores = queries @ self.centroids.T
+        probes = np.argpartition(-cell_scores, self.n_probe - 1, axis=1)[
+            :, : self.n_probe
+        ]
+        for row, query in enumerate(queries):
+            candidates = np.concatenate([self.lists[cell] for cell in probes[row]])
+            if len(candidates) == 0:
+                continue
+            candidate_distances = 1 - self.embeddings[candidates] @ query
+            best, best_distances = _top_k(candidate_distances[None, :], k)
+            indices[row, : best.shape[1]] = candidates[best[0]]
+            distances[row, : best.shape[1]] = best_distances[0]
+        return indices, distances
+
+
+def build_index(embeddings: np.ndarray, ivf_min_size: int = IVF_MIN_SIZE):
+    if len(embeddings) >= ivf_min_size:
+        return IVFIndex(embeddings)
+    return FlatIndex(embeddings)
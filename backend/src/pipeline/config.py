@@ -0,0 +1,27 @@
+from typing import Any, Dict
+
+
+class RuntimeConfig:
+    """Immutable snapshot of a detector's tunable params and what is derived from them.
+
+    Every stage of a frame reads the snapshot the frame started with, so a
+    new config takes effect from the next frame on and never mid-frame.
+    """
+
+    __slots__ = ("version", "params", "derived")
+
+    def __init__(self, version: int, params: Dict[str, Any], derived: Dict[str, Any]):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "params", dict(params))
+        object.__setattr__(self, "derived", dict(derived))
+
+    def __getattr__(self, name: str):
+        if name in RuntimeConfig.__slots__:
+            raise AttributeError(name)
+        for values in (self.derived, self.params):
+            if name in values:
+                return values[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError("RuntimeConfig is immutable")
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..routes.websockets import ws_manager
+
+# How bursts of an event are merged before publishing. Per-entity updates
+# are held for a window and only the newest goes out; telemetry is sent at
+# most TELEMETRY_HZ per camera, newest first; a removal is held for
+# REMOVAL_HOLD and dropped together with a re-add of the same entity.
+# Anything not listed is published as it comes.
+MERGE_BY_ID = "merge-by-id"
+THROTTLE = "throttle"
+HOLD_REMOVAL = "hold-removal"
+COALESCE_POLICIES = {
+    "server:update-overspeeding": MERGE_BY_ID,
+    "server:traffic-control": THROTTLE,
+    "server:remove-no-helmet-violation": HOLD_REMOVAL,
+}
+# Event -> the held removal that its arrival for the same id cancels
+CANCELS_REMOVAL = {
+    "server:no-helmet-violation": "server:remove-no-helmet-violation",
+}
+
+# Seconds; 0 turns the policy off
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "1"))
+TELEMETRY_HZ = float(os.getenv("TELEMETRY_HZ", "2"))
+REMOVAL_HOLD = float(os.getenv("REMOVAL_HOLD", "3"))
+
+# Called with (message, camera) for every detector event, e.g. to persist it
+event_listeners: List[Callable[[Dict[str, Any], Optional[str]], None]] = []
+
+Delivery = Callable[[Dict[str, Any], Optional[str]], None]
+
+
+class EventCoalescer:
+    """Merges bursts of high-frequency detector events before they are delivered.
+
+    A detector may report a violator's speed every frame, its telemetry
+    every tick and a flapping violation over and over; clients only need
+    the latest state. Held messages go out from ``call_later`` timers, so
+    this must be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        deliver: Delivery,
+        window: float = COALESCE_WINDOW,
+        telemetry_hz: float = TELEMETRY_HZ,
+        removal_hold: float = REMOVAL_HOLD,
+    ):
+        self.deliver = deliver
+        self.window = window
+        self.telemetry_hz = telemetry_hz
+        self.removal_hold = removal_hold
+        self.pending: Dict[Tuple, Tuple[Dict[str, Any], Optional[str]]] = {}
+        self.timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        # Throttled (event, camera) -> when it was last delivered
+        self.last_sent: Dict[Tuple, float] = {}
+        self.received: Counter = Counter()
+        self.delivered: Counter = Counter()
+
+    def offer(self, message: Dict[str, Any], camera: Optional[str] = None):
+        event = message.get("event")
+        self.received[event] += 1
+        data = message.get("data")
+        entity = data.get("id") if isinstance(data, dict) else None
+
+        removal = (CANCELS_REMOVAL.get(event), camera, entity)
+        if removal in self.timers:
+            # The entity came back before its removal went out: clients
+            # still show it, so neither message is sent
+            self.timers.pop(removal).cancel()
+            del self.pending[removal]
+            return
+
+        policy = COALESCE_POLICIES.get(event)
+        if policy == MERGE_BY_ID and self.window > 0 and entity is not None:
+            self._hold((event, camera, entity), message, camera, self.window)
+        elif policy == THROTTLE and self.telemetry_hz > 0:
+            self._throttle((event, camera), message, camera)
+        elif policy == HOLD_REMOVAL and self.removal_hold > 0 and entity is not None:
+            self._hold((event, camera, entity), message, camera, self.removal_hold)
+        else:
+            self._deliver(message, camera)
+
+    def _deliver(self, message: Dict[str, Any], camera: Optional[str]):
+        self.delivered[message.get("event")] += 1
+        self.deliver(message, camera)
+
+    def _hold(self, key: Tuple, message, camera, delay: float):
+        # Newest wins; the timer started by the first message still applies
+        self.pending[key] = (message, camera)
+        if key not in self.timers:
+            loop = asyncio.get_running_loop()
+            self.timers[key] = loop.call_later(delay, self._release, key)
+
+    def _throttle(self, key: Tuple, message, camera):
+        if key in self.timers:
+            self.pending[key] = (message, camera)
+            return
+        now = time.monotonic()
+        wait = self.last_sent.get(key, float("-inf")) + 1 / self.telemetry_hz - now
+        if wait <= 0:
+            self.last_sent[key] = now
+            self._deliver(message, camera)
+        else:
+            self._hold(key, message, camera, wait)
+
+    def _release(self, key: Tuple):
+        del self.timers[key]
+        message, camera = self.pending.pop(key)
+        if key in self.last_sent:
+            # A throttled key: the next interval starts now
+            self.last_sent[key] = time.monotonic()
+        self._deliver(message, camera)
+
+    def flush(self):
+        """Delivers everything held right away, e.g. on shutdown."""
+        for key in list(self.timers):
+            self.timers[key].cancel()
+            self._release(key)
+
+    def status(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "received": sum(self.received.values()),
+            "delivered": sum(self.delivered.values()),
+        }
+
+
+def _deliver(message: Dict[str, Any], camera: Optional[str]):
+    ws_manager.publish(message, camera=camera)
+    for listener in event_listeners:
+        listener(message, camera)
+
+
+event_coalescer = EventCoalescer(_deliver)
+
+
+def emit_event(message: Dict[str, Any], camera: Optional[str] = None):
+    """Publishes a detector event to WebSocket clients and every listener.
+
+    Bursts are coalesced first, so listeners see what clients see. Listeners
+    run on the event loop, so they must only queue work.
+    """
+    event_coalescer.offer(message, camera)
@@ -0,0 +1,92 @@
+import struct
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+# Latest sequence number, then per slot: sequence number, payload length, payload
+HEADER = struct.Struct("q")
+SLOT_HEADER = struct.Struct("qq")
+
+
+def multipart_chunk(jpeg: bytes) -> bytes:
+    return b"--frame\r\n" b"Content-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+
+class FrameRing:
+    """Single-writer ring of encoded frames in shared memory.
+
+    The camera worker writes each JPEG into the next slot and then publishes
+    its sequence number; readers copy the newest slot and re-check its
+    sequence number so a slot overwritten mid-copy is never returned.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        slots: int = 4,
+        slot_size: int = 2 * 1024 * 1024,
+        create: bool = True,
+    ):
+        self.slots = slots
+        self.slot_size = slot_size
+        size = HEADER.size + slots * (SLOT_HEADER.size + slot_size)
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.owner = create
+        # Spawned workers share the creator's resource tracker, so attaching
+        # adds no second entry for the segment; only the owner unlinks it
+        if create:
+            HEADER.pack_into(self.shm.buf, 0, 0)
+
+    @classmethod
+    def attach(cls, name: str, slots: int, slot_size: int) -> "FrameRing":
+        return cls(name=name, slots=slots, slot_size=slot_size, create=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _slot_offset(self, seq: int) -> int:
+        return HEADER.size + (seq % self.slots) * (SLOT_HEADER.size + self.slot_size)
+
+    @property
+    def latest_seq(self) -> int:
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def write(self, payload: bytes) -> bool:
+        if len(payload) > self.slot_size:
+            return False
+
+        buf = self.shm.buf
+        seq = self.latest_seq + 1
+        offset = self._slot_offset(seq)
+
+        # Mark the slot as being written before touching the payload
+        SLOT_HEADER.pack_into(buf, offset, -1, 0)
+        start = offset + SLOT_HEADER.size
+        buf[start : start + len(payload)] = payload
+        SLOT_HEADER.pack_into(buf, offset, seq, len(payload))
+        HEADER.pack_into(buf, 0, seq)
+        return True
+
+    def read_latest(self, after: int = 0) -> Optional[Tuple[int, bytes]]:
+        """Returns (seq, payload) of the newest frame if it is newer than ``after``."""
+        buf = self.shm.buf
+        seq = self.latest_seq
+        if seq <= after:
+            return None
+
+        offset = self._slot_offset(seq)
+        slot_seq, length = SLOT_HEADER.unpack_from(buf, offset)
+        if slot_seq != seq:
+            return None
+        start = offset + SLOT_HEADER.size
+        payload = bytes(buf[start : start + length])
+
+        # The writer lapped us while copying
+        if SLOT_HEADER.unpack_from(buf, offset)[0] != seq:
+            return None
+        return seq, payload
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,207 @@
+import asyncio
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import supervision as sv
+from tqdm import tqdm
+
+from ..utils.artifacts import annotation_style, load_video_info
+from ..utils.image_utils import encode_jpeg, resize_frame
+from ..utils.snapshots import snapshot_store, snapshot_url
+from .config import RuntimeConfig
+from .events import emit_event
+from .frame_ring import multipart_chunk
+from .runtime import FramePacket, Pipeline, Stage
+from .stages import JpegEncoder
+
+
+def split_by_mask(detections: sv.Detections, labels: list, mask: np.ndarray) -> dict:
+    """Groups detections and their labels by a boolean mask, e.g. violators."""
+    return {
+        flag: (
+            detections[mask == flag],
+            [label for label, m in zip(labels, mask) if m == flag],
+        )
+        for flag in (False, True)
+    }
+
+
+def blank_frame(resolution_wh: Tuple[int, int]) -> np.ndarray:
+    """A black BGR frame, the input for warm-up inferences."""
+    width, height = resolution_wh
+    return np.zeros((height, width, 3), dtype=np.uint8)
+
+
+class DetectorPlugin:
+    """Base class for detectors run by the frame pipeline.
+
+    A detector fills in the stage hooks below and gets ``process_video()``
+    for free: frames are decoded, detected, passed through the rules,
+    annotated and encoded on separate workers, while this generator only
+    broadcasts events, paces the output and yields the multipart chunks.
+    """
+
+    video_path: str
+    video_info: sv.VideoInfo
+    frame_delay: float
+
+    # Width the stream is shrunk to before encoding; None keeps the full frame
+    stream_max_width: Optional[int] = 640
+
+    # Stage name -> "thread" or "process"; stateful stages must stay threads
+    stage_executors: Dict[str, str] = {}
+    queue_size: int = 4
+
+    # Set by whoever runs the detector; tags its events for subscriptions
+    camera_id: Optional[str] = None
+
+    # Constructor params that can be changed while the pipeline runs
+    tunable_params: Tuple[str, ...] = ()
+    config: Optional[RuntimeConfig] = None
+
+    @classmethod
+    def compile_artifacts(cls, **kwargs):
+        """Builds the on-disk artifacts a camera needs, without loading models.
+
+        Detectors read the same cached artifacts when they start, so a camera
+        compiled ahead of time starts without probing videos or rasterizing
+        zones. Subclasses extend this for their transforms and zone masks.
+        """
+        video_info = load_video_info(kwargs["video_path"])
+        annotation_style(video_info.resolution_wh)
+        return video_info
+
+    def compile_config(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the filters, transforms and zones that depend on tunable params."""
+        return {}
+
+    def _setup_config(self):
+        params = {name: getattr(self, name) for name in self.tunable_params}
+        self.config = RuntimeConfig(1, params, self.compile_config(params))
+        self._config_lock = threading.Lock()
+
+    def update_config(self, **changes) -> RuntimeConfig:
+        """Swaps in new tunable params, taking effect from the next frame.
+
+        Everything derived from them is rebuilt on the calling thread, so
+        frames keep flowing with the old config meanwhile; models and
+        trackers are left alone.
+        """
+        unknown = set(changes) - set(self.tunable_params)
+        if unknown:
+            raise ValueError(f"Params {sorted(unknown)} cannot be changed at runtime")
+
+        with self._config_lock:
+            params = {**self.config.params, **changes}
+            config = RuntimeConfig(
+                self.config.version + 1, params, self.compile_config(params)
+            )
+            # A single reference swap; frames in flight keep their snapshot
+            self.config = config
+        return config
+
+    def warmup_models(self) -> Dict[str, Callable[[], Any]]:
+        """Model name -> one synthetic inference at the input size it sees live."""
+        return {}
+
+    def warmup(self) -> Dict[str, Dict[str, Any]]:
+        """Runs every model once so the first real frame pays no lazy setup.
+
+        Returns the warm status of each model; a failed warm-up is reported
+        rather than raised, since the same error will surface on real frames.
+        """
+        status = {}
+        for name, infer in self.warmup_models().items():
+            start = time.perf_counter()
+            try:
+                infer()
+            except Exception as e:
+                status[name] = {"warm": False, "error": str(e)}
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            status[name] = {"warm": True, "warmup_ms": round(elapsed_ms, 1)}
+        return status
+
+    def frames(self) -> Iterable[np.ndarray]:
+        return sv.get_video_frames_generator(source_path=self.video_path)
+
+    def detect(self, packet: FramePacket):
+        """Runs the models and tracker, filling packet.detections."""
+        raise NotImplementedError
+
+    def apply_rules(self, packet: FramePacket):
+        """Updates per-track state, sets labels and emits events."""
+
+    def annotate(self, packet: FramePacket) -> np.ndarray:
+        return packet.frame.copy()
+
+    def snapshot(self, packet: FramePacket, index: int, label: str) -> np.ndarray:
+        """Renders the image attached to an event about detection ``index``."""
+        return packet.annotated
+
+    def _detect(self, packet: FramePacket):
+        packet.config = self.config
+        self.detect(packet)
+
+    def _annotate(self, packet: FramePacket):
+        packet.annotated = self.annotate(packet)
+        for message, index, label in packet.snapshots:
+            snapshot = self.snapshot(packet, index, label)
+            # Events carry a URL; the JPEG is stored once and cached by clients
+            jpeg = encode_jpeg(resize_frame(snapshot))
+            message["imgSrc"] = snapshot_url(snapshot_store.put(jpeg))
+
+        # Only the annotated frame travels on to the encoder
+        packet.frame = None
+        packet.config = None
+
+    def build_pipeline(self) -> Pipeline:
+        executors = self.stage_executors
+        return Pipeline(
+            self.frames,
+            [
+                Stage("detect", self._detect, executors.get("detect", "thread")),
+                Stage("rules", self.apply_rules, executors.get("rules", "thread")),
+                Stage("annotate", self._annotate, executors.get("annotate", "thread")),
+                Stage(
+                    "encode",
+                    JpegEncoder(self.stream_max_width),
+                    executors.get("encode", "thread"),
+                    stateful=False,
+                ),
+            ],
+            queue_size=self.queue_size,
+        )
+
+    async def process_video(self):
+        self.pipeline = self.build_pipeline().start()
+        total_frames = getattr(getattr(self, "video_info", None), "total_frames", None)
+        last_sent = 0.0
+
+        try:
+            with tqdm(
+                total=total_frames or None,
+                desc="Frames Processed",
+                unit="frame",
+                dynamic_ncols=True,
+            ) as progress_bar:
+                while True:
+                    packet = await asyncio.to_thread(self.pipeline.get)
+                    if packet is None:
+                        break
+
+                    for message in packet.events:
+                        emit_event(message, camera=self.camera_id)
+
+                    # Frame rate control
+                    wait = self.frame_delay - (time.perf_counter() - last_sent)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    last_sent = time.perf_counter()
+
+                    yield multipart_chunk(packet.jpeg)
+                    progress_bar.update(1)
+        finally:
+            self.pipeline.stop()
@@ -0,0 +1,266 @@
+import ast
+import importlib
+import importlib.util
+import inspect
+import os
+import re
+import tomllib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from numbers import Real
+from typing import Any, Dict, List, Optional, Tuple
+
+CAMERAS_CONFIG = os.getenv("CAMERAS_CONFIG", "./cameras.toml")
+
+# Detector type -> "module:class", imported only once a camera needs it
+DETECTOR_TYPES = {
+    "redLightPassing": "..detectors.red_light_passing:RedLightCrossingDetector",
+    "trafficControl": "..detectors.traffic_control:TrafficControl",
+    "noHelmet": "..detectors.no_helmet:NoHelmetDetector",
+    "overspeeding": "..detectors.overspeeding:OverspeedingDetector",
+    "pothole": "..detectors.pothole:PotholeDetector",
+    "wrongWay": "..detectors.wrong_way:WrongWayDetector",
+    "vehicleFinder": "..detectors.vehicle_finder:VehicleFinder",
+    "personDetector": "..detectors.person_finder:PersonDetector",
+}
+
+# Camera IDs end up in URLs and process names
+CAMERA_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+REQUIRED = inspect.Parameter.empty
+
+UNIT_PARAMS = ("conf_score", "iou_threshold")
+POSITIVE_PARAMS = ("road_width", "road_height", "speed_limit", "recheck_interval")
+
+
+def load_detector(detector: str):
+    module_name, class_name = DETECTOR_TYPES[detector].split(":")
+    return getattr(importlib.import_module(module_name, __package__), class_name)
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def detector_signature(detector: str) -> Tuple[Dict[str, Any], Tuple[str, ...]]:
+    """Constructor params (name -> default or REQUIRED) and tunable params.
+
+    Read from the detector's source, so validating the camera file does not
+    import detector modules and the frameworks behind them.
+    """
+    module_name, class_name = DETECTOR_TYPES[detector].split(":")
+    module_name = importlib.util.resolve_name(module_name, __package__)
+    with open(importlib.util.find_spec(module_name).origin) as f:
+        tree = ast.parse(f.read())
+    cls = next(
+        node
+        for node in tree.body
+        if isinstance(node, ast.ClassDef) and node.name == class_name
+    )
+
+    params, tunable = {}, ()
+    for node in cls.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "tunable_params"
+            for target in node.targets
+        ):
+            tunable = tuple(_literal(node.value) or ())
+        elif isinstance(node, ast.FunctionDef) and node.name == "__init__":
+            args = node.args.args[1:]
+            defaults = [REQUIRED] * (len(args) - len(node.args.defaults))
+            defaults += [_literal(default) for default in node.args.defaults]
+            params = {arg.arg: default for arg, default in zip(args, defaults)}
+    return params, tunable
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+def _check_polygon(value) -> Optional[str]:
+    if not isinstance(value, list) or len(value) < 3:
+        return "must be a list of at least 3 [x, y] points"
+    for point in value:
+        if not (
+            isinstance(point, list) and len(point) == 2 and all(map(_is_number, point))
+        ):
+            return f"has an invalid point {point!r}, expected [x, y]"
+    return None
+
+
+def _check_param(name: str, value) -> Optional[str]:
+    if name.endswith("_polygon") or name == "polygon_zone":
+        return _check_polygon(value)
+    if name.endswith("_path") and not isinstance(value, str):
+        return "must be a path string"
+    if name in UNIT_PARAMS and not (_is_number(value) and 0 <= value <= 1):
+        return "must be a number between 0 and 1"
+    if name in POSITIVE_PARAMS and not (_is_number(value) and value > 0):
+        return "must be a positive number"
+    if name == "video_sources":
+        if not isinstance(value, list) or not value:
+            return "must be a non-empty list of sources"
+        video_ids = [source.get("video_id") for source in value]
+        if len(set(video_ids)) != len(video_ids):
+            return "must have unique video_id values"
+        for source in value:
+            for key in ("video_id", "video_path", "region_polygon"):
+                if key not in source:
+                    return f"source {source.get('video_id')!r} is missing {key}"
+            error = _check_polygon(source["region_polygon"])
+            if error:
+                return f"source {source['video_id']!r} region_polygon {error}"
+    return None
+
+
+@dataclass
+class CameraSpec:
+    id: str
+    detector: str
+    params: Dict[str, Any]
+    autostart: bool = False
+    preload: bool = False
+    # Params with the detector's defaults filled in, as the detector sees them
+    arguments: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def detector_cls(self):
+        return load_detector(self.detector)
+
+    @property
+    def tunable_params(self) -> Tuple[str, ...]:
+        return detector_signature(self.detector)[1]
+
+    def video_paths(self) -> List[str]:
+        if "video_sources" in self.arguments:
+            return [source["video_path"] for source in self.arguments["video_sources"]]
+        return [self.arguments["video_path"]]
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "detector": self.detector,
+            "autostart": self.autostart,
+            "preload": self.preload,
+        }
+
+
+def parse_camera(camera_id: str, table: dict, defaults: dict) -> CameraSpec:
+    """Validates one [cameras.<id>] table, raising ValueError with every problem."""
+    errors = []
+    if not CAMERA_ID.match(camera_id):
+        errors.append("id may only contain letters, digits, '-' and '_'")
+
+    unknown = set(table) - {"detector", "params", "autostart", "preload"}
+    if unknown:
+        errors.append(f"unknown keys {sorted(unknown)}")
+    detector = table.get("detector")
+    if detector not in DETECTOR_TYPES:
+        errors.append(
+            f"detector must be one of {sorted(DETECTOR_TYPES)}, got {detector!r}"
+        )
+        raise ValueError(f"{camera_id}: " + "; ".join(errors))
+
+    params = {**defaults.get(detector, {}), **table.get("params", {})}
+    for name, value in params.items():
+        error = _check_param(name, value)
+        if error:
+            errors.append(f"{name} {error}")
+    signature, _ = detector_signature(detector)
+    unexpected = sorted(set(params) - set(signature))
+    if unexpected:
+        errors.append(f"unexpected params {unexpected}")
+    missing = [
+        name
+        for name, default in signature.items()
+        if default is REQUIRED and name not in params
+    ]
+    if missing:
+        errors.append(f"missing required params {missing}")
+
+    if errors:
+        raise ValueError(f"{camera_id}: " + "; ".join(errors))
+    return CameraSpec(
+        id=camera_id,
+        detector=detector,
+        params=params,
+        autostart=bool(table.get("autostart", False)),
+        preload=bool(table.get("preload", False)),
+        arguments={
+            **{k: v for k, v in signature.items() if v is not REQUIRED},
+            **params,
+        },
+    )
+
+
+class CameraRegistry:
+    """Cameras declared in a TOML file, each a detector type plus its arguments."""
+
+    def __init__(self, path: str = CAMERAS_CONFIG):
+        self.path = path
+        self.cameras: Dict[str, CameraSpec] = {}
+
+    def __contains__(self, camera_id: str) -> bool:
+        return camera_id in self.cameras
+
+    def get(self, camera_id: str) -> CameraSpec:
+        return self.cameras[camera_id]
+
+    def load(self) -> "CameraRegistry":
+        with open(self.path, "rb") as f:
+            config = tomllib.load(f)
+
+        defaults = config.get("detectors", {})
+        errors = [
+            f"unknown detector type {name!r}"
+            for name in defaults
+            if name not in DETECTOR_TYPES
+        ]
+
+        cameras = {}
+        for camera_id, table in config.get("cameras", {}).items():
+            try:
+                cameras[camera_id] = parse_camera(camera_id, table, defaults)
+            except ValueError as e:
+                errors.append(str(e))
+        if errors:
+            raise ValueError(
+                f"Invalid camera config {self.path}:\n  " + "\n  ".join(errors)
+            )
+
+        # Swap the whole set at once so readers never see a half-loaded file
+        self.cameras = cameras
+        return self
+
+    def update_params(self, camera_id: str, changes: Dict[str, Any]) -> CameraSpec:
+        """Validates runtime param changes and returns the updated camera."""
+        camera = self.get(camera_id)
+        fixed = set(changes) - set(camera.tunable_params)
+        if fixed:
+            raise ValueError(f"Params {sorted(fixed)} cannot be changed at runtime")
+
+        table = {"detector": camera.detector, "params": {**camera.params, **changes}}
+        updated = parse_camera(camera_id, table, {})
+        updated.autostart = camera.autostart
+        updated.preload = camera.preload
+        self.cameras = {**self.cameras, camera_id: updated}
+        return updated
+
+    def restore(self, camera: CameraSpec):
+        """Puts back a camera as it was, e.g. when applying an update failed."""
+        self.cameras = {**self.cameras, camera.id: camera}
+
+    def compile(self, camera_id: str):
+        """Checks the camera's videos and builds its cached artifacts."""
+        camera = self.get(camera_id)
+        missing = [path for path in camera.video_paths() if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"{camera_id}: missing {', '.join(missing)}")
+        camera.detector_cls.compile_artifacts(**camera.arguments)
+
+
+camera_registry = CameraRegistry()
@@ -0,0 +1,267 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import supervision as sv
+
+EXECUTORS = ("thread", "process")
+
+# How often blocked queue calls wake up to check for a stop request
+POLL_INTERVAL = 0.1
+
+
+@dataclass
+class FramePacket:
+    """One frame and everything the stages derive from it."""
+
+    index: int
+    frame: Any
+    captured_at: float
+    detections: Optional[sv.Detections] = None
+    removed_ids: list = field(default_factory=list)
+    annotated: Optional[np.ndarray] = None
+    jpeg: Optional[bytes] = None
+    events: List[dict] = field(default_factory=list)
+    snapshots: List[tuple] = field(default_factory=list)
+    data: Dict[str, Any] = field(default_factory=dict)
+    # RuntimeConfig the frame was started with, shared by all its stages
+    config: Any = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def emit(self, event: str, data: dict, snapshot: Optional[tuple] = None):
+        """Queues a WebSocket event; ``snapshot`` args are rendered into imgSrc."""
+        self.events.append({"event": event, "data": data})
+        if snapshot is not None:
+            self.snapshots.append((data, *snapshot))
+
+
+@dataclass
+class StageFailure:
+    stage: str
+    error: str
+
+
+@dataclass
+class Stage:
+    """A named step that updates a FramePacket in place.
+
+    Stateful stages (trackers, annotators with history, per-track rules) keep
+    their state in the calling process, so only stateless stages may run in a
+    separate process.
+    """
+
+    name: str
+    fn: Callable[[FramePacket], None]
+    executor: str = "thread"
+    stateful: bool = True
+
+    def __post_init__(self):
+        if self.executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {self.executor!r} for {self.name}")
+        if self.executor == "process" and self.stateful:
+            raise ValueError(f"Stateful stage {self.name!r} cannot run in a process")
+
+
+class StageStats:
+    def __init__(self):
+        self.frames = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def add(self, elapsed_ms: float):
+        self.frames += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+
+    def as_dict(self) -> dict:
+        return {
+            "frames": self.frames,
+            "mean_ms": self.total_ms / self.frames if self.frames else 0.0,
+            "max_ms": self.max_ms,
+            "last_ms": self.last_ms,
+        }
+
+
+def _put(q, item, stop) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _run_stage(stage: Stage, inbox, outbox, stop):
+    # Shared by thread and process workers; items are packets, None for the
+    # end of the stream, or a StageFailure that is passed on to the consumer
+    while True:
+        item = _get(inbox, stop)
+        if not isinstance(item, FramePacket):
+            if item is not None or not stop.is_set():
+                _put(outbox, item, stop)
+            return
+
+        start = time.perf_counter()
+        try:
+            stage.fn(item)
+        except Exception:
+            _put(outbox, StageFailure(stage.name, traceback.format_exc()), stop)
+            return
+        item.timings[stage.name] = (time.perf_counter() - start) * 1000
+
+        if not _put(outbox, item, stop):
+            return
+
+
+class Pipeline:
+    """Runs a frame source and a chain of stages, each on its own worker.
+
+    Stages are connected by bounded queues, so a slow stage applies back
+    pressure instead of letting frames pile up. Per-stage timings travel with
+    each packet and are aggregated when the consumer takes it.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], Iterable[Any]],
+        stages: List[Stage],
+        queue_size: int = 4,
+    ):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+
+        self.stats: Dict[str, StageStats] = {"decode": StageStats()}
+        self.stats.update({stage.name: StageStats() for stage in stages})
+        self.frames_out = 0
+        self.lag_ms = 0.0
+
+        self._workers = []
+        self._queues = []
+        self._stop = None
+
+    def _uses_processes(self) -> bool:
+        return any(stage.executor == "process" for stage in self.stages)
+
+    def start(self):
+        context = mp.get_context("spawn")
+        self._stop = context.Event() if self._uses_processes() else threading.Event()
+
+        # Queue i feeds stage i; the last queue feeds the consumer
+        executors = ["thread"] + [stage.executor for stage in self.stages] + ["thread"]
+        for i in range(len(self.stages) + 1):
+            crosses_process = "process" in (executors[i], executors[i + 1])
+            self._queues.append(
+                context.Queue(self.queue_size)
+                if crosses_process
+                else queue.Queue(self.queue_size)
+            )
+
+        self._workers.append(threading.Thread(target=self._decode, daemon=True))
+        for stage, inbox, outbox in zip(self.stages, self._queues, self._queues[1:]):
+            if stage.executor == "process":
+                worker = context.Process(
+                    target=_run_stage,
+                    args=(stage, inbox, outbox, self._stop),
+                    daemon=True,
+                )
+            else:
+                worker = threading.Thread(
+                    target=_run_stage,
+                    args=(stage, inbox, outbox, self._stop),
+                    daemon=True,
+                )
+            self._workers.append(worker)
+
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def _decode(self):
+        outbox = self._queues[0]
+        try:
+            frames = iter(self.source())
+            index = 0
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                frame = next(frames, None)
+                if frame is None:
+                    break
+                index += 1
+                packet = FramePacket(index=index, frame=frame, captured_at=start)
+                packet.timings["decode"] = (time.perf_counter() - start) * 1000
+                if not _put(outbox, packet, self._stop):
+                    return
+        except Exception:
+            _put(outbox, StageFailure("decode", traceback.format_exc()), self._stop)
+            return
+        _put(outbox, None, self._stop)
+
+    def get(self) -> Optional[FramePacket]:
+        """Blocks for the next finished packet; None at the end of the stream."""
+        while True:
+            try:
+                item = self._queues[-1].get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    return None
+                self._check_processes()
+
+        if isinstance(item, StageFailure):
+            raise RuntimeError(f"Pipeline stage {item.stage!r} failed:\n{item.error}")
+        if item is not None:
+            for name, elapsed_ms in item.timings.items():
+                self.stats[name].add(elapsed_ms)
+            self.frames_out += 1
+            self.lag_ms = (time.perf_counter() - item.captured_at) * 1000
+        return item
+
+    def _check_processes(self):
+        # A stage process that died cannot report a failure itself
+        for worker in self._workers:
+            if isinstance(worker, mp.process.BaseProcess) and worker.exitcode:
+                raise RuntimeError(
+                    f"Pipeline worker {worker.name} exited with code {worker.exitcode}"
+                )
+
+    def stop(self, timeout: float = 2.0):
+        if self._stop is None:
+            return
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout)
+            if isinstance(worker, mp.process.BaseProcess) and worker.is_alive():
+                worker.terminate()
+        self._workers = []
+
+        # Items left in process queues must not keep the interpreter alive
+        for q in self._queues:
+            if not isinstance(q, queue.Queue):
+                q.cancel_join_thread()
+                q.close()
+        self._queues = []
+
+    def report(self) -> dict:
+        return {
+            "frames": self.frames_out,
+            "lag_ms": self.lag_ms,
+            "stages": {name: stats.as_dict() for name, stats in self.stats.items()},
+        }
@@ -0,0 +1,26 @@
+from typing import Optional
+
+import cv2
+
+from ..utils.image_utils import resize_frame
+from .runtime import FramePacket
+
+
+class JpegEncoder:
+    """Stateless resize-and-encode step; picklable so it can run in a process."""
+
+    def __init__(self, max_width: Optional[int] = 640, quality: int = 80):
+        self.max_width = max_width
+        self.quality = quality
+
+    def __call__(self, packet: FramePacket):
+        frame = packet.annotated
+        if self.max_width is not None:
+            frame = resize_frame(frame, max_width=self.max_width)
+        _, buffer = cv2.imencode(
+            ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
+        )
+        packet.jpeg = buffer.tobytes()
+
+        # Only the encoded bytes are needed past this point
+        packet.annotated = None
@@ -0,0 +1,413 @@
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ..data.app_data import app_data, app_data_listeners
+from .events import emit_event
+from .frame_ring import FrameRing, multipart_chunk
+from .registry import load_detector
+
+# Seconds between liveness checks and the cap on the restart back-off
+SUPERVISE_INTERVAL = 0.5
+MAX_RESTART_DELAY = 30
+# Consecutive crashes after which a camera is given up on
+MAX_RESTARTS = 5
+# A worker that ran this long is considered healthy again
+HEALTHY_RUNTIME = 60
+
+STATS_INTERVAL = 1.0
+
+# Each camera runs in its own worker process unless CAMERA_WORKERS=0
+WORKERS_ENABLED = os.getenv("CAMERA_WORKERS", "1") != "0"
+
+
+def _apply_commands(commands, events, stop, detector):
+    while not stop.is_set():
+        try:
+            kind, payload = commands.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if kind == "app-data":
+            # Update in place so detectors holding the dict see the change
+            app_data.update(payload)
+        elif kind == "config":
+            # Derived state is rebuilt on this thread while frames keep flowing
+            try:
+                config = detector.update_config(**payload)
+            except Exception as e:
+                events.put(("config", {"version": None, "error": str(e)}))
+            else:
+                events.put(("config", {"version": config.version, "error": None}))
+
+
+def run_camera_worker(
+    detector, kwargs, ring_name, slots, slot_size, events, commands, stop, active
+):
+    """Entry point of a camera process: runs one detector pipeline.
+
+    Encoded frames go to the shared-memory ring, events and pipeline stats to
+    the events queue; the web process only fans them out. Models are loaded
+    and warmed up before the camera reports ready, and frames are only
+    pulled through the pipeline while ``active`` is set.
+    """
+    ring = FrameRing.attach(ring_name, slots, slot_size)
+    started = time.perf_counter()
+    # Detector modules and their frameworks are only imported in the worker
+    plugin = load_detector(detector)(**kwargs)
+    load_ms = (time.perf_counter() - started) * 1000
+    models = plugin.warmup()
+    events.put(("ready", {"load_ms": round(load_ms, 1), "models": models}))
+    threading.Thread(
+        target=_apply_commands, args=(commands, events, stop, plugin), daemon=True
+    ).start()
+
+    # A paused camera leaves the pipeline primed; its full queues stop decoding
+    pipeline = plugin.build_pipeline().start()
+    last_sent = last_stats = 0.0
+    try:
+        while not stop.is_set():
+            if not active.wait(SUPERVISE_INTERVAL):
+                continue
+            packet = pipeline.get()
+            if packet is None:
+                break
+            if packet.events:
+                events.put(("events", packet.events))
+
+            # Frame rate control happens here, once for every viewer
+            wait = plugin.frame_delay - (time.perf_counter() - last_sent)
+            if wait > 0:
+                time.sleep(wait)
+            last_sent = time.perf_counter()
+
+            if not ring.write(packet.jpeg):
+                print(f"Dropped a {len(packet.jpeg)} byte frame larger than a slot")
+            if last_sent - last_stats >= STATS_INTERVAL:
+                events.put(("stats", pipeline.report()))
+                last_stats = last_sent
+    finally:
+        pipeline.stop()
+        ring.close()
+
+
+class CameraWorker:
+    """A detector pipeline running in its own process, restarted if it crashes.
+
+    Camera processes are daemonic, so their detectors must keep every
+    pipeline stage on threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        detector: str,
+        kwargs: Dict[str, Any],
+        slots: int = 4,
+        slot_size: int = 2 * 1024 * 1024,
+        poll_interval: float = 0.01,
+    ):
+        self.name = name
+        self.detector = detector
+        self.kwargs = kwargs
+        self.slots = slots
+        self.slot_size = slot_size
+        self.poll_interval = poll_interval
+
+        self.context = mp.get_context("spawn")
+        self.ring: Optional[FrameRing] = None
+        self.process = None
+        self.events = None
+        self.commands = None
+        self.stop_event = None
+        self.tasks = []
+
+        self.subscribers = 0
+        # Started explicitly, so it keeps running without viewers
+        self.pinned = False
+        # Preloaded, so it stays warm but paused without viewers
+        self.standby = False
+        self.active_event = None
+        self.warmup: Optional[Dict[str, Any]] = None
+        self.restarts = 0
+        self.finished = False
+        self.stats: Dict[str, Any] = {}
+        self.stats_at: Optional[float] = None
+        self.config_status: Dict[str, Any] = {}
+        self._latest = (0, None)
+
+    def start(self):
+        self.ring = FrameRing(slots=self.slots, slot_size=self.slot_size)
+        self._spawn()
+        self.tasks = [asyncio.create_task(self._supervise())]
+        # A thread of its own, so live cameras never hold default-executor
+        # threads that to_thread callers are waiting for
+        threading.Thread(
+            target=self._pump_events,
+            args=(asyncio.get_running_loop(),),
+            name=f"camera-{self.name}-events",
+            daemon=True,
+        ).start()
+        return self
+
+    def _spawn(self):
+        # Fresh queues, since a crashed process may have died holding a lock
+        self.events = self.context.Queue()
+        self.commands = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.active_event = self.context.Event()
+        self.sync_active()
+        self.warmup = None
+        self.commands.put(
+            (
+                "app-data",
+                {
+                    "lookoutVehicles": list(app_data["lookoutVehicles"]),
+                    "lookoutPersons": list(app_data["lookoutPersons"]),
+                },
+            )
+        )
+        self.process = self.context.Process(
+            target=run_camera_worker,
+            args=(
+                self.detector,
+                self.kwargs,
+                self.ring.name,
+                self.slots,
+                self.slot_size,
+                self.events,
+                self.commands,
+                self.stop_event,
+                self.active_event,
+            ),
+            name=f"camera-{self.name}",
+            daemon=True,
+        )
+        self.process.start()
+        self.started_at = time.monotonic()
+
+    async def _supervise(self):
+        consecutive = 0
+        while not self.finished:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            exitcode = self.process.exitcode
+            if exitcode is None:
+                continue
+            if exitcode == 0 or self.stop_event.is_set():
+                self.finished = True
+                break
+
+            if time.monotonic() - self.started_at > HEALTHY_RUNTIME:
+                consecutive = 0
+            consecutive += 1
+            if consecutive > MAX_RESTARTS:
+                print(f"Camera {self.name} keeps crashing, giving up")
+                self.finished = True
+                break
+
+            delay = min(MAX_RESTART_DELAY, 2 ** (consecutive - 1))
+            print(f"Camera {self.name} exited with {exitcode}, restarting in {delay}s")
+            await asyncio.sleep(delay)
+            self.restarts += 1
+            self._spawn()
+
+    def _pump_events(self, loop: asyncio.AbstractEventLoop):
+        # Blocks on the worker's queue and hands each item to the event loop
+        while not self.finished:
+            try:
+                item = self.events.get(timeout=SUPERVISE_INTERVAL)
+            except (queue.Empty, OSError, ValueError):
+                continue
+            try:
+                loop.call_soon_threadsafe(self._handle_event, *item)
+            except RuntimeError:
+                return  # The loop has closed
+
+    def _handle_event(self, kind: str, payload: Any):
+        if kind == "events":
+            for message in payload:
+                emit_event(message, camera=self.name)
+        elif kind == "stats":
+            self.stats = payload
+            self.stats_at = time.monotonic()
+        elif kind == "config":
+            self.config_status = payload
+        elif kind == "ready":
+            self.warmup = payload
+            print(f"Camera {self.name} ready after {payload['load_ms']} ms")
+
+    @property
+    def ready(self) -> bool:
+        return self.warmup is not None and all(
+            model["warm"] for model in self.warmup["models"].values()
+        )
+
+    def sync_active(self):
+        # Frames only flow while someone watches or the camera is pinned
+        if self.active_event is None:
+            return
+        if self.pinned or self.subscribers > 0:
+            self.active_event.set()
+        else:
+            self.active_event.clear()
+
+    def latest_frame(self, after: int = 0):
+        # Every viewer of this camera shares one copy of the newest frame
+        if self._latest[0] <= after:
+            if self.ring is None:
+                return None
+            frame = self.ring.read_latest(after=after)
+            if frame is None:
+                return None
+            self._latest = frame
+        return self._latest
+
+    async def frames(self):
+        seq = 0
+        while True:
+            frame = self.latest_frame(after=seq)
+            if frame is not None:
+                seq, jpeg = frame
+                yield multipart_chunk(jpeg)
+            elif self.finished:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def status(self) -> dict:
+        return {
+            "running": self.process is not None and self.process.is_alive(),
+            "finished": self.finished,
+            "pinned": self.pinned,
+            "standby": self.standby,
+            "active": self.active_event is not None and self.active_event.is_set(),
+            "ready": self.ready,
+            "warmup": self.warmup,
+            "subscribers": self.subscribers,
+            "restarts": self.restarts,
+            "config": self.config_status,
+            "stats": self.stats,
+        }
+
+    def send(self, kind: str, payload: Any):
+        if self.commands is not None and not self.finished:
+            self.commands.put((kind, payload))
+
+    def update_config(self, changes: Dict[str, Any]):
+        # A restarted process starts from the updated params too
+        self.kwargs = {**self.kwargs, **changes}
+        self.send("config", changes)
+
+    async def stop(self):
+        self.finished = True
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.to_thread(self._shutdown)
+
+    def close(self):
+        """Releases a finished worker; its process has exited, so nothing blocks."""
+        self.finished = True
+        for task in self.tasks:
+            task.cancel()
+        self._shutdown()
+
+    def _shutdown(self, timeout: float = 5.0):
+        if self.process is not None:
+            self.stop_event.set()
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class CameraWorkerPool:
+    """One worker per camera, shared by all its viewers and stopped after the last.
+
+    Preloaded cameras are the exception: their worker stays up with warm
+    models and a primed pipeline, paused while nobody watches, so a new
+    viewer gets frames without waiting for a process and its models.
+    """
+
+    def __init__(self):
+        self.workers: Dict[str, CameraWorker] = {}
+
+    def _worker(self, name: str, detector: str, kwargs: Dict[str, Any]):
+        worker = self.workers.get(name)
+        if worker is None or worker.finished:
+            if worker is not None:
+                # Free the old frame ring before a new worker makes its own
+                worker.close()
+            worker = CameraWorker(name, detector, kwargs).start()
+            self.workers[name] = worker
+        return worker
+
+    def start(self, name: str, detector: str, kwargs: Dict[str, Any]):
+        worker = self._worker(name, detector, kwargs)
+        worker.pinned = True
+        worker.sync_active()
+        return worker
+
+    def preload(self, name: str, detector: str, kwargs: Dict[str, Any]):
+        worker = self._worker(name, detector, kwargs)
+        worker.standby = True
+        worker.sync_active()
+        return worker
+
+    async def stop(self, name: str) -> bool:
+        worker = self.workers.pop(name, None)
+        if worker is None:
+            return False
+        await worker.stop()
+        return True
+
+    async def stream(self, name: str, detector: str, kwargs: Dict[str, Any]):
+        worker = self._worker(name, detector, kwargs)
+        worker.subscribers += 1
+        worker.sync_active()
+        try:
+            async for chunk in worker.frames():
+                yield chunk
+        finally:
+            worker.subscribers -= 1
+            worker.sync_active()
+            if (
+                worker.subscribers == 0
+                and not worker.pinned
+                and not worker.standby
+                and self.workers.get(name) is worker
+            ):
+                del self.workers[name]
+                await worker.stop()
+
+    def status(self, name: str) -> Optional[dict]:
+        worker = self.workers.get(name)
+        return worker.status() if worker is not None else None
+
+    def update_config(self, name: str, changes: Dict[str, Any]) -> bool:
+        worker = self.workers.get(name)
+        if worker is None:
+            return False
+        worker.update_config(changes)
+        return True
+
+    def push_app_data(self, data: Dict[str, Any]):
+        payload = {
+            "lookoutVehicles": list(data["lookoutVehicles"]),
+            "lookoutPersons": list(data["lookoutPersons"]),
+        }
+        for worker in self.workers.values():
+            worker.send("app-data", payload)
+
+    async def stop_all(self):
+        workers, self.workers = list(self.workers.values()), {}
+        for worker in workers:
+            await worker.stop()
+
+
+camera_workers = CameraWorkerPool()
+app_data_listeners.append(camera_workers.push_app_data)
@@ -2,15 +2,19 @@ import os
 
 import cv2
 import cvzone
-from deepface import DeepFace
 from dotenv import load_dotenv
 from src.data.app_data import app_data
+from src.faces.engine import FaceEngine
 
 load_dotenv()
 IMAGES_PATH = os.getenv("IMAGES_PATH")
 
+face_engine = None
+
 
 def detect_face(frame, face_detection_id):
+    global face_engine
+
     face_ids_map = {}
 
     if face_detection_id != "all":
@@ -21,26 +25,30 @@ def detect_face(frame, face_detection_id):
     else:
         face_ids_map = app_data["face_ids_map"]
 
+    # Reference faces are embedded once and reused on every frame
+    if face_engine is None:
+        face_engine = FaceEngine()
     for face_id in face_ids_map.keys():
-        ref_img_path = f"{IMAGES_PATH}/face/{face_id}.jpg"
-        person_name = face_ids_map[face_id]
-
-        result = DeepFace.verify(
-            ref_img_path,
+        face_engine.add(face_id, f"{IMAGES_PATH}/face/{face_id}.jpg")
+
+    for face in face_engine.recognize(frame):
+        if face["name"] not in face_ids_map:
+            continue
+
+        person_name = face_ids_map[face["name"]]
+        x, y, w, h = (
+            face["facial_area"]["x"],
+            face["facial_area"]["y"],
+            face["facial_area"]["w"],
+            face["facial_area"]["h"],
+        )
+        cvzone.cornerRect(frame, (x, y, w, h))
+        cvzone.putTextRect(
             frame,
-            model_name="VGG-Face",
-            enforce_detection=False,
+            text=person_name,
+            pos=(max(0, x), max(30, y)),
+            font=cv2.FONT_HERSHEY_DUPLEX,
+            scale=0.6,
+            thickness=1,
+            offset=3,
         )
-
-        if result["verified"]:
-            x, y, w, h, _, _ = result["facial_areas"]["img2"].values()
-            cvzone.cornerRect(frame, (x, y, w, h))
-            cvzone.putTextRect(
-                frame,
-                text=person_name,
-                pos=(max(0, x), max(30, y)),
-                font=cv2.FONT_HERSHEY_DUPLEX,
-                scale=0.6,
-                thickness=1,
-                offset=3,
-            )
\ No newline at end of file
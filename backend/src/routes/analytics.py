@@ -0,0 +1,89 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from src.data.rollups import DEFAULT_QUANTILES, rollups
+
+router = APIRouter()
+
+PERIOD = Query("hour", description="Bucket size: minute | hour | day")
+SINCE = Query(None, description="Window start, in ms; defaults to a day ago")
+UNTIL = Query(None, description="Window end, in ms; defaults to now")
+
+
+def _answer(query, **kwargs):
+    try:
+        return query(**kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get("/analytics/counts")
+def event_counts(
+    period: str = PERIOD,
+    since: Optional[float] = SINCE,
+    until: Optional[float] = UNTIL,
+    camera: Optional[str] = None,
+    type: Optional[str] = Query(None, description="e.g. server:overspeeding"),
+):
+    return _answer(
+        rollups.counts,
+        period=period,
+        since=since,
+        until=until,
+        camera=camera,
+        event_type=type,
+    )
+
+
+@router.get("/analytics/speeds")
+def speed_percentiles(
+    period: str = PERIOD,
+    since: Optional[float] = SINCE,
+    until: Optional[float] = UNTIL,
+    camera: Optional[str] = None,
+    q: List[float] = Query(list(DEFAULT_QUANTILES), description="Quantiles, 0..1"),
+):
+    return _answer(
+        rollups.speed_percentiles,
+        period=period,
+        since=since,
+        until=until,
+        camera=camera,
+        qs=q,
+    )
+
+
+@router.get("/analytics/helmet-violations")
+def helmet_violations(
+    period: str = PERIOD,
+    since: Optional[float] = SINCE,
+    until: Optional[float] = UNTIL,
+    camera: Optional[str] = None,
+):
+    return _answer(
+        rollups.helmet_violations,
+        period=period,
+        since=since,
+        until=until,
+        camera=camera,
+    )
+
+
+@router.get("/analytics/top-classes")
+def top_classes(
+    period: str = PERIOD,
+    since: Optional[float] = SINCE,
+    until: Optional[float] = UNTIL,
+    camera: Optional[str] = None,
+    type: Optional[str] = Query(None, description="e.g. server:overspeeding"),
+    limit: int = Query(5, ge=1, le=50),
+):
+    return _answer(
+        rollups.top_classes,
+        period=period,
+        since=since,
+        until=until,
+        camera=camera,
+        event_type=type,
+        limit=limit,
+    )
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException
+from src.pipeline.registry import camera_registry
+from src.pipeline.workers import WORKERS_ENABLED, camera_workers
+from src.routes.live_stream import local_detectors
+
+router = APIRouter()
+
+
+def _camera_or_404(camera_id: str):
+    if camera_id not in camera_registry:
+        raise HTTPException(status_code=404, detail=f"Unknown camera {camera_id}")
+    return camera_registry.get(camera_id)
+
+
+def _camera_info(camera) -> dict:
+    return {**camera.as_dict(), "worker": camera_workers.status(camera.id)}
+
+
+async def start_camera(camera_id: str, standby: bool = False) -> dict:
+    camera = _camera_or_404(camera_id)
+    try:
+        # Build artifacts here so a bad camera fails the request, not the worker
+        await asyncio.to_thread(camera_registry.compile, camera_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if standby:
+        camera_workers.preload(camera.id, camera.detector, camera.params)
+    else:
+        camera_workers.start(camera.id, camera.detector, camera.params)
+    return _camera_info(camera)
+
+
+@router.get("/cameras")
+def list_cameras():
+    return [_camera_info(camera) for camera in camera_registry.cameras.values()]
+
+
+@router.get("/cameras/{camera_id}")
+def get_camera(camera_id: str):
+    return _camera_info(_camera_or_404(camera_id))
+
+
+@router.post("/cameras/{camera_id}/start")
+async def start_pipeline(camera_id: str):
+    if not WORKERS_ENABLED:
+        raise HTTPException(status_code=409, detail="Camera workers are disabled")
+    return await start_camera(camera_id)
+
+
+@router.post("/cameras/{camera_id}/stop")
+async def stop_pipeline(camera_id: str):
+    camera = _camera_or_404(camera_id)
+    await camera_workers.stop(camera.id)
+    return _camera_info(camera)
+
+
+@router.get("/cameras/{camera_id}/config")
+def get_camera_config(camera_id: str):
+    camera = _camera_or_404(camera_id)
+    status = camera_workers.status(camera.id)
+    applied = status["config"] if status else None
+    detectors = local_detectors.get(camera.id)
+    if detectors:
+        version = min(detector.config.version for detector in detectors)
+        applied = {"version": version, "error": None}
+    return {
+        "params": {
+            name: camera.arguments[name] for name in camera.tunable_params
+        },
+        "applied": applied,
+    }
+
+
+@router.patch("/cameras/{camera_id}/config")
+async def update_camera_config(camera_id: str, changes: Dict[str, Any]):
+    # Running pipelines rebuild filters, transforms and zones in the background
+    # and switch over between frames, keeping models and trackers
+    previous = _camera_or_404(camera_id)
+    try:
+        camera_registry.update_params(camera_id, changes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if WORKERS_ENABLED:
+        camera_workers.update_config(camera_id, changes)
+    else:
+        # In-process detectors rebuild on a thread, off the event loop
+        applied = []
+        for detector in list(local_detectors.get(camera_id, ())):
+            before = {name: detector.config.params[name] for name in changes}
+            try:
+                await asyncio.to_thread(detector.update_config, **changes)
+            except Exception as e:
+                # A failed rebuild keeps its old config; put the registry and
+                # any detector already switched back to match it
+                camera_registry.restore(previous)
+                for done, params in applied:
+                    await asyncio.to_thread(done.update_config, **params)
+                raise HTTPException(status_code=422, detail=str(e))
+            applied.append((detector, before))
+    return get_camera_config(camera_id)
+
+
+@router.post("/cameras/reload")
+def reload_cameras():
+    # Running pipelines keep their arguments until they are restarted
+    try:
+        camera_registry.load()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return list_cameras()
@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from src.data.event_store import event_store
+from src.utils.snapshots import snapshot_id_of, snapshot_store
+
+router = APIRouter()
+
+
+def _mark_pruned_snapshots(page: dict) -> dict:
+    # Snapshots are pruned to a disk budget, independently of the history,
+    # so an old event may outlive its image: report it instead of a dead URL
+    for item in page["items"]:
+        data = item["data"]
+        snapshot_id = snapshot_id_of(data.get("imgSrc"))
+        if snapshot_id is not None and not snapshot_store.exists(snapshot_id):
+            data["imgSrc"] = None
+            data["snapshotPruned"] = True
+    return page
+
+
+@router.get("/events")
+def list_events(
+    type: Optional[str] = Query(None, description="e.g. server:overspeeding"),
+    camera: Optional[str] = None,
+    class_name: Optional[str] = None,
+    plate: Optional[str] = None,
+    min_speed: Optional[float] = None,
+    max_speed: Optional[float] = None,
+    since: Optional[float] = Query(None, description="detectedAt lower bound, in ms"),
+    until: Optional[float] = Query(None, description="detectedAt upper bound, in ms"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    include_removed: bool = Query(False, description="also list retracted events"),
+):
+    try:
+        page = event_store.query(
+            event_type=type,
+            camera=camera,
+            class_name=class_name,
+            plate=plate.strip().upper() if plate else None,
+            min_speed=min_speed,
+            max_speed=max_speed,
+            since=since,
+            until=until,
+            limit=limit,
+            cursor=cursor,
+            include_removed=include_removed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _mark_pruned_snapshots(page)
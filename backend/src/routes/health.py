@@ -0,0 +1,78 @@
+import os
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from src.data.event_store import event_store
+from src.pipeline.events import event_coalescer
+from src.pipeline.workers import camera_workers
+
+router = APIRouter()
+
+# A streaming camera lagging more than this, or silent for longer than
+# MAX_STATS_AGE seconds, is reported as degraded
+MAX_LAG_MS = float(os.getenv("HEALTH_MAX_LAG_MS", "2000"))
+MAX_STATS_AGE = 5.0
+
+
+def _camera_health(worker) -> dict:
+    stats = worker.stats
+    age = None if worker.stats_at is None else time.monotonic() - worker.stats_at
+    status = worker.status()
+    degraded = (
+        status["active"]
+        and worker.ready
+        and (
+            age is None
+            or age > MAX_STATS_AGE
+            or stats.get("lag_ms", 0) > MAX_LAG_MS
+        )
+    )
+    return {
+        "status": "degraded" if degraded else "ok",
+        "running": status["running"],
+        "active": status["active"],
+        "restarts": worker.restarts,
+        "frames": stats.get("frames"),
+        "lag_ms": stats.get("lag_ms"),
+        "stats_age_s": None if age is None else round(age, 1),
+        "stages": stats.get("stages", {}),
+    }
+
+
+@router.get("/healthz")
+def healthz():
+    # Always 200 while the API answers; camera problems are reported, not fatal
+    cameras = {
+        name: _camera_health(worker)
+        for name, worker in camera_workers.workers.items()
+        if not worker.finished
+    }
+    degraded = any(camera["status"] == "degraded" for camera in cameras.values())
+    return {
+        "status": "degraded" if degraded else "ok",
+        "cameras": cameras,
+        "events": event_store.status(),
+        "coalescing": event_coalescer.status(),
+    }
+
+
+@router.get("/readyz")
+def readyz():
+    # Ready once every started camera has loaded and warmed up its models.
+    # With no camera started (nothing preloaded or autostarted, or
+    # CAMERA_WORKERS=0) there is nothing to wait for, so the API is ready
+    cameras = {
+        name: {
+            "ready": worker.ready,
+            "load_ms": worker.warmup["load_ms"] if worker.warmup else None,
+            "models": worker.warmup["models"] if worker.warmup else {},
+        }
+        for name, worker in camera_workers.workers.items()
+        if not worker.finished
+    }
+    ready = all(camera["ready"] for camera in cameras.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "cameras": cameras},
+    )
@@ -0,0 +1,25 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import FileResponse
+from src.utils.snapshots import snapshot_store
+
+router = APIRouter()
+
+# Snapshot IDs are content hashes, so a URL always means the same bytes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/snapshots/{snapshot_id}.jpg")
+def get_snapshot(snapshot_id: str, if_none_match: Optional[str] = Header(None)):
+    path = snapshot_store.file_path(snapshot_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Unknown snapshot")
+
+    headers = {"ETag": f'"{snapshot_id}"', "Cache-Control": CACHE_CONTROL}
+    if if_none_match is not None and headers["ETag"] in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
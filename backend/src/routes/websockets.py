@@ -1,45 +1,401 @@
-from typing import Any, Dict, List
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 
-from fastapi import APIRouter, WebSocket
+from fastapi import APIRouter, HTTPException, WebSocket
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
-from ..data.app_data import app_data
+from ..data.app_data import FACES_PATH, app_data, app_data_store
+from ..utils.json_utils import dumps
+
+# What happens to an event when a client's outbox is full. Telemetry is
+# superseded by the next update, so the oldest queued copy goes first;
+# anything not listed (violations, app data) is never dropped, and a client
+# that falls that far behind is disconnected instead.
+DROP_OLDEST = "drop-oldest"
+NEVER_DROP = "never-drop"
+OVERFLOW_POLICIES = {
+    "server:traffic-control": DROP_OLDEST,
+}
+# Clients may only relay events of their own to each other; these are
+# best-effort, with no seq and no replay, so a client cannot flood the
+# replay ring or pose as the server
+CLIENT_EVENT_PREFIX = "client:"
+
+# Messages a client may have queued, and how long one send may take
+MAX_QUEUE = 256
+SEND_TIMEOUT = 5.0
+
+# Never-drop events kept for reconnecting clients, bounded by count and size
+REPLAY_MAX_EVENTS = 5000
+REPLAY_MAX_BYTES = 16 * 1024 * 1024
+
+
+# Topics are "<event>/<camera>", either part "*"; a bare event means any camera
+WILDCARD = "*"
+Topic = Tuple[str, str]
+
+
+def overflow_policy(event: Optional[str]) -> str:
+    if isinstance(event, str) and event.startswith(CLIENT_EVENT_PREFIX):
+        return DROP_OLDEST
+    return OVERFLOW_POLICIES.get(event, NEVER_DROP)
+
+
+def parse_topic(topic: str) -> Topic:
+    event, _, camera = topic.strip().partition("/")
+    if not event:
+        raise ValueError(f"Invalid topic {topic!r}, expected <event>/<camera>")
+    return event, camera or WILDCARD
+
+
+def format_topic(topic: Topic) -> str:
+    return "/".join(topic)
+
+
+def matching_topics(event: Optional[str], camera: Optional[str]) -> List[Topic]:
+    """Every subscription pattern a message with this event and camera matches."""
+    event, camera = event or "", camera or ""
+    return [
+        (event, camera),
+        (event, WILDCARD),
+        (WILDCARD, camera),
+        (WILDCARD, WILDCARD),
+    ]
+
+
+class ReplayEntry(NamedTuple):
+    seq: int
+    event: Optional[str]
+    camera: Optional[str]
+    text: str
+
+
+class ReplayRing:
+    """Recent events by sequence number, for clients resuming after a blip.
+
+    Bounded by both count and serialized size; ``evicted_seq`` is the newest
+    sequence number no longer held, so older resume points need a resync.
+    """
+
+    def __init__(self, max_events: int, max_bytes: int, start_seq: int):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.entries: Deque[ReplayEntry] = deque()
+        self.bytes = 0
+        self.evicted_seq = start_seq
+
+    def append(self, entry: ReplayEntry):
+        self.entries.append(entry)
+        self.bytes += len(entry.text)
+        while len(self.entries) > self.max_events or self.bytes > self.max_bytes:
+            evicted = self.entries.popleft()
+            self.bytes -= len(evicted.text)
+            self.evicted_seq = evicted.seq
+
+    def since(self, seq: int) -> Optional[List[ReplayEntry]]:
+        """Entries after ``seq`` in order, or None if some were evicted."""
+        if seq < self.evicted_seq:
+            return None
+        # Resume points are usually recent, so scan from the newest end
+        missed = []
+        for entry in reversed(self.entries):
+            if entry.seq <= seq:
+                break
+            missed.append(entry)
+        missed.reverse()
+        return missed
+
+
+class ClientConnection:
+    """A WebSocket client with its own bounded outbox and sender task.
+
+    The outbox holds (event, text) pairs; the text is serialized once per
+    message and shared by every client. ``topics`` are the patterns the
+    client subscribed to.
+    """
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.manager = manager
+        self.outbox: Deque[Tuple[Optional[str], str]] = deque()
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.topics: Set[Topic] = set()
+        self.task = asyncio.create_task(self._send_loop())
+
+    def wants(self, event: Optional[str], camera: Optional[str]) -> bool:
+        return not self.topics.isdisjoint(matching_topics(event, camera))
+
+    def offer(self, event: Optional[str], text: str) -> bool:
+        """Queues a message without waiting; False if the client cannot keep up."""
+        if len(self.outbox) >= self.manager.max_queue:
+            droppable = next(
+                (
+                    i
+                    for i, (queued, _) in enumerate(self.outbox)
+                    if overflow_policy(queued) == DROP_OLDEST
+                ),
+                None,
+            )
+            if droppable is not None:
+                del self.outbox[droppable]
+            elif overflow_policy(event) == DROP_OLDEST:
+                # Nothing older to give up, so this update is the oldest one
+                self.dropped += 1
+                return True
+            else:
+                return False
+            self.dropped += 1
+        self.outbox.append((event, text))
+        self.wakeup.set()
+        return True
+
+    async def _send_loop(self):
+        try:
+            while True:
+                while not self.outbox:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                _, text = self.outbox.popleft()
+                await asyncio.wait_for(
+                    self.websocket.send_text(text), self.manager.send_timeout
+                )
+        except asyncio.TimeoutError:
+            self.manager.disconnect(self.websocket, reason="send timed out")
+        except Exception:
+            self.manager.disconnect(self.websocket)
+
+    async def close(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Fans events out to WebSocket clients without waiting on any of them.
+
+    ``publish`` only appends to each client's outbox, so a detector loop never
+    blocks on a slow dashboard; every client has its own sender task. It must
+    be called from the event loop.
+
+    Clients only get the topics they subscribed to. A topic pattern ->
+    subscribers index answers each message with four lookups, and a message
+    nobody wants is never serialized.
+
+    Every published message gets a ``seq``. Never-drop events are also kept
+    in a replay ring, so a client resuming from its last seen ``seq`` gets
+    what it missed, or a ``server:resync`` when that is no longer held.
+    Sequence numbers start from the clock, so they keep increasing across
+    restarts and a resume point from before one always resyncs.
+    """
+
+    def __init__(
+        self, max_queue: int = MAX_QUEUE, send_timeout: float = SEND_TIMEOUT
+    ):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.subscribers: Dict[Topic, Set[WebSocket]] = {}
+        self._closing = set()
+        self.seq = time.time_ns() // 1000
+        self.replay = ReplayRing(REPLAY_MAX_EVENTS, REPLAY_MAX_BYTES, self.seq)
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(
+        self, websocket: WebSocket, topics: Iterable[Topic] = ((WILDCARD, WILDCARD),)
+    ) -> ClientConnection:
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = ClientConnection(websocket, self)
+        self.connections[websocket] = connection
+        self.subscribe(websocket, topics)
         print(f"Client connected: {websocket.client}")
+        return connection
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[Topic]):
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        for topic in topics:
+            connection.topics.add(topic)
+            self.subscribers.setdefault(topic, set()).add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[Topic]):
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        for topic in topics:
+            connection.topics.discard(topic)
+            subscribers = self.subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self.subscribers[topic]
+
+    def subscribers_of(self, event: Optional[str], camera: Optional[str]) -> set:
+        matched = set()
+        for topic in matching_topics(event, camera):
+            matched |= self.subscribers.get(topic, set())
+        return matched
+
+    def disconnect(self, websocket: WebSocket, reason: Optional[str] = None):
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        self.unsubscribe(websocket, list(connection.topics))
+        del self.connections[websocket]
+        if connection.task is not asyncio.current_task():
+            connection.task.cancel()
+        if reason is not None:
+            print(f"Disconnecting slow client {websocket.client}: {reason}")
+            # 1013: try again later
+            task = asyncio.create_task(connection.close(1013))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    def _offer(self, websocket: WebSocket, event: Optional[str], text: str):
+        connection = self.connections.get(websocket)
+        if connection is not None and not connection.offer(event, text):
+            self.disconnect(websocket, reason="outbox full")
+
+    def send(self, websocket: WebSocket, message: Dict[str, Any]):
+        self._offer(websocket, message.get("event"), dumps(message))
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+    def publish(self, message: Dict[str, Any], camera: Optional[str] = None):
+        """Queues a message for every client subscribed to its event and camera."""
+        self.seq += 1
+        message = {**message, "seq": self.seq}
+        if camera is not None:
+            message["camera"] = camera
+        event, camera = message.get("event"), message.get("camera")
+        subscribers = self.subscribers_of(event, camera)
+        durable = overflow_policy(event) == NEVER_DROP
+        if not subscribers and not durable:
+            return
+        # Serialized once here, so later changes to the message are not sent
+        # and N clients do not cost N encodings of the same snapshot
+        text = dumps(message)
+        if durable:
+            self.replay.append(ReplayEntry(self.seq, event, camera, text))
+        for websocket in subscribers:
+            self._offer(websocket, event, text)
 
-    async def broadcast(self, message: Dict[str, Any]):
-        for connection in self.active_connections[:]:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                self.disconnect(connection)
+    def relay(self, message: Dict[str, Any]):
+        """Passes a client's own event on to subscribers, unsequenced.
+
+        Anything but a ``client:`` event is dropped.
+        """
+        event = message.get("event")
+        if not isinstance(event, str) or not event.startswith(CLIENT_EVENT_PREFIX):
+            return
+        subscribers = self.subscribers_of(event, None)
+        if subscribers:
+            text = dumps({"event": event, "data": message.get("data")})
+            for websocket in subscribers:
+                self._offer(websocket, event, text)
+
+    def resume(self, websocket: WebSocket, last_seq: int):
+        """Replays the subscribed events a client missed after ``last_seq``."""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        missed = self.replay.since(last_seq) if last_seq <= self.seq else None
+        if missed is not None:
+            missed = [
+                entry for entry in missed if connection.wants(entry.event, entry.camera)
+            ]
+        # A gap that would overflow the outbox is cheaper to resync
+        if missed is None or len(missed) > self.max_queue // 2:
+            self.send(websocket, {"event": "server:resync", "data": {"seq": self.seq}})
+            return
+        for entry in missed:
+            self._offer(websocket, entry.event, entry.text)
+
+    def handle_command(self, websocket: WebSocket, command: Dict[str, Any]):
+        """Applies a client's subscribe, unsubscribe or resume command."""
+        if command["action"] == "resume":
+            last_seq = command.get("lastSeq")
+            if isinstance(last_seq, int) and not isinstance(last_seq, bool):
+                self.resume(websocket, last_seq)
+            else:
+                error = {"detail": "lastSeq must be an integer"}
+                self.send(websocket, {"event": "server:error", "data": error})
+            return
+        try:
+            topics = [parse_topic(topic) for topic in command.get("topics", [])]
+        except (AttributeError, ValueError) as e:
+            self.send(websocket, {"event": "server:error", "data": {"detail": str(e)}})
+            return
+        if command["action"] == "subscribe":
+            self.subscribe(websocket, topics)
+        else:
+            self.unsubscribe(websocket, topics)
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self.send(
+                websocket,
+                {
+                    "event": "server:subscriptions",
+                    "data": {"topics": sorted(map(format_topic, connection.topics))},
+                },
+            )
 
 
 router = APIRouter()
 ws_manager = ConnectionManager()
 
 
+def _query_topics(websocket: WebSocket) -> List[str]:
+    topics = websocket.query_params.get("topics")
+    if topics is None:
+        return [WILDCARD]
+    return [topic for topic in topics.split(",") if topic.strip()]
+
+
+def _app_data_catch_up(websocket: WebSocket) -> List[Dict[str, Any]]:
+    # A reconnecting client passes the app data version it has and only gets
+    # the deltas it missed; anyone else gets the whole, image-free snapshot
+    params = websocket.query_params
+    deltas = None
+    if "appDataEpoch" in params and params.get("appDataVersion", "").isdigit():
+        deltas = app_data_store.deltas_since(
+            params["appDataEpoch"], int(params["appDataVersion"])
+        )
+    if deltas is None:
+        return [{"event": "server:app-data", "data": app_data_store.snapshot()}]
+    return [{"event": "server:app-data-delta", "data": delta} for delta in deltas]
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await ws_manager.connect(websocket)
-    await websocket.send_json({"event": "server:app-data", "data": app_data})
+    # /ws?topics=server:pothole,server:app-data subscribes to just those;
+    # without it a client gets everything, as before
+    try:
+        topics = [parse_topic(topic) for topic in _query_topics(websocket)]
+    except ValueError:
+        # 1008: policy violation
+        await websocket.close(code=1008)
+        return
+    await ws_manager.connect(websocket, topics)
+    for message in _app_data_catch_up(websocket):
+        ws_manager.send(websocket, message)
+    # /ws?lastSeq=<seq> replays what was missed before any new event is sent
+    last_seq = websocket.query_params.get("lastSeq", "")
+    if last_seq.isdigit():
+        ws_manager.resume(websocket, int(last_seq))
 
     try:
         while True:
             data = await websocket.receive_json()
-            await ws_manager.broadcast(data)
+            if not isinstance(data, dict):
+                continue
+            if data.get("action") in ("subscribe", "unsubscribe", "resume"):
+                ws_manager.handle_command(websocket, data)
+            else:
+                ws_manager.relay(data)
     except Exception:
         ws_manager.disconnect(websocket)
         print("Client disconnected")
@@ -53,39 +409,55 @@ class LookoutPerson(BaseModel):
     lookoutPerson: str
 
 
+def _publish_delta(delta: Optional[Dict[str, Any]]):
+    if delta is not None:
+        ws_manager.publish({"event": "server:app-data-delta", "data": delta})
+
+
 @router.post("/add-lookout-vehicle")
 async def add_vehicle(vehicle: LookoutVehicle):
-    app_data["lookoutVehicles"].append(vehicle.lookoutVehicle.strip().upper())
-    await ws_manager.broadcast({"event": "server:app-data", "data": app_data})
+    _publish_delta(
+        app_data_store.add("lookoutVehicles", vehicle.lookoutVehicle.strip().upper())
+    )
     return {"message": "Vehicle added successfully"}
 
 
 @router.post("/remove-lookout-vehicle")
 async def remove_vehicle(vehicle: LookoutVehicle):
     vehicle_to_remove = vehicle.lookoutVehicle.strip().upper()
-    if vehicle_to_remove in app_data["lookoutVehicles"]:
-        app_data["lookoutVehicles"].remove(vehicle_to_remove)
-        print(app_data["lookoutVehicles"])
-        await ws_manager.broadcast({"event": "server:app-data", "data": app_data})
-        return {"message": "Vehicle removed successfully"}
-    else:
+    delta = app_data_store.remove("lookoutVehicles", vehicle_to_remove)
+    if delta is None:
         return {"message": "Vehicle not found"}
+    _publish_delta(delta)
+    return {"message": "Vehicle removed successfully"}
 
 
 @router.post("/add-lookout-person")
 async def add_person(person: LookoutPerson):
-    app_data["lookoutPersons"].append(person.lookoutPerson.strip().upper())
-    await ws_manager.broadcast({"event": "server:app-data", "data": app_data})
+    _publish_delta(
+        app_data_store.add("lookoutPersons", person.lookoutPerson.strip().upper())
+    )
     return {"message": "Person added successfully"}
 
 
 @router.post("/remove-lookout-person")
 async def remove_person(person: LookoutPerson):
     person_to_remove = person.lookoutPerson.strip().upper()
-    if person_to_remove in app_data["lookoutPersons"]:
-        app_data["lookoutPersons"].remove(person_to_remove)
-        print(app_data["lookoutPersons"])
-        await ws_manager.broadcast({"event": "server:app-data", "data": app_data})
-        return {"message": "Person removed successfully"}
-    else:
+    delta = app_data_store.remove("lookoutPersons", person_to_remove)
+    if delta is None:
         return {"message": "Person not found"}
+    _publish_delta(delta)
+    return {"message": "Person removed successfully"}
+
+
+@router.get("/faces/{img_name}")
+def get_face(img_name: str):
+    # Only images of known persons, never arbitrary paths
+    if img_name not in {person["imgName"] for person in app_data["personInfos"]}:
+        raise HTTPException(status_code=404, detail="Unknown face image")
+    path = os.path.join(FACES_PATH, img_name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Unknown face image")
+    return FileResponse(
+        path, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=3600"}
+    )
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from typing import Callable, Tuple
+
+import cv2
+import numpy as np
+import supervision as sv
+
+from .file_utils import atomic_write
+from .zones import ZoneMap
+
+ARTIFACTS_PATH = os.getenv("ARTIFACTS_PATH", "./src/assets/cache")
+
+
+def _digest(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(str(part.shape).encode())
+            digest.update(np.ascontiguousarray(part, dtype=np.float64).tobytes())
+        else:
+            digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+def cached_array(kind: str, key: str, build: Callable[[], np.ndarray]) -> np.ndarray:
+    path = os.path.join(ARTIFACTS_PATH, kind, f"{key}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+    array = build()
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+
+    atomic_write(path, write)
+    return array
+
+
+def cached_json(kind: str, key: str, build: Callable[[], dict]) -> dict:
+    path = os.path.join(ARTIFACTS_PATH, kind, f"{key}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    value = build()
+
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+
+    atomic_write(path, write)
+    return value
+
+
+def load_video_info(video_path: str) -> sv.VideoInfo:
+    """sv.VideoInfo without opening the video again while the file is unchanged."""
+    stat = os.stat(video_path)
+    key = _digest(os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+
+    def build():
+        info = sv.VideoInfo.from_video_path(video_path=video_path)
+        return {
+            "width": info.width,
+            "height": info.height,
+            "fps": info.fps,
+            "total_frames": info.total_frames,
+        }
+
+    return sv.VideoInfo(**cached_json("videos", key, build))
+
+
+def annotation_style(resolution_wh: Tuple[int, int]) -> Tuple[int, float]:
+    """Line thickness and text scale the annotators use at this resolution."""
+    resolution_wh = tuple(int(v) for v in resolution_wh)
+
+    def build():
+        return {
+            "thickness": sv.calculate_optimal_line_thickness(
+                resolution_wh=resolution_wh
+            ),
+            "text_scale": sv.calculate_optimal_text_scale(resolution_wh=resolution_wh),
+        }
+
+    style = cached_json("styles", _digest(resolution_wh), build)
+    return style["thickness"], style["text_scale"]
+
+
+def road_transform(
+    road_polygon: np.ndarray, road_width: float, road_height: float
+) -> np.ndarray:
+    """Homography from the road polygon to a road_width x road_height plane."""
+    source = np.asarray(road_polygon, dtype=np.float32)
+    target = np.array(
+        [
+            [0, 0],
+            [road_width - 1, 0],
+            [road_width - 1, road_height - 1],
+            [0, road_height - 1],
+        ],
+        dtype=np.float32,
+    )
+    return cached_array(
+        "homographies",
+        _digest(source, target),
+        lambda: cv2.getPerspectiveTransform(source, target),
+    )
+
+
+def compile_zone_map(zone_map: ZoneMap) -> ZoneMap:
+    """Loads the zone label mask from disk, rasterizing it only on a cache miss."""
+    zone_map.mask = cached_array("zones", zone_map.signature(), zone_map._rasterize)
+    return zone_map
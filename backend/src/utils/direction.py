@@ -0,0 +1,97 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from .track_history import TrackHistory
+
+
+class DirectionClassifier:
+    """Flags tracks moving against a lane direction, with hysteresis.
+
+    Each track's bird's-eye positions go into shared ring buffers; one batched
+    line fit per frame gives every track's velocity, which is projected on the
+    lane direction. A track becomes a violator after ``min_duration`` frames
+    faster than ``enter_threshold`` against the lane, and clears only after
+    ``min_duration`` frames slower than ``exit_threshold`` against it.
+    """
+
+    def __init__(
+        self,
+        store,
+        fps: float,
+        lane_direction: Sequence[float] = (0, 1),
+        window: int = None,
+        min_samples: int = None,
+        enter_threshold: float = 3.0,
+        exit_threshold: float = 1.0,
+        min_duration: int = None,
+    ):
+        direction = np.asarray(lane_direction, dtype=np.float32)
+        self.lane_direction = direction / np.linalg.norm(direction)
+        self.fps = fps
+        self.window = int(window or fps)
+        self.min_samples = int(min_samples or max(2, fps / 3))
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold
+        self.min_duration = int(min_duration or max(1, fps / 6))
+
+        self.x_history = TrackHistory(self.window).attach(store)
+        self.y_history = TrackHistory(self.window).attach(store)
+
+        # Violation flag per slot and how many frames the opposite verdict has held
+        self.wrong_way = np.zeros(64, dtype=bool)
+        self.streak = np.zeros(64, dtype=np.int64)
+        store.on_evict.append(lambda keys, slots: self._reset(slots))
+
+    def _ensure_capacity(self, size: int):
+        capacity = len(self.wrong_way)
+        if size <= capacity:
+            return
+        extra = max(size, capacity * 2) - capacity
+        self.wrong_way = np.concatenate([self.wrong_way, np.zeros(extra, dtype=bool)])
+        self.streak = np.concatenate([self.streak, np.zeros(extra, dtype=np.int64)])
+
+    def _reset(self, slots: np.ndarray):
+        slots = slots[slots < len(self.wrong_way)]
+        self.wrong_way[slots] = False
+        self.streak[slots] = 0
+
+    def update(
+        self, slots: np.ndarray, points: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the violator mask and the along-lane speed per slot."""
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.float32)
+        self._ensure_capacity(int(slots.max()) + 1)
+
+        self.x_history.push(slots, points[:, 0])
+        self.y_history.push(slots, points[:, 1])
+
+        # Velocity of every ready track in bird's-eye units per second
+        ready = self.x_history.counts[slots] >= self.min_samples
+        along = np.zeros(len(slots), dtype=np.float32)
+        ready_slots = slots[ready]
+        velocity = np.column_stack(
+            [
+                self.x_history.slopes(ready_slots),
+                self.y_history.slopes(ready_slots),
+            ]
+        )
+        along[ready] = velocity @ self.lane_direction * self.fps
+
+        # Count consecutive frames that argue for flipping the current verdict
+        wrong_way = self.wrong_way[slots]
+        against = np.where(
+            wrong_way,
+            ready & (along > -self.exit_threshold),
+            ready & (along < -self.enter_threshold),
+        )
+        streak = np.where(against, self.streak[slots] + 1, 0)
+        flip = streak >= self.min_duration
+        wrong_way = wrong_way ^ flip
+        streak[flip] = 0
+
+        self.wrong_way[slots] = wrong_way
+        self.streak[slots] = streak
+        return wrong_way, along
@@ -14,6 +14,11 @@ def resize_frame(frame: np.ndarray, max_width: int = 640) -> np.ndarray:
     return cv2.resize(frame, (new_w, new_h))
 
 
+def encode_jpeg(frame: np.ndarray, quality: int = 80) -> bytes:
+    _, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes()
+
+
 def encode_frame_to_base64(frame: np.ndarray, format: str = ".jpg") -> str:
     _, buffer = cv2.imencode(format, frame)
     return base64.b64encode(buffer).decode("utf-8")
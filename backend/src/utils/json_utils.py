@@ -0,0 +1,19 @@
+import json
+from typing import Any
+
+# orjson is optional; it is several times faster on large string payloads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_ENCODER = "orjson" if orjson is not None else "json"
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON text, the same as Starlette's send_json produces."""
+    if orjson is not None:
+        return orjson.dumps(
+            value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,18 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+
+def load_yolo(model_path: str) -> "YOLO":
+    # Ultralytics pulls in torch, so it is only imported once a model is needed
+    from ultralytics import YOLO
+
+    # Every detector gets its own model: each runs inference on its own detect
+    # thread, and an ultralytics predictor keeps per-call args such as
+    # ``classes`` and ``conf``, so a shared one is not thread-safe
+    return YOLO(model_path)
+
+
+def class_ids_for(model_names: dict, class_names) -> list:
+    return [cls_id for cls_id, name in model_names.items() if name in class_names]
@@ -0,0 +1,73 @@
+from typing import Callable, List, Optional
+
+import numpy as np
+import supervision as sv
+
+from .model_utils import class_ids_for
+
+
+class DetectionFilter:
+    """Class, confidence, zone and NMS filtering shared by every detector.
+
+    Allowed class IDs are resolved once from the class names, the class and
+    confidence filters are pushed into the model call, and whatever is left
+    runs cheapest first: integer class mask, confidence mask, zone lookup,
+    then NMS on the few boxes that remain.
+    """
+
+    def __init__(
+        self,
+        model_names: dict,
+        class_names: Optional[List[str]] = None,
+        conf_score: float = 0.3,
+        iou_threshold: Optional[float] = 0.7,
+    ):
+        self.model_names = model_names
+        self.class_names = class_names
+        self.conf_score = conf_score
+        self.iou_threshold = iou_threshold
+        self.class_ids = (
+            np.array(class_ids_for(model_names, class_names), dtype=np.int64)
+            if class_names
+            else None
+        )
+
+    def predict_kwargs(self) -> dict:
+        kwargs = {"conf": self.conf_score, "verbose": False}
+        if self.class_ids is not None:
+            kwargs["classes"] = self.class_ids.tolist()
+        return kwargs
+
+    def infer(self, model, source, **kwargs):
+        """Runs the model with the filters pushed down; returns raw results."""
+        return model(source, **{**self.predict_kwargs(), **kwargs})
+
+    def __call__(
+        self,
+        detections: sv.Detections,
+        zone_mask: Optional[Callable[[sv.Detections], np.ndarray]] = None,
+    ) -> sv.Detections:
+        if len(detections) == 0:
+            return detections
+
+        # Models that ignore the pushed-down filters still get them applied here
+        keep = detections.confidence > self.conf_score
+        if self.class_ids is not None:
+            keep &= np.isin(detections.class_id, self.class_ids)
+        detections = detections[keep]
+
+        if zone_mask is not None and len(detections) > 0:
+            detections = detections[zone_mask(detections)]
+
+        if self.iou_threshold is not None and len(detections) > 1:
+            detections = detections.with_nms(threshold=self.iou_threshold)
+        return detections
+
+    def detect(
+        self,
+        model,
+        frame: np.ndarray,
+        zone_mask: Optional[Callable[[sv.Detections], np.ndarray]] = None,
+    ) -> sv.Detections:
+        detections = sv.Detections.from_ultralytics(self.infer(model, frame)[0])
+        return self(detections, zone_mask=zone_mask)
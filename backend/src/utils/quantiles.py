@@ -0,0 +1,44 @@
+import math
+from typing import Iterable, List, Sequence, Tuple
+
+# Every value in a bin is within this fraction of the bin's representative
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+# Smaller values, such as a speed of 0, share the lowest bin
+MIN_VALUE = 1e-3
+
+
+def value_bin(value: float) -> int:
+    """Log-scale bin of a value, as in DDSketch.
+
+    A sketch is just a count per bin, so sketches are merged and values
+    removed by adding and subtracting counts; a few hundred bins cover
+    every speed a camera reports.
+    """
+    return math.ceil(math.log(max(value, MIN_VALUE)) / _LOG_GAMMA)
+
+
+def bin_value(index: int) -> float:
+    """The representative value of a bin."""
+    return 2 * GAMMA**index / (GAMMA + 1)
+
+
+def quantiles(bins: Iterable[Tuple[int, int]], qs: Sequence[float]) -> List[float]:
+    """Quantiles ``qs`` (ascending, 0..1) of a sketch given as (bin, count) rows.
+
+    Returns an empty list for an empty sketch.
+    """
+    bins = sorted((index, count) for index, count in bins if count > 0)
+    total = sum(count for _, count in bins)
+    if total == 0:
+        return []
+
+    values, seen, i = [], 0, 0
+    for q in qs:
+        rank = q * (total - 1)
+        while seen + bins[i][1] <= rank:
+            seen += bins[i][1]
+            i += 1
+        values.append(bin_value(bins[i][0]))
+    return values
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import re
+from typing import Any, Optional
+
+from .file_utils import atomic_write
+
+SNAPSHOTS_PATH = os.getenv("SNAPSHOTS_PATH", "./src/assets/snapshots")
+SNAPSHOTS_MAX_MB = float(os.getenv("SNAPSHOTS_MAX_MB", "1024"))
+
+SNAPSHOT_ID = re.compile(r"^[0-9a-f]{32}$")
+SNAPSHOT_URL = re.compile(r"^/snapshots/([0-9a-f]{32})\.jpg$")
+
+
+class SnapshotStore:
+    """Event snapshots on disk, named by the hash of their JPEG bytes.
+
+    Camera workers write and the API serves the same directory, so a
+    snapshot is stored once however many events and clients refer to it.
+    Files are immutable; the oldest ones are pruned past ``max_bytes``,
+    whether or not recorded events still refer to them, so event history
+    reports a pruned snapshot as missing rather than as a dead URL.
+    """
+
+    def __init__(
+        self,
+        path: str = SNAPSHOTS_PATH,
+        max_bytes: int = int(SNAPSHOTS_MAX_MB * 1024 * 1024),
+        prune_every: int = 200,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._puts = 0
+
+    def file_path(self, snapshot_id: str) -> Optional[str]:
+        if not SNAPSHOT_ID.match(snapshot_id):
+            return None
+        # Shard by prefix so no directory grows too large
+        return os.path.join(self.path, snapshot_id[:2], f"{snapshot_id}.jpg")
+
+    def exists(self, snapshot_id: str) -> bool:
+        path = self.file_path(snapshot_id)
+        return path is not None and os.path.exists(path)
+
+    def put(self, jpeg: bytes) -> str:
+        snapshot_id = hashlib.sha256(jpeg).hexdigest()[:32]
+        path = self.file_path(snapshot_id)
+        if not os.path.exists(path):
+
+            def write(tmp_path):
+                with open(tmp_path, "wb") as f:
+                    f.write(jpeg)
+
+            atomic_write(path, write)
+
+        self._puts += 1
+        if self._puts % self.prune_every == 0:
+            self.prune()
+        return snapshot_id
+
+    def prune(self):
+        files = []
+        for root, _, names in os.walk(self.path):
+            for name in names:
+                if not name.endswith(".jpg"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        # Drop the oldest down to 80% of the budget, so pruning stays rare
+        for _, size, path in sorted(files):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes * 0.8:
+                break
+
+
+def snapshot_url(snapshot_id: str) -> str:
+    return f"/snapshots/{snapshot_id}.jpg"
+
+
+def snapshot_id_of(url: Any) -> Optional[str]:
+    """The snapshot a ``snapshot_url`` points to, or None for any other value."""
+    if not isinstance(url, str):
+        return None
+    match = SNAPSHOT_URL.match(url)
+    return match.group(1) if match else None
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,97 @@
+import numpy as np
+
+# Scale factor turning a median absolute deviation into a standard deviation
+MAD_TO_STD = 1.4826
+
+
+class TrackHistory:
+    """Last ``window`` samples per track slot, kept in one 2-D ring buffer.
+
+    Rows are the slots handed out by a TrackStateStore, so attaching the
+    history to the store clears a row whenever its track is evicted.
+    """
+
+    def __init__(self, window: int, capacity: int = 64):
+        self.window = int(window)
+        self.values = np.zeros((capacity, self.window), dtype=np.float32)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.heads = np.zeros(capacity, dtype=np.int64)
+
+        # Sample positions shared by every fit
+        self._t = np.arange(self.window, dtype=np.float32)
+
+    def attach(self, store):
+        store.on_evict.append(lambda keys, slots: self.reset(slots))
+        return self
+
+    def _ensure_capacity(self, size: int):
+        capacity = len(self.counts)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2)
+        values = np.zeros((new_capacity, self.window), dtype=np.float32)
+        values[:capacity] = self.values
+        self.values = values
+        self.counts = np.concatenate(
+            [self.counts, np.zeros(new_capacity - capacity, dtype=np.int64)]
+        )
+        self.heads = np.concatenate(
+            [self.heads, np.zeros(new_capacity - capacity, dtype=np.int64)]
+        )
+
+    def reset(self, slots: np.ndarray):
+        slots = np.asarray(slots, dtype=np.int64)
+        slots = slots[slots < len(self.counts)]
+        self.counts[slots] = 0
+        self.heads[slots] = 0
+
+    def push(self, slots: np.ndarray, values: np.ndarray):
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) == 0:
+            return
+        self._ensure_capacity(int(slots.max()) + 1)
+        self.values[slots, self.heads[slots]] = values
+        self.heads[slots] = (self.heads[slots] + 1) % self.window
+        self.counts[slots] = np.minimum(self.counts[slots] + 1, self.window)
+
+    def ordered(self, slots: np.ndarray):
+        """Returns samples oldest-to-newest (right aligned) and a validity mask."""
+        slots = np.asarray(slots, dtype=np.int64)
+        columns = (self.heads[slots, None] + np.arange(self.window)) % self.window
+        values = self.values[slots[:, None], columns]
+        valid = np.arange(self.window) >= (self.window - self.counts[slots, None])
+        return values, valid
+
+    def _fit(self, values: np.ndarray, weights: np.ndarray):
+        weight_sum = np.maximum(weights.sum(axis=1, keepdims=True), 1)
+        t_mean = (weights * self._t).sum(axis=1, keepdims=True) / weight_sum
+        y_mean = (weights * values).sum(axis=1, keepdims=True) / weight_sum
+        dt = (self._t - t_mean) * weights
+        denominator = (dt * (self._t - t_mean)).sum(axis=1)
+        slope = (dt * (values - y_mean)).sum(axis=1) / np.where(
+            denominator > 0, denominator, 1
+        )
+        intercept = y_mean[:, 0] - slope * t_mean[:, 0]
+        return np.where(denominator > 0, slope, 0), intercept
+
+    def slopes(self, slots: np.ndarray, robust: bool = True, outlier_k: float = 3.0):
+        """Least-squares change per sample for every slot in one pass.
+
+        With ``robust`` set, samples further than ``outlier_k`` scaled MADs from
+        the first fit are dropped and the line is refitted.
+        """
+        if len(slots) == 0:
+            return np.empty(0, dtype=np.float32)
+
+        values, valid = self.ordered(slots)
+        weights = valid.astype(np.float32)
+        slope, intercept = self._fit(values, weights)
+        if not robust:
+            return slope
+
+        residuals = np.abs(values - (slope[:, None] * self._t + intercept[:, None]))
+        masked = np.where(valid, residuals, np.nan)
+        mad = np.nanmedian(masked, axis=1, keepdims=True)
+        threshold = np.maximum(outlier_k * MAD_TO_STD * mad, 1e-6)
+        weights = (valid & (residuals <= threshold)).astype(np.float32)
+        return self._fit(values, weights)[0]
@@ -0,0 +1,144 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def removed_track_ids(byte_track) -> list:
+    # ByteTrack reports the tracks it dropped during the last update only, so
+    # read them right after the update that produced them
+    return [
+        track.external_track_id for track in getattr(byte_track, "removed_tracks", [])
+    ]
+
+
+class TrackStateStore:
+    """Per-track state kept in numpy columns, one row (slot) per live track.
+
+    Slots of tracks that ByteTrack removed, or that were not seen for ``ttl``
+    frames, go back to a free list and are reused, so memory stays bounded
+    however long the camera runs.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, Tuple[Any, Any]],
+        ttl: int = 300,
+        capacity: int = 64,
+    ):
+        # columns maps name -> (dtype, default value)
+        self.columns = columns
+        self.ttl = ttl
+
+        self._data = {
+            name: np.full(capacity, default, dtype=dtype)
+            for name, (dtype, default) in columns.items()
+        }
+        self.keys = np.full(capacity, None, dtype=object)
+        self.last_seen = np.full(capacity, -1, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free_slots: List[int] = list(range(capacity - 1, -1, -1))
+        self.slot_of: Dict[Hashable, int] = {}
+
+        self.frame_number = 0
+        self.evicted_count = 0
+
+        # Callbacks receiving the keys and slots evicted in one go
+        self.on_evict: List[Callable[[list, np.ndarray], None]] = []
+
+    @property
+    def capacity(self) -> int:
+        return len(self.alive)
+
+    @property
+    def live_count(self) -> int:
+        return len(self.slot_of)
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.slot_of
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._data[name]
+
+    def _grow(self):
+        old_capacity = self.capacity
+        new_capacity = old_capacity * 2
+        for name, (dtype, default) in self.columns.items():
+            column = np.full(new_capacity, default, dtype=dtype)
+            column[:old_capacity] = self._data[name]
+            self._data[name] = column
+        self.keys = np.concatenate(
+            [self.keys, np.full(old_capacity, None, dtype=object)]
+        )
+        self.last_seen = np.concatenate(
+            [self.last_seen, np.full(old_capacity, -1, dtype=np.int64)]
+        )
+        self.alive = np.concatenate([self.alive, np.zeros(old_capacity, dtype=bool)])
+        self.free_slots = (
+            list(range(new_capacity - 1, old_capacity - 1, -1)) + self.free_slots
+        )
+
+    def _allocate(self, key: Hashable) -> int:
+        if not self.free_slots:
+            self._grow()
+        slot = self.free_slots.pop()
+        for name, (_, default) in self.columns.items():
+            self._data[name][slot] = default
+        self.keys[slot] = key
+        self.alive[slot] = True
+        self.slot_of[key] = slot
+        return slot
+
+    def get(self, key: Hashable) -> Optional[int]:
+        return self.slot_of.get(key)
+
+    def touch(self, keys: Iterable[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+        """Marks keys as seen this frame; returns their slots and a new-track mask."""
+        keys = list(keys)
+        slots = np.empty(len(keys), dtype=np.int64)
+        is_new = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            slot = self.slot_of.get(key)
+            if slot is None:
+                slot = self._allocate(key)
+                is_new[i] = True
+            slots[i] = slot
+        self.last_seen[slots] = self.frame_number
+        return slots, is_new
+
+    def evict(self, keys: Iterable[Hashable]):
+        slots = [self.slot_of[key] for key in keys if key in self.slot_of]
+        self._evict_slots(np.array(slots, dtype=np.int64))
+
+    def _evict_slots(self, slots: np.ndarray):
+        if len(slots) == 0:
+            return
+        keys = list(self.keys[slots])
+        for callback in self.on_evict:
+            callback(keys, slots)
+        for key in keys:
+            del self.slot_of[key]
+        self.keys[slots] = None
+        self.alive[slots] = False
+        self.free_slots.extend(slots.tolist())
+        self.evicted_count += len(slots)
+
+    def advance(self, removed_ids: Iterable[Hashable] = ()) -> int:
+        """Starts a new frame and evicts removed and stale tracks."""
+        self.frame_number += 1
+        self.evict(removed_ids)
+
+        stale = np.flatnonzero(
+            self.alive & (self.last_seen < self.frame_number - self.ttl)
+        )
+        self._evict_slots(stale)
+        return self.frame_number
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "live": self.live_count,
+            "evicted": self.evicted_count,
+            "capacity": self.capacity,
+        }
@@ -0,0 +1,115 @@
+import hashlib
+import math
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+import supervision as sv
+
+# Up to this many zones fit in one label mask, one bit per zone
+MAX_ZONES = 64
+
+
+def _mask_dtype(zone_count: int):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if zone_count <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"At most {MAX_ZONES} zones are supported, got {zone_count}")
+
+
+class ZoneMap:
+    """Named polygons rasterized once into a (possibly downsampled) bit mask.
+
+    Each zone owns one bit of the label mask, so overlapping zones are fine and
+    membership for any number of points is a single fancy-index lookup.
+    """
+
+    def __init__(
+        self,
+        resolution_wh: Tuple[int, int],
+        zones: Optional[Dict[str, list]] = None,
+        scale: float = 1.0,
+    ):
+        self.resolution_wh = tuple(int(v) for v in resolution_wh)
+        self.scale = scale
+        self.polygons: Dict[str, np.ndarray] = {}
+        self.bits: Dict[str, int] = {}
+        self._mask = None
+
+        for name, polygon in (zones or {}).items():
+            self.set_zone(name, polygon)
+
+    def set_zone(self, name: str, polygon):
+        if name not in self.bits:
+            if len(self.bits) >= MAX_ZONES:
+                raise ValueError(f"At most {MAX_ZONES} zones are supported")
+            self.bits[name] = len(self.bits)
+        self.polygons[name] = np.asarray(polygon, dtype=np.float64)
+        self._mask = None
+
+    def remove_zone(self, name: str):
+        self.polygons.pop(name, None)
+        self.bits.pop(name, None)
+
+        # Re-pack the remaining zones into the lowest bits
+        self.bits = {zone: bit for bit, zone in enumerate(self.bits)}
+        self._mask = None
+
+    def signature(self) -> str:
+        """Identifies the rasterized mask, for caching it across restarts."""
+        digest = hashlib.sha1(repr((self.resolution_wh, self.scale)).encode())
+        for name in self.bits:
+            digest.update(name.encode())
+            digest.update(self.polygons[name].tobytes())
+        return digest.hexdigest()
+
+    @property
+    def mask(self) -> np.ndarray:
+        if self._mask is None:
+            self._mask = self._rasterize()
+        return self._mask
+
+    @mask.setter
+    def mask(self, mask: np.ndarray):
+        self._mask = mask
+
+    def _rasterize(self) -> np.ndarray:
+        w, h = self.resolution_wh
+        mask_w, mask_h = math.ceil(w * self.scale), math.ceil(h * self.scale)
+        mask = np.zeros((mask_h, mask_w), dtype=_mask_dtype(max(1, len(self.bits))))
+
+        layer = np.zeros((mask_h, mask_w), dtype=np.uint8)
+        for name, bit in self.bits.items():
+            layer[:] = 0
+            polygon = np.round(self.polygons[name] * self.scale).astype(np.int32)
+            cv2.fillPoly(layer, [polygon], 1)
+            mask[layer.astype(bool)] |= mask.dtype.type(1 << bit)
+        return mask
+
+    def labels(self, points: np.ndarray) -> np.ndarray:
+        """Returns the zone bits under each (x, y) point.
+
+        Points are clamped to the frame, as PolygonZone clips boxes, so an
+        anchor on the bottom or right edge (y == height) still counts.
+        """
+        mask = self.mask
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        cols = np.floor(points[:, 0] * self.scale).astype(np.int64)
+        rows = np.floor(points[:, 1] * self.scale).astype(np.int64)
+        np.clip(cols, 0, mask.shape[1] - 1, out=cols)
+        np.clip(rows, 0, mask.shape[0] - 1, out=rows)
+        return mask[rows, cols]
+
+    def contains(self, name: str, points: np.ndarray) -> np.ndarray:
+        bit = self.mask.dtype.type(1 << self.bits[name])
+        return (self.labels(points) & bit) != 0
+
+    def contains_detections(
+        self,
+        name: str,
+        detections: sv.Detections,
+        anchor: sv.Position = sv.Position.BOTTOM_CENTER,
+    ) -> np.ndarray:
+        if len(detections) == 0:
+            return np.zeros(0, dtype=bool)
+        return self.contains(name, detections.get_anchors_coordinates(anchor=anchor))
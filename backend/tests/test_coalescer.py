@@ -0,0 +1,98 @@
+import asyncio
+
+from src.pipeline.events import EventCoalescer
+
+UPDATE = "server:update-overspeeding"
+TELEMETRY = "server:traffic-control"
+VIOLATION = "server:no-helmet-violation"
+REMOVAL = "server:remove-no-helmet-violation"
+
+
+def message(event: str, entity=None, **data):
+    return {"event": event, "data": {"id": entity, **data}}
+
+
+def coalesce(offers, wait: float = 0.0, **settings):
+    """Offers (message, camera) pairs, waits, and returns what was delivered."""
+    delivered = []
+
+    async def run():
+        coalescer = EventCoalescer(
+            lambda message, camera: delivered.append((message, camera)),
+            **{"window": 0.05, "telemetry_hz": 20, "removal_hold": 0.05, **settings},
+        )
+        for offer in offers:
+            coalescer.offer(*offer)
+        await asyncio.sleep(wait)
+        return coalescer
+
+    coalescer = asyncio.run(run())
+    return delivered, coalescer
+
+
+def test_unlisted_events_go_out_right_away():
+    pothole = message("server:pothole", 1)
+    delivered, _ = coalesce([(pothole, "road")])
+    assert delivered == [(pothole, "road")]
+
+
+def test_updates_are_merged_per_entity():
+    offers = [(message(UPDATE, "a", highestSpeed=s), "cam") for s in (81, 82, 83)]
+    offers.append((message(UPDATE, "b", highestSpeed=90), "cam"))
+
+    held, coalescer = coalesce(offers)
+    assert held == [] and coalescer.status()["pending"] == 2
+
+    delivered, coalescer = coalesce(offers, wait=0.1)
+    speeds = {m["data"]["id"]: m["data"]["highestSpeed"] for m, _ in delivered}
+    assert speeds == {"a": 83, "b": 90}
+    assert coalescer.status() == {"pending": 0, "received": 4, "delivered": 2}
+
+
+def test_telemetry_is_throttled_to_the_newest():
+    offers = [(message(TELEMETRY, tick=tick), "cam") for tick in range(5)]
+    delivered, _ = coalesce(offers, wait=0.1)
+    assert [m["data"]["tick"] for m, _ in delivered] == [0, 4]
+
+
+def test_telemetry_is_throttled_per_camera():
+    offers = [(message(TELEMETRY, tick=0), camera) for camera in ("a", "b")]
+    delivered, _ = coalesce(offers)
+    assert [camera for _, camera in delivered] == ["a", "b"]
+
+
+def test_a_removal_goes_out_after_the_hold():
+    removal = message(REMOVAL, "r")
+    assert coalesce([(removal, "cam")])[0] == []
+    assert coalesce([(removal, "cam")], wait=0.1)[0] == [(removal, "cam")]
+
+
+def test_a_violation_cancels_the_held_removal():
+    offers = [(message(REMOVAL, "r"), "cam"), (message(VIOLATION, "r"), "cam")]
+    delivered, coalescer = coalesce(offers, wait=0.1)
+    assert delivered == [] and coalescer.status()["pending"] == 0
+
+    # The same id on another camera is another rider
+    offers[1] = (message(VIOLATION, "r"), "other")
+    delivered, _ = coalesce(offers, wait=0.1)
+    assert [m["event"] for m, _ in delivered] == [VIOLATION, REMOVAL]
+
+
+def test_a_zero_setting_turns_the_policy_off():
+    offers = [(message(UPDATE, "a", highestSpeed=s), "cam") for s in (81, 82)]
+    delivered, _ = coalesce(offers, window=0)
+    assert len(delivered) == 2
+
+
+def test_flush_delivers_everything_held():
+    delivered = []
+
+    async def run():
+        coalescer = EventCoalescer(lambda m, c: delivered.append(m), window=60)
+        coalescer.offer(message(UPDATE, "a", highestSpeed=90), "cam")
+        coalescer.flush()
+        return coalescer
+
+    coalescer = asyncio.run(run())
+    assert [m["data"]["highestSpeed"] for m in delivered] == [90]
+    assert coalescer.timers == {} and coalescer.pending == {}
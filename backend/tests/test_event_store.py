@@ -0,0 +1,89 @@
+import pytest
+
+from src.data.event_store import EventStore
+
+NOW = 1_700_000_000_000
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"), flush_interval=0.01).start()
+    yield store
+    store.stop()
+
+
+def record(store, event, camera="cam", **data):
+    store.record({"event": event, "data": data}, camera)
+
+
+def flush(store):
+    store.stop()
+    store.start()
+
+
+def test_pages_cover_every_event_once_newest_first(store):
+    # Several events share a timestamp, so pages must break ties by row id
+    for i in range(25):
+        record(store, "server:pothole", id=f"p{i}", detectedAt=NOW + i // 3)
+    flush(store)
+
+    ids, cursor = [], None
+    while True:
+        page = store.query(limit=10, cursor=cursor)
+        ids += [item["data"]["id"] for item in page["items"]]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    assert len(ids) == len(set(ids)) == 25
+    times = [int(i[1:]) // 3 for i in ids]
+    assert times == sorted(times, reverse=True)
+
+
+def test_filters_and_time_bounds(store):
+    for event_id, offset, speed in (("a", 0, 60), ("b", 1, 90)):
+        record(
+            store,
+            "server:overspeeding",
+            "speed",
+            id=event_id,
+            detectedAt=NOW + offset,
+            highestSpeed=speed,
+        )
+    record(store, "server:pothole", "road", id="c", detectedAt=NOW + 2)
+    flush(store)
+
+    def ids(**filters):
+        return [item["data"]["id"] for item in store.query(**filters)["items"]]
+
+    assert ids(camera="speed") == ["b", "a"]
+    assert ids(min_speed=70) == ["b"]
+    assert ids(since=NOW + 1, until=NOW + 2) == ["b"]
+    assert ids(event_type="server:pothole") == ["c"]
+
+
+def test_rejects_a_malformed_cursor(store):
+    with pytest.raises(ValueError):
+        store.query(cursor="not-a-cursor")
+
+
+def test_speed_updates_only_raise_the_highest_speed(store):
+    record(store, "server:overspeeding", id="a", detectedAt=NOW, highestSpeed=80)
+    record(store, "server:update-overspeeding", id="a", highestSpeed=95)
+    record(store, "server:update-overspeeding", id="a", highestSpeed=85)
+    flush(store)
+    [item] = store.query()["items"]
+    assert item["data"]["highestSpeed"] == 95
+
+
+def test_removal_is_recorded_and_undone_by_a_new_violation(store):
+    record(store, "server:no-helmet-violation", id="r", detectedAt=NOW)
+    record(store, "server:remove-no-helmet-violation", id="r")
+    flush(store)
+    assert store.query()["items"] == []
+    [removed] = store.query(include_removed=True)["items"]
+    assert removed["removedAt"] is not None
+
+    record(store, "server:no-helmet-violation", id="r", detectedAt=NOW)
+    flush(store)
+    [item] = store.query()["items"]
+    assert item["removedAt"] is None
@@ -0,0 +1,45 @@
+import pytest
+
+from src.pipeline.frame_ring import SLOT_HEADER, FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=3, slot_size=64)
+    yield ring
+    ring.close()
+
+
+def test_reads_newest_frame_once(ring):
+    assert ring.read_latest() is None
+    for frame in (b"one", b"two"):
+        assert ring.write(frame)
+    assert ring.read_latest() == (2, b"two")
+    assert ring.read_latest(after=2) is None
+
+
+def test_wraps_around_the_slots(ring):
+    for i in range(10):
+        ring.write(f"frame-{i}".encode())
+    assert ring.read_latest(after=5) == (10, b"frame-9")
+
+
+def test_rejects_frames_larger_than_a_slot(ring):
+    assert not ring.write(b"x" * 65)
+    assert ring.latest_seq == 0
+
+
+def test_attached_reader_sees_the_writers_frames(ring):
+    reader = FrameRing.attach(ring.name, slots=3, slot_size=64)
+    try:
+        ring.write(b"shared")
+        assert reader.read_latest() == (1, b"shared")
+    finally:
+        reader.close()
+
+
+def test_skips_a_slot_being_rewritten(ring):
+    ring.write(b"frame")
+    # What a reader sees if the writer laps it and starts on the same slot
+    SLOT_HEADER.pack_into(ring.shm.buf, ring._slot_offset(1), -1, 0)
+    assert ring.read_latest() is None
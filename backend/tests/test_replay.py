@@ -0,0 +1,72 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.routes.websockets import (
+    ConnectionManager,
+    ReplayEntry,
+    ReplayRing,
+    router,
+    ws_manager,
+)
+
+
+def entry(seq: int, text: str = "x") -> ReplayEntry:
+    return ReplayEntry(seq, "server:pothole", "pothole", text)
+
+
+def test_returns_entries_after_a_resume_point():
+    ring = ReplayRing(max_events=10, max_bytes=1000, start_seq=0)
+    for seq in range(1, 6):
+        ring.append(entry(seq))
+    assert [e.seq for e in ring.since(3)] == [4, 5]
+    assert ring.since(5) == []
+
+
+def test_evicts_by_count():
+    ring = ReplayRing(max_events=3, max_bytes=1000, start_seq=0)
+    for seq in range(1, 6):
+        ring.append(entry(seq))
+    assert [e.seq for e in ring.entries] == [3, 4, 5]
+    assert ring.evicted_seq == 2
+    # Seq 2 itself is gone, so resuming from 1 must resync
+    assert ring.since(1) is None
+    assert [e.seq for e in ring.since(2)] == [3, 4, 5]
+
+
+def test_evicts_by_size():
+    ring = ReplayRing(max_events=100, max_bytes=10, start_seq=0)
+    for seq in range(1, 4):
+        ring.append(entry(seq, "abcd"))
+    assert [e.seq for e in ring.entries] == [2, 3]
+    assert ring.bytes == 8
+
+
+def test_only_never_drop_events_are_kept_for_replay():
+    manager = ConnectionManager()
+    start = manager.seq
+    manager.publish({"event": "server:pothole", "data": {"id": 1}}, camera="p")
+    manager.publish({"event": "server:traffic-control", "data": []})
+    assert manager.seq == start + 2
+    [kept] = manager.replay.since(start)
+    assert kept.seq == start + 1 and kept.camera == "p"
+    assert json.loads(kept.text)["seq"] == start + 1
+
+
+def test_client_messages_are_relayed_without_seq_or_replay():
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as sender:
+            with client.websocket_connect("/ws") as receiver:
+                # Both start with the app data snapshot
+                sender.receive_json()
+                receiver.receive_json()
+                seq, replayed = ws_manager.seq, len(ws_manager.replay.entries)
+
+                sender.send_json({"event": "server:pothole", "data": {"id": "x"}})
+                sender.send_json({"event": "client:ping", "data": 1, "seq": 5})
+                assert receiver.receive_json() == {"event": "client:ping", "data": 1}
+                assert ws_manager.seq == seq
+                assert len(ws_manager.replay.entries) == replayed
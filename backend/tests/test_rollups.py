@@ -0,0 +1,173 @@
+import random
+import time
+
+import pytest
+
+from src.data.event_store import EventStore, connect, rebuild_rollups
+from src.data.rollups import MAX_BUCKETS, Rollups
+from src.utils.quantiles import quantiles, value_bin
+
+MINUTE, HOUR, DAY = 60_000, 3_600_000, 86_400_000
+# The start of today, so windows line up with every bucket and minute
+# rollups are not pruned as past their retention
+NOW = int(time.time() * 1000) // DAY * DAY
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"), flush_interval=0.01).start()
+    yield store
+    store.stop()
+
+
+@pytest.fixture
+def rollups(store):
+    return Rollups(store)
+
+
+def flush(store):
+    store.stop()
+    store.start()
+
+
+def raise_speed(store, event_id: str, speed: float):
+    store.record(
+        {
+            "event": "server:update-overspeeding",
+            "data": {"id": event_id, "highestSpeed": speed},
+        }
+    )
+
+
+def test_window_covers_whole_buckets(rollups):
+    assert rollups._window("hour", NOW + 90 * MINUTE, NOW + 150 * MINUTE) == (
+        NOW + HOUR,
+        NOW + 3 * HOUR,
+    )
+
+
+def test_window_includes_the_bucket_holding_until(rollups):
+    # until on a bucket boundary still counts the bucket it starts
+    assert rollups._window("hour", NOW, NOW + HOUR) == (NOW, NOW + 2 * HOUR)
+
+
+def test_default_window_is_the_last_day(rollups):
+    start, end = rollups._window("minute", None, NOW)
+    assert end == NOW + MINUTE
+    assert (end - start) // MINUTE == MAX_BUCKETS
+    # A period longer than the default window still gets one bucket
+    start, end = rollups._window("day", None, NOW)
+    assert (start, end) == (NOW, NOW + DAY)
+
+
+def test_a_full_day_of_minutes_fits(rollups):
+    start, end = rollups._window("minute", NOW - DAY, NOW)
+    assert (end - start) // MINUTE == MAX_BUCKETS + 1
+    with pytest.raises(ValueError, match="more than"):
+        rollups._window("minute", NOW - DAY - 1, NOW)
+
+
+@pytest.mark.parametrize(
+    "period, since, until",
+    [("week", None, NOW), ("hour", NOW, NOW), ("hour", NOW + 1, NOW)],
+)
+def test_window_rejects_bad_requests(rollups, period, since, until):
+    with pytest.raises(ValueError):
+        rollups._window(period, since, until)
+
+
+def test_counts_follow_inserts_and_removals(store, rollups):
+    for i in range(3):
+        store.record(
+            {
+                "event": "server:no-helmet-violation",
+                "data": {"id": f"r{i}", "detectedAt": NOW + i * HOUR},
+            },
+            "noHelmet",
+        )
+    store.record(
+        {"event": "server:remove-no-helmet-violation", "data": {"id": "r1"}},
+        "noHelmet",
+    )
+    flush(store)
+
+    counts = rollups.counts(period="hour", since=NOW, until=NOW + 3 * HOUR)
+    assert [(b["bucket"], b["count"]) for b in counts["buckets"]] == [
+        (NOW, 1),
+        (NOW + 2 * HOUR, 1),
+    ]
+    violations = rollups.helmet_violations(since=NOW, until=NOW + 3 * HOUR)
+    assert violations["cameras"]["noHelmet"]["violations"] == 2
+
+
+def test_speed_sketch_follows_updates(store, rollups):
+    for i, speed in enumerate((70, 80, 90)):
+        store.record(
+            {
+                "event": "server:overspeeding",
+                "data": {"id": f"c{i}", "detectedAt": NOW, "highestSpeed": speed},
+            },
+            "speed",
+        )
+    raise_speed(store, "c0", 120)
+    flush(store)
+
+    result = rollups.speed_percentiles(since=NOW, until=NOW + HOUR, qs=(0, 1))
+    assert result["count"] == 3
+    assert result["percentiles"]["p0"] == pytest.approx(80, rel=0.01)
+    assert result["percentiles"]["p100"] == pytest.approx(120, rel=0.01)
+
+
+def test_triggers_match_a_rebuild(store):
+    random.seed(0)
+    for i in range(200):
+        data = {"id": f"e{i}", "detectedAt": NOW + random.randrange(DAY)}
+        if i % 2:
+            data["highestSpeed"] = random.randint(40, 140)
+        store.record({"event": "server:overspeeding", "data": data}, f"c{i % 3}")
+    for i in range(1, 200, 6):
+        raise_speed(store, f"e{i}", 150)
+    for i in range(20):
+        store.record(
+            {
+                "event": "server:no-helmet-violation",
+                "data": {"id": f"h{i}", "detectedAt": NOW + i * HOUR},
+            },
+            "noHelmet",
+        )
+    for i in range(0, 20, 3):
+        store.record(
+            {"event": "server:remove-no-helmet-violation", "data": {"id": f"h{i}"}}
+        )
+    flush(store)
+
+    connection = connect(store.path)
+    try:
+
+        def snapshot():
+            return [
+                connection.execute(
+                    f"SELECT * FROM {table} WHERE count > 0 ORDER BY 1, 2, 3, 4"
+                ).fetchall()
+                for table in ("event_counts", "speed_bins")
+            ]
+
+        by_triggers = snapshot()
+        with connection:
+            rebuild_rollups(connection)
+        assert snapshot() == by_triggers
+    finally:
+        connection.close()
+
+
+def test_quantiles_are_within_one_percent():
+    random.seed(1)
+    values = sorted(random.uniform(20, 160) for _ in range(10_000))
+    counts = {}
+    for value in values:
+        counts[value_bin(value)] = counts.get(value_bin(value), 0) + 1
+    qs = (0, 0.5, 0.9, 0.99, 1)
+    for q, estimate in zip(qs, quantiles(counts.items(), qs)):
+        exact = values[int(q * (len(values) - 1))]
+        assert estimate == pytest.approx(exact, rel=0.01)
+    assert quantiles([], qs) == []
@@ -0,0 +1,60 @@
+import os
+import threading
+
+from src.routes.events import _mark_pruned_snapshots
+from src.utils.file_utils import atomic_write
+from src.utils.snapshots import SnapshotStore, snapshot_id_of, snapshot_url
+
+
+def test_concurrent_writers_never_mix_their_files(tmp_path):
+    path = str(tmp_path / "artifact.bin")
+
+    def build(fill: int):
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(bytes([fill]) * 100_000)
+
+        for _ in range(20):
+            atomic_write(path, write)
+
+    threads = [threading.Thread(target=build, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(path, "rb") as f:
+        assert len(set(f.read())) == 1
+    assert os.listdir(tmp_path) == ["artifact.bin"]
+
+
+def test_prune_keeps_the_newest_snapshots(tmp_path):
+    store = SnapshotStore(str(tmp_path), max_bytes=2500, prune_every=1000)
+    ids = [store.put(bytes([i]) * 1000) for i in range(3)]
+    for age, snapshot_id in enumerate(reversed(ids)):
+        path = store.file_path(snapshot_id)
+        os.utime(path, (1000 - age, 1000 - age))
+    store.prune()
+    assert [store.exists(snapshot_id) for snapshot_id in ids] == [False, True, True]
+
+
+def test_events_report_pruned_snapshots(tmp_path, monkeypatch):
+    store = SnapshotStore(str(tmp_path))
+    monkeypatch.setattr("src.routes.events.snapshot_store", store)
+    kept, pruned = store.put(b"kept"), store.put(b"pruned")
+    os.remove(store.file_path(pruned))
+
+    page = _mark_pruned_snapshots(
+        {
+            "items": [
+                {"data": {"imgSrc": snapshot_url(kept)}},
+                {"data": {"imgSrc": snapshot_url(pruned)}},
+                {"data": {"imgSrc": None}},
+            ]
+        }
+    )
+    assert [item["data"] for item in page["items"]] == [
+        {"imgSrc": snapshot_url(kept)},
+        {"imgSrc": None, "snapshotPruned": True},
+        {"imgSrc": None},
+    ]
+    assert snapshot_id_of("data:image/jpeg;base64,AAAA") is None
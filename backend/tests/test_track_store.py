@@ -0,0 +1,55 @@
+import numpy as np
+
+from src.utils.track_store import TrackStateStore
+
+
+def make_store(**kwargs) -> TrackStateStore:
+    return TrackStateStore({"speed": (np.float32, 0.0)}, **kwargs)
+
+
+def test_touch_allocates_new_tracks_once():
+    store = make_store()
+    slots, is_new = store.touch([1, 2])
+    assert is_new.tolist() == [True, True]
+
+    again, is_new = store.touch([2, 1, 3])
+    assert is_new.tolist() == [False, False, True]
+    assert again[:2].tolist() == slots[::-1].tolist()
+    assert len(store) == 3 and 3 in store
+
+
+def test_evicted_slots_are_reused_with_defaults():
+    store = make_store()
+    slots, _ = store.touch(["a"])
+    store["speed"][slots] = 42.0
+    evicted = []
+    store.on_evict.append(lambda keys, slots: evicted.extend(keys))
+
+    store.advance(removed_ids=["a", "unknown"])
+    assert evicted == ["a"] and "a" not in store
+
+    reused, is_new = store.touch(["b"])
+    assert reused.tolist() == slots.tolist() and is_new.all()
+    assert store["speed"][reused[0]] == 0.0
+
+
+def test_tracks_unseen_for_ttl_frames_are_evicted():
+    store = make_store(ttl=2)
+    store.touch(["stale", "live"])
+    for _ in range(3):
+        store.advance()
+        store.touch(["live"])
+    assert "stale" not in store and "live" in store
+    assert store.stats() == {"live": 1, "evicted": 1, "capacity": 64}
+
+
+def test_grows_past_capacity_keeping_state():
+    store = make_store(capacity=2)
+    slots, _ = store.touch(["a", "b"])
+    store["speed"][slots] = [1.0, 2.0]
+
+    more, is_new = store.touch(["c", "d", "e"])
+    assert is_new.all() and store.capacity == 8
+    assert store["speed"][store.get("a")] == 1.0
+    assert store["speed"][store.get("b")] == 2.0
+    assert len(set(more.tolist()) | set(slots.tolist())) == 5
@@ -14,6 +14,7 @@ import StreamVideo from "@/components/stream-video"
 import DetectionCards from "@/components/detection-cards"
 import DetectionTable from "@/components/detection-table"
 import MapWithMarkers from "@/components/map-with-markers"
+import { snapshotUrl } from "@/lib/utils"
 
 export default function PotholeDetectionPage() {
   const router = useRouter()
@@ -100,7 +101,7 @@ export default function PotholeDetectionPage() {
                                   <div className="md:w-1/2 bg-muted">
                                     <img
                                       className="w-full h-64 object-cover"
-                                      src={`data:image/jpg;base64,${detection.imgSrc}`}
+                                      src={snapshotUrl(detection.imgSrc)}
                                       alt="Detection"
                                     />
                                   </div>
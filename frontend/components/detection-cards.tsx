@@ -2,6 +2,7 @@
 
 import { Card, CardContent } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
+import { snapshotUrl } from "@/lib/utils"
 
 export default function DetectionCards({ detections, activeModel }: any) {
   if (!detections[activeModel]?.length) {
@@ -19,7 +20,7 @@ export default function DetectionCards({ detections, activeModel }: any) {
             <CardContent className="p-4 flex flex-col items-center space-y-4">
               <img
                 className="w-full max-w-md rounded object-cover"
-                src={`data:image/jpg;base64,${detection.imgSrc}`}
+                src={snapshotUrl(detection.imgSrc)}
                 alt="Detection"
               />
               <div className="text-center space-y-1">
@@ -11,6 +11,7 @@ import {
   DialogTrigger,
 } from "@/components/ui/dialog"
 import { Calendar, FileText } from "lucide-react"
+import { snapshotUrl } from "@/lib/utils"
 
 type Detection = {
   id?: string
@@ -32,9 +33,9 @@ export default function DetectionTable({ detections }: DetectionTableProps) {
   }
 
   const exportToCSV = () => {
-    const headers = ['Date & Time', 'Vehicle Type', 'Image Base64']
+    const headers = ['Date & Time', 'Vehicle Type', 'Image URL']
     const rows = detections.map(d =>
-      [`"${formatDate(d.detectedAt)}"`, `"${d.className}"`, `"data:image/jpg;base64,${d.imgSrc}"`]
+      [`"${formatDate(d.detectedAt)}"`, `"${d.className}"`, `"${snapshotUrl(d.imgSrc)}"`]
     )
   
     const csvContent =
@@ -75,7 +76,7 @@ export default function DetectionTable({ detections }: DetectionTableProps) {
             <div className="col-span-2">
               <img
                 className="w-40 h-24 object-cover rounded shadow"
-                src={`data:image/jpg;base64,${detection.imgSrc}`}
+                src={snapshotUrl(detection.imgSrc)}
                 alt="Detection"
               />
             </div>
@@ -96,11 +97,13 @@ export default function DetectionTable({ detections }: DetectionTableProps) {
                   <DialogHeader>
                     <DialogTitle>Detection Details</DialogTitle>
                     <DialogDescription className="space-y-4">
-                      <img
-                        className="w-full max-h-64 object-cover rounded"
-                        src={`data:image/jpg;base64,${selectedDetection?.imgSrc}`}
-                        alt="Detection"
-                      />
+                      {selectedDetection && (
+                        <img
+                          className="w-full max-h-64 object-cover rounded"
+                          src={snapshotUrl(selectedDetection.imgSrc)}
+                          alt="Detection"
+                        />
+                      )}
                       <p><strong>Date & Time:</strong> {formatDate(selectedDetection?.detectedAt || 0)}</p>
                       <p><strong>Vehicle:</strong> {selectedDetection?.className}</p>
                     </DialogDescription>
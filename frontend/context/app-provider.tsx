@@ -7,7 +7,7 @@ import {
   useState,
 } from "react";
 
-import { AppData, Detections } from "@/types";
+import { AppData, AppDataDelta, Detections } from "@/types";
 import { emptyDetections } from "@/lib/constants";
 
 interface IAppContext {
@@ -24,10 +24,42 @@ const AppProvider = ({ children }: Readonly<{ children: React.ReactNode }>) => {
   const [appData, setAppData] = useState<AppData | null>(null);
   const [detections, setDetections] = useState<Detections>(emptyDetections);
   const wsRef = useRef<WebSocket | null>(null);
+  // Kept outside state so a reconnect can ask for just the missed deltas
+  const appDataRef = useRef<AppData | null>(null);
+  // Last event sequence number seen, so a reconnect replays what was missed
+  const lastSeqRef = useRef<number | null>(null);
+
+  const applyAppDataDelta = useCallback((delta: AppDataDelta) => {
+    const current = appDataRef.current;
+    if (!current || delta.epoch !== current.epoch || delta.version <= current.version) {
+      return;
+    }
+    const items = current[delta.key];
+    const next: AppData = {
+      ...current,
+      version: delta.version,
+      [delta.key]:
+        delta.op === "add"
+          ? [...items, delta.item]
+          : items.filter((item) => item !== delta.item),
+    };
+    appDataRef.current = next;
+    setAppData(next);
+  }, []);
 
   const connectWebSocket = useCallback(() => {
+    const known = appDataRef.current;
+    const params = new URLSearchParams();
+    if (known) {
+      params.set("appDataEpoch", known.epoch);
+      params.set("appDataVersion", String(known.version));
+    }
+    if (lastSeqRef.current !== null) {
+      params.set("lastSeq", String(lastSeqRef.current));
+    }
+    const query = params.toString() ? `?${params}` : "";
     const ws = new WebSocket(
-      `ws://${process.env.NEXT_PUBLIC_SERVER_DOMAIN}/ws`
+      `ws://${process.env.NEXT_PUBLIC_SERVER_DOMAIN}/ws${query}`
     );
     wsRef.current = ws; // Store WebSocket reference in useRef
     ws.onopen = () => {
@@ -38,10 +70,25 @@ const AppProvider = ({ children }: Readonly<{ children: React.ReactNode }>) => {
       const data = JSON.parse(event.data);
       // console.log("Received data:", data);
 
+      if (typeof data.seq === "number") {
+        lastSeqRef.current = data.seq;
+      }
+
+      if (data.event === "server:resync") {
+        // Too much was missed to replay; carry on from the current sequence
+        console.warn("Missed events could not be replayed");
+        lastSeqRef.current = data.data.seq;
+      }
+
       if (data.event === "server:app-data") {
+        appDataRef.current = data.data;
         setAppData(data.data);
       }
 
+      if (data.event === "server:app-data-delta") {
+        applyAppDataDelta(data.data);
+      }
+
       if (data.event === "server:red-light-violation") {
         setDetections((prev) => ({
           ...prev,
@@ -129,7 +176,7 @@ const AppProvider = ({ children }: Readonly<{ children: React.ReactNode }>) => {
       }, 1000);
     };
     return ws;
-  }, []);
+  }, [applyAppDataDelta]);
 
   useEffect(() => {
     const ws = connectWebSocket();
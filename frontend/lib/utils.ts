@@ -4,3 +4,8 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
+
+// Event snapshots are served by the backend, e.g. /snapshots/<id>.jpg
+export function snapshotUrl(imgSrc: string) {
+  return `${process.env.NEXT_PUBLIC_SERVER_BASE_URL}${imgSrc}`
+}
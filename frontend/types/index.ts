@@ -93,7 +93,24 @@ export interface Detections {
 
 export type CVModel = keyof Detections;
 
+export interface PersonInfo {
+  name: string;
+  imgName: string;
+  imgUrl: string; // served by the backend, e.g. /faces/<imgName>
+}
+
 export interface AppData {
+  epoch: string; // changes when the server restarts
+  version: number;
   lookoutVehicles: string[]; // vehicle plate numbers
   lookoutPersons: string[]; // person image file name
+  personInfos: PersonInfo[];
+}
+
+export interface AppDataDelta {
+  epoch: string;
+  version: number;
+  op: "add" | "remove";
+  key: "lookoutVehicles" | "lookoutPersons";
+  item: string;
 }